@@ -6,12 +6,10 @@ import sys
 from pathlib import Path
 
 # from config.config import DEFAULT_CONFIG_PATH
-from src.aligner import cli_entry as aligner_cli_entry
-from src.chunker import cli_entry as chunk_cli_entry
-from src.diarizer import cli_entry as diarizer_cli_entry
-from src.postprocessor import cli_entry as postprocess_cli_entry
-from src.preprocessor import cli_entry as preprocess_cli_entry
-from src.transcriber import cli_entry as transcribe_cli_entry
+# Stage modules are imported inside their run_* functions, so each subcommand only loads its own
+# dependencies (pydub, numpy, pyannote, ...). Keep this module's top-level imports light.
+from src.log_service import start_logging
+from src.profiling import PROFILE_MODES, merge_profiles, profile_settings, profiled
 from src.utils import load_config, setup_logger
 
 # Initialize top-level logger
@@ -66,40 +64,100 @@ def run_generate_config(args):
 
 def run_preprocessing(args):
     """Executes the preprocessing module."""
+    from src.preprocessor import cli_entry as preprocess_cli_entry
+
     logger.info("Running preprocessing module...")
     preprocess_cli_entry(args)
 
 
 def run_chunking(args):
     """Executes the chunking module."""
+    from src.chunker import cli_entry as chunk_cli_entry
+
     logger.info("Running chunking module...")
     chunk_cli_entry(args)
 
 
 def run_transcribing(args):
     """Executes the transcription module."""
+    from src.transcriber import cli_entry as transcribe_cli_entry
+
     logger.info("Running transcription module...")
     transcribe_cli_entry(args)
 
 
+def run_language_detection(args):
+    """Detects the language of each recording once and caches its decoding context."""
+    from src.decoding_context import cli_entry as decoding_cli_entry
+
+    logger.info("Running language detection module...")
+    decoding_cli_entry(args)
+
+
 def run_diarization(args):
     """Executes the diarization module."""
+    from src.diarizer import cli_entry as diarizer_cli_entry
+
     logger.info("Running diarization module...")
     diarizer_cli_entry(args)
 
 
 def run_aligning(args):
     """Executes the aligning module."""
+    from src.aligner import cli_entry as aligner_cli_entry
+
     logger.info("Running aligning module...")
     aligner_cli_entry(args)
 
 
+def run_speaker_linking(args):
+    """Links per-chunk speaker labels into global speakers from the saved embeddings."""
+    from src.speaker_linking import cli_entry as linking_cli_entry
+
+    logger.info("Running speaker linking module...")
+    linking_cli_entry(args)
+
+
 def run_postprocessing(args):
     """Executes the postprocessing module."""
+    from src.postprocessor import cli_entry as postprocess_cli_entry
+
     logger.info("Running postprocessing module...")
     postprocess_cli_entry(args)
 
 
+def run_export_store(args):
+    """Exports a recording store to the regular file layout."""
+    from src.store import cli_entry as store_cli_entry
+
+    logger.info("Running store export module...")
+    store_cli_entry(args)
+
+
+def run_processing(args):
+    """Executes chunking, transcription, diarization and alignment as one chunk-level stream."""
+    from src.streaming import cli_entry as streaming_cli_entry
+
+    logger.info("Running streaming processing module...")
+    streaming_cli_entry(args)
+
+
+def run_streaming(args):
+    """Executes live transcription of a PCM stream."""
+    from src.live import cli_entry as live_cli_entry
+
+    logger.info("Running live streaming module...")
+    live_cli_entry(args)
+
+
+def run_daemon(args):
+    """Starts the long-running job daemon with warm models."""
+    from src.daemon import cli_entry as daemon_cli_entry
+
+    logger.info("Starting job daemon...")
+    daemon_cli_entry(args)
+
+
 def run_merging(args):
     """Placeholder for the merging module."""
     logger.info("Running merging module...")
@@ -116,6 +174,17 @@ def main():
         default="config/settings.toml",
         help="Path to the TOML config file (default: config/settings.toml)",
     )
+    parser.add_argument(
+        "--profile",
+        choices=PROFILE_MODES,
+        help="Profile the command and its pool tasks with cProfile (cpu) or tracemalloc (mem).",
+    )
+    parser.add_argument(
+        "--profile-dir", default="profiles", help="Directory for merged per-stage profiles (default: profiles)."
+    )
+    parser.add_argument(
+        "--log-json", help="Also write every log record (including pool workers') as a JSON line to this file."
+    )
 
     subparsers = parser.add_subparsers(dest="command", required=True, help="Available commands")
 
@@ -148,6 +217,15 @@ def main():
     chunk_parser = subparsers.add_parser("chunk", help="Run the audio chunking step.")
     chunk_parser.add_argument("--input", required=True, help="Path to the input .wav file.")
     chunk_parser.add_argument("--output", required=True, help="Directory to save audio chunks.")
+    chunk_parser.add_argument("--store", help="Recording store (.sqlite) to record chunk offsets in.")
+    chunk_parser.add_argument(
+        "--preprocess",
+        action="store_true",
+        help="Normalize and high-pass filter the audio while chunking, per [PREPROCESSING] (no separate pass).",
+    )
+    chunk_parser.add_argument(
+        "--metrics", help="JSON lines file to append stage metrics (wall/CPU time, RTF, peak RSS, queue wait) to."
+    )
     chunk_parser.set_defaults(func=run_chunking)
 
     # --- TRANSCRIBE Subparser ---
@@ -155,41 +233,179 @@ def main():
     transcribe_parser.add_argument(
         "--input", required=True, nargs="+", help="Path(s) to input .wav files or directories."
     )
-    transcribe_parser.add_argument("--output", required=True, help="Directory to save transcription JSON files.")
+    transcribe_parser.add_argument("--output", help="Directory to save transcription JSON files.")
+    transcribe_parser.add_argument(
+        "--store", help="Recording store (.sqlite) to save compact transcriptions in (instead of or besides --output)."
+    )
+    transcribe_parser.add_argument("--ledger", help="SQLite job ledger to record per-chunk task state in.")
+    transcribe_parser.add_argument(
+        "--context",
+        help="Decoding context cache (decoding_context.json): each recording's language is detected once and reused.",
+    )
+    transcribe_parser.add_argument(
+        "--metrics", help="JSON lines file to append stage metrics (wall/CPU time, RTF, peak RSS, queue wait) to."
+    )
     transcribe_parser.set_defaults(func=run_transcribing)
 
+    # --- DETECT-LANGUAGE Subparser ---
+    detect_parser = subparsers.add_parser(
+        "detect-language", help="Detect each recording's language once from a few sampled windows and cache it."
+    )
+    detect_parser.add_argument(
+        "--input", required=True, nargs="+", help="Path(s) to a recording or its chunk .wav files or directories."
+    )
+    detect_parser.add_argument("--output", required=True, help="Context cache to update (decoding_context.json).")
+    detect_parser.add_argument("--recording", help="Recording to store the context under (all inputs belong to it).")
+    detect_parser.add_argument("--windows", type=int, help="Override DECODING.detect_windows.")
+    detect_parser.add_argument(
+        "--initial-prompt", help="Initial prompt to cache for these recordings (DECODING.initial_prompt, if set, wins)."
+    )
+    detect_parser.add_argument("--force", action="store_true", help="Detect again even if a language is cached.")
+    detect_parser.set_defaults(func=run_language_detection)
+
     # --- DIARIZE Subparser ---
     diarizer_parser = subparsers.add_parser("diarize", help="Run the speaker diarization step.")
     diarizer_parser.add_argument("--input", required=True, nargs="+", help="Path(s) to .wav files or directories.")
-    diarizer_parser.add_argument("--output", required=True, help="Directory to save diarization RTTM files.")
+    diarizer_parser.add_argument("--output", help="Directory to save diarization RTTM files.")
+    diarizer_parser.add_argument(
+        "--store", help="Recording store (.sqlite) to save speaker turns in (instead of or besides --output)."
+    )
+    diarizer_parser.add_argument("--ledger", help="SQLite job ledger to record per-chunk task state in.")
+    diarizer_parser.add_argument(
+        "--metrics", help="JSON lines file to append stage metrics (wall/CPU time, RTF, peak RSS, queue wait) to."
+    )
     diarizer_parser.set_defaults(func=run_diarization)
 
     # --- ALIGN Subparser ---
     align_parser = subparsers.add_parser("align", help="Align transcription and diarization outputs.")
     align_parser.add_argument(
-        "--transcriptions", required=True, nargs="+", help="Path(s) to transcription .json files or directories."
+        "--transcriptions", nargs="+", help="Path(s) to transcription .json files or directories."
     )
+    align_parser.add_argument("--diarizations", nargs="+", help="Path(s) to diarization .rttm files or directories.")
+    align_parser.add_argument("--output", help="Directory to save aligned .json files.")
     align_parser.add_argument(
-        "--diarizations", required=True, nargs="+", help="Path(s) to diarization .rttm files or directories."
+        "--store", help="Recording store (.sqlite) to align in place (replaces the three options above)."
     )
-    align_parser.add_argument("--output", required=True, help="Directory to save aligned .json files.")
     # align_parser.add_argument("--config", required=True, help="Config.")
 
     # Removed specific --config here, as it's handled globally by the main parser.
+    align_parser.add_argument(
+        "--metrics", help="JSON lines file to append stage metrics (wall/CPU time, RTF, peak RSS, queue wait) to."
+    )
+    align_parser.add_argument("--ledger", help="SQLite job ledger to record per-chunk task state in.")
     align_parser.set_defaults(func=run_aligning)
 
+    # --- LINK-SPEAKERS Subparser ---
+    link_parser = subparsers.add_parser(
+        "link-speakers", help="Relabel speakers consistently across chunks by clustering their saved embeddings."
+    )
+    link_parser.add_argument(
+        "--input", nargs="+", help="Path(s) to *.embeddings.json files or diarization directories containing them."
+    )
+    link_parser.add_argument("--store", help="Recording store (.sqlite) to read embeddings from instead.")
+    link_parser.add_argument("--output", required=True, help="Path to write the speaker map (speaker_map.json).")
+    link_parser.add_argument(
+        "--threshold", type=float, help="Override SPEAKER_LINKING.threshold (max cosine distance to merge)."
+    )
+    link_parser.add_argument(
+        "--metrics", help="JSON lines file to append stage metrics (wall/CPU time, RTF, peak RSS, queue wait) to."
+    )
+    link_parser.set_defaults(func=run_speaker_linking)
+
     # --- POSTPROCESS Subparser ---
     postprocess_parser = subparsers.add_parser("postprocess", help="Run the postprocessing step.")
+    postprocess_parser.add_argument("--input", nargs="+", help="Path(s) to aligned JSON files or directories.")
+    postprocess_parser.add_argument("--store", help="Recording store (.sqlite) to read alignments from instead.")
+    postprocess_parser.add_argument("--output", required=True, help="Path to the final merged/formatted text file.")
     postprocess_parser.add_argument(
-        "--input", required=True, nargs="+", help="Path(s) to aligned JSON files or directories."
+        "--speaker-map", help="Speaker map from link-speakers, to relabel chunk speakers as global speakers."
+    )
+    postprocess_parser.add_argument(
+        "--metrics", help="JSON lines file to append stage metrics (wall/CPU time, RTF, peak RSS, queue wait) to."
     )
-    postprocess_parser.add_argument("--output", required=True, help="Path to the final merged/formatted text file.")
     postprocess_parser.set_defaults(func=run_postprocessing)
 
+    # --- EXPORT-STORE Subparser ---
+    export_parser = subparsers.add_parser(
+        "export-store", help="Export a recording store back to the transcripts/diarizations/aligns file layout."
+    )
+    export_parser.add_argument("--store", required=True, help="Path to the recording store (.sqlite).")
+    export_parser.add_argument("--output", required=True, help="Directory to export into.")
+    export_parser.set_defaults(func=run_export_store)
+
+    # --- PROCESS Subparser ---
+    process_parser = subparsers.add_parser(
+        "process", help="Chunk, transcribe, diarize and align one recording as a pipelined chunk stream."
+    )
+    process_parser.add_argument("--input", required=True, help="Path to the input .wav file.")
+    process_parser.add_argument(
+        "--output",
+        required=True,
+        help="Recording working directory (chunks/, transcripts/, diarizations/ and aligns/ are created in it).",
+    )
+    process_parser.add_argument(
+        "--metrics", help="JSON lines file to append stage metrics (wall/CPU time, RTF, peak RSS, queue wait) to."
+    )
+    process_parser.set_defaults(func=run_processing)
+
+    # --- STREAM Subparser ---
+    stream_parser = subparsers.add_parser(
+        "stream", help="Transcribe live PCM audio from stdin, a FIFO or a growing WAV file."
+    )
+    stream_parser.add_argument(
+        "--input", default="-", help="'-' for stdin (default), a FIFO path or a (growing) .wav file."
+    )
+    stream_parser.add_argument("--output", required=True, help="JSON lines file to append aligned speaker turns to.")
+    stream_parser.add_argument(
+        "--work-dir", help="Directory for chunk WAVs and intermediates (default: next to --output, named after input)."
+    )
+    stream_parser.add_argument(
+        "--format", choices=["raw", "wav"], help="Input format (default: wav for *.wav inputs, raw otherwise)."
+    )
+    stream_parser.add_argument("--sample-rate", type=int, default=16000, help="Sample rate of raw PCM input.")
+    stream_parser.add_argument("--channels", type=int, default=1, help="Channel count of raw 16-bit PCM input.")
+    stream_parser.add_argument(
+        "--follow", action="store_true", help="Keep reading a growing file until it stops growing."
+    )
+    stream_parser.add_argument(
+        "--idle-timeout", type=float, default=10.0, help="With --follow, stop after this many idle seconds."
+    )
+    stream_parser.add_argument(
+        "--silence-thresh",
+        type=float,
+        help="Fixed silence threshold in dBFS (default: follow the running average loudness minus 15 dB).",
+    )
+    stream_parser.set_defaults(func=run_streaming)
+
+    # --- DAEMON Subparser ---
+    daemon_parser = subparsers.add_parser(
+        "daemon", help="Keep models loaded and accept jobs over localhost HTTP or a Unix socket."
+    )
+    daemon_parser.add_argument(
+        "--listen",
+        default="http://127.0.0.1:8765",
+        help="Address to listen on: http://HOST:PORT or unix:///path/to.sock (default: http://127.0.0.1:8765).",
+    )
+    daemon_parser.set_defaults(func=run_daemon)
+
+    # Also accept the profiling and logging options after the subcommand (as pipeline.py passes them)
+    for subparser in subparsers.choices.values():
+        subparser.add_argument("--profile", choices=PROFILE_MODES, default=argparse.SUPPRESS, help=argparse.SUPPRESS)
+        subparser.add_argument("--profile-dir", default=argparse.SUPPRESS, help=argparse.SUPPRESS)
+        subparser.add_argument("--log-json", default=argparse.SUPPRESS, help=argparse.SUPPRESS)
+
     # --- Parse Arguments ---
     args = parser.parse_args()
     # config = load_config(args.config)
-    args.func(args)
+    settings = profile_settings(args)
+    # Pool workers send their records to this process, where one listener thread writes them
+    with start_logging(args.log_json):
+        try:
+            # Own stage name for the parent: its time blocked on the pools must not be merged into the task profiles
+            profiled(args.func, f"main-{args.command}", settings)(args)
+        finally:
+            if settings is not None:
+                merge_profiles(settings)
 
 
 if __name__ == "__main__":
@@ -4,9 +4,15 @@ import argparse
 import glob
 import logging
 import subprocess
+from contextlib import nullcontext
 from pathlib import Path
 
-from src.utils import load_config, setup_logger
+from src.daemon_client import submit_job, wait_for_job
+from src.decoding_context import CONTEXT_FILE
+from src.distributed import enqueue_recordings, run_local_nodes, work
+from src.ledger import Ledger
+from src.metrics import write_report
+from src.utils import load_config, parse_overrides, setup_logger
 
 # LOG_DIR = "logs"
 logger = setup_logger("pipeline")
@@ -39,9 +45,104 @@ def run_subprocess(command: list[str]):
         logger.info("Step completed successfully")
 
 
-def run_pipeline_for_file(audio_path: Path, output_dir: Path, config_path: Path):
+def main_command(config_path: Path, *args: str) -> list[str]:
+    """Build a main.py subcommand invocation."""
+    return ["python", str(MAIN_PATH), "--config", str(config_path), *args]
+
+
+def open_pipeline_ledger(output_dir: Path, config_path: Path) -> Ledger | None:
+    """
+    Open the job ledger configured in [LEDGER] (default: <output>/ledger.sqlite), unless disabled.
+    """
+    config = load_config(config_path)
+    ledger_config = getattr(config, "LEDGER", None)
+    if not getattr(ledger_config, "enabled", True):
+        return None
+    path = getattr(ledger_config, "path", "") or output_dir / "ledger.sqlite"
+    return Ledger.from_config(Path(path), config)
+
+
+def tracked(ledger: Ledger | None, recording: str, stage: str):
+    """Track a recording-level stage in the ledger, or do nothing without one."""
+    return ledger.track(recording, stage) if ledger else nullcontext()
+
+
+def uses_store(config_path: Path) -> bool:
+    """True if [STORAGE] backend selects the per-recording SQLite store over per-chunk files."""
+    return getattr(getattr(load_config(config_path), "STORAGE", None), "backend", "files") == "sqlite"
+
+
+def link_speakers(
+    config_path: Path, audio_dir: Path, store_path: Path | None, instrument_args: list[str]
+) -> list[str]:
+    """
+    With [SPEAKER_LINKING] enabled, run link-speakers for a recording and return the postprocess
+    arguments that apply its speaker map; otherwise do nothing and return [].
+    """
+    if not getattr(getattr(load_config(config_path), "SPEAKER_LINKING", None), "enabled", False):
+        return []
+    speaker_map = audio_dir / "speaker_map.json"
+    inputs = ["--store", str(store_path)] if store_path else ["--input", str(audio_dir / "diarizations")]
+    run_subprocess(
+        main_command(config_path, "link-speakers", *inputs, "--output", str(speaker_map), *instrument_args)
+    )
+    return ["--speaker-map", str(speaker_map)]
+
+
+def metrics_settings(config_path: Path, output_dir: Path) -> tuple[bool, Path]:
+    """
+    (enabled, Prometheus textfile path) from [METRICS]; the textfile defaults to <output>/metrics.prom.
+    """
+    metrics_config = getattr(load_config(config_path), "METRICS", None)
+    textfile = getattr(metrics_config, "prometheus_textfile", "") or output_dir / "metrics.prom"
+    return getattr(metrics_config, "enabled", True), Path(textfile)
+
+
+def profile_args(profile: str | None, log_dir: Path) -> list[str]:
+    """--profile options for every main.py step; merged per-stage profiles go to <log_dir>/profiles."""
+    return ["--profile", profile, "--profile-dir", str(log_dir / "profiles")] if profile else []
+
+
+def stage_args(audio_dir: Path, store_path: Path | None) -> tuple[list[str], list[str], list[str], list[str]]:
+    """
+    Output/input arguments for the transcribe, diarize, align and postprocess steps: either the
+    per-chunk file directories or a single recording store. Transcription always caches the
+    recording's decoding context (detected language) next to them.
+    """
+    context = ["--context", str(audio_dir / CONTEXT_FILE)]
+    if store_path is not None:
+        store = ["--store", str(store_path)]
+        return store + context, store, store, store
+    return (
+        ["--output", str(audio_dir / "transcripts"), *context],
+        ["--output", str(audio_dir / "diarizations")],
+        [
+            "--transcriptions",
+            str(audio_dir / "transcripts"),
+            "--diarizations",
+            str(audio_dir / "diarizations"),
+            "--output",
+            str(audio_dir / "aligns"),
+        ],
+        ["--input", str(audio_dir / "aligns")],
+    )
+
+
+def run_pipeline_for_file(
+    audio_path: Path,
+    output_dir: Path,
+    config_path: Path,
+    streaming: bool = False,
+    ledger: Ledger | None = None,
+    use_store: bool = False,
+    metrics: bool = False,
+    profile: str | None = None,
+):
     """
     For a single audio file, create a working directory structure and run all pipeline steps in sequence.
+
+    With streaming=True, steps 1-4 run as one chunk-level pipelined stream instead of stage barriers.
+    With use_store=True, intermediates go to one <stem>.sqlite recording store instead of per-chunk files.
     """
     stem = audio_path.stem
     audio_dir = output_dir / stem
@@ -54,124 +155,357 @@ def run_pipeline_for_file(audio_path: Path, output_dir: Path, config_path: Path)
     formatted_file = audio_dir / "formatted" / f"{stem}.txt"
     log_dir = audio_dir / "log"
 
-    for d in (chunks_dir, transcripts_dir, diarizations_dir, aligns_dir, formatted_file.parent, log_dir):
+    store_path = audio_dir / f"{stem}.sqlite" if use_store and not streaming else None
+    intermediate_dirs = () if store_path else (transcripts_dir, diarizations_dir, aligns_dir)
+    for d in (chunks_dir, *intermediate_dirs, formatted_file.parent, log_dir):
         d.mkdir(parents=True, exist_ok=True)
 
     # Setup per-file logger
     # logger = setup_logger("pipeline", log_dir=log_dir)
     # logger.info(f"Processing file: {audio_path.name}")
 
-    # 1) Chunk
-    run_subprocess(
-        [
-            "python",
-            str(MAIN_PATH),
-            "--config",
-            str(config_path),
-            "chunk",
-            "--input",
-            str(audio_path),
-            "--output",
-            str(chunks_dir),
-        ],
-    )
+    if ledger:
+        ledger.add_recording(stem, audio_path, audio_dir)
+    ledger_args = ["--ledger", str(ledger.path)] if ledger else []
+    metrics_path = log_dir / "metrics.jsonl"
+    metrics_path.unlink(missing_ok=True)  # samples of an earlier run of the same recording
+    # Every step appends its log records (with recording/chunk/stage IDs) to log/pipeline.jsonl
+    instrument_args = [
+        *(["--metrics", str(metrics_path)] if metrics else []),
+        *profile_args(profile, log_dir),
+        "--log-json",
+        str(log_dir / "pipeline.jsonl"),
+    ]
+    transcribe_args, diarize_args, align_args, postprocess_args = stage_args(audio_dir, store_path)
 
-    # 2) Transcribe
-    run_subprocess(
-        [
-            "python",
-            str(MAIN_PATH),
-            "--config",
-            str(config_path),
-            "transcribe",
-            "--input",
-            str(chunks_dir),
-            "--output",
-            str(transcripts_dir),
-        ],
-    )
+    if streaming:
+        # 1-4) Chunk, transcribe, diarize and align chunk by chunk
+        run_subprocess(
+            main_command(
+                config_path, "process", "--input", str(audio_path), "--output", str(audio_dir), *instrument_args
+            )
+        )
+        postprocess_args = ["--input", str(aligns_dir)]
+    else:
+        # 1) Chunk
+        chunk_store_args = ["--store", str(store_path)] if store_path else []
+        with tracked(ledger, stem, "chunk"):
+            run_subprocess(
+                main_command(
+                    config_path,
+                    "chunk",
+                    "--input",
+                    str(audio_path),
+                    "--output",
+                    str(chunks_dir),
+                    *chunk_store_args,
+                    *instrument_args,
+                )
+            )
 
-    # 3) Diarize
-    run_subprocess(
-        [
-            "python",
-            str(MAIN_PATH),
-            "--config",
-            str(config_path),
-            "diarize",
-            "--input",
-            str(chunks_dir),
-            "--output",
-            str(diarizations_dir),
-        ],
-    )
+        # 2) Transcribe
+        run_subprocess(
+            main_command(
+                config_path, "transcribe", "--input", str(chunks_dir), *transcribe_args, *ledger_args, *instrument_args
+            )
+        )
 
-    # 4) Align
-    run_subprocess(
-        [
-            "python",
-            str(MAIN_PATH),
-            "--config",
-            str(config_path),
-            "align",
-            "--transcriptions",
-            str(transcripts_dir),
-            "--diarizations",
-            str(diarizations_dir),
-            "--output",
-            str(aligns_dir),
-        ],
-    )
+        # 3) Diarize
+        run_subprocess(
+            main_command(
+                config_path, "diarize", "--input", str(chunks_dir), *diarize_args, *ledger_args, *instrument_args
+            )
+        )
 
-    # 5) Postprocess (merge + format)
-    run_subprocess(
-        [
-            "python",
-            str(MAIN_PATH),
-            "--config",
-            str(config_path),
-            "postprocess",
-            "--input",
-            str(aligns_dir),
-            "--output",
-            str(formatted_file),
-        ],
-    )
+        # 4) Align
+        run_subprocess(main_command(config_path, "align", *align_args, *ledger_args, *instrument_args))
+
+    # 5) Link speakers across chunks
+    postprocess_args += link_speakers(config_path, audio_dir, store_path, instrument_args)
 
+    # 6) Postprocess (merge + format)
+    with tracked(ledger, stem, "postprocess"):
+        run_subprocess(
+            main_command(
+                config_path, "postprocess", *postprocess_args, "--output", str(formatted_file), *instrument_args
+            )
+        )
+
+    if metrics:
+        write_report([metrics_path], log_dir / "metrics.json")
     logger.info(f"Pipeline complete for {audio_path.name}. Final file: {formatted_file}")
 
 
+def resume_pipeline_for_file(
+    audio_path: Path,
+    output_dir: Path,
+    config_path: Path,
+    ledger: Ledger,
+    use_store: bool = False,
+    metrics: bool = False,
+    profile: str | None = None,
+):
+    """
+    Re-run only the tasks of a recording that failed or never ran according to the ledger,
+    honouring the retry limit and backoff of each task.
+    """
+    stem = audio_path.stem
+    audio_dir = output_dir / stem
+    chunks_dir = audio_dir / "chunks"
+    transcripts_dir = audio_dir / "transcripts"
+    diarizations_dir = audio_dir / "diarizations"
+    aligns_dir = audio_dir / "aligns"
+    formatted_file = audio_dir / "formatted" / f"{stem}.txt"
+    ledger_args = ["--ledger", str(ledger.path)]
+    # Resumed tasks append to the samples of the tasks that already succeeded
+    metrics_path = audio_dir / "log" / "metrics.jsonl"
+    instrument_args = [
+        *(["--metrics", str(metrics_path)] if metrics else []),
+        *profile_args(profile, audio_dir / "log"),
+        "--log-json",
+        str(audio_dir / "log" / "pipeline.jsonl"),
+    ]
+    store_path = audio_dir / f"{stem}.sqlite" if use_store else None
+    transcribe_args, diarize_args, align_args, postprocess_args = stage_args(audio_dir, store_path)
+
+    if ledger.needs_run(stem, "chunk"):
+        logger.info(f"Chunking of {audio_path.name} never completed, running the full pipeline.")
+        run_pipeline_for_file(
+            audio_path,
+            output_dir,
+            config_path,
+            ledger=ledger,
+            use_store=use_store,
+            metrics=metrics,
+            profile=profile,
+        )
+        return
+
+    chunks = sorted(chunks_dir.glob("*.wav"))
+    changed = False
+
+    todo = [str(c) for c in chunks if ledger.needs_run(stem, "transcribe", c.stem)]
+    if todo:
+        logger.info(f"Resuming transcription of {len(todo)} chunks of {audio_path.name}")
+        run_subprocess(
+            main_command(config_path, "transcribe", "--input", *todo, *transcribe_args, *ledger_args, *instrument_args)
+        )
+        changed = True
+
+    todo = [str(c) for c in chunks if ledger.needs_run(stem, "diarize", c.stem)]
+    if todo:
+        logger.info(f"Resuming diarization of {len(todo)} chunks of {audio_path.name}")
+        run_subprocess(
+            main_command(config_path, "diarize", "--input", *todo, *diarize_args, *ledger_args, *instrument_args)
+        )
+        changed = True
+
+    if store_path is not None:
+        # The store-backed aligner skips chunks the ledger already has as aligned
+        todo = [c.stem for c in chunks if ledger.needs_run(stem, "align", c.stem)]
+        if todo:
+            logger.info(f"Resuming alignment of {len(todo)} chunks of {audio_path.name}")
+            run_subprocess(main_command(config_path, "align", *align_args, *ledger_args, *instrument_args))
+            changed = True
+    else:
+        todo = [
+            c.stem
+            for c in chunks
+            if (transcripts_dir / f"{c.stem}.json").exists()
+            and (diarizations_dir / f"{c.stem}.rttm").exists()
+            and ledger.needs_run(stem, "align", c.stem)
+        ]
+        if todo:
+            logger.info(f"Resuming alignment of {len(todo)} chunks of {audio_path.name}")
+            run_subprocess(
+                main_command(
+                    config_path,
+                    "align",
+                    "--transcriptions",
+                    *[str(transcripts_dir / f"{key}.json") for key in todo],
+                    "--diarizations",
+                    *[str(diarizations_dir / f"{key}.rttm") for key in todo],
+                    "--output",
+                    str(aligns_dir),
+                    *ledger_args,
+                    *instrument_args,
+                )
+            )
+            changed = True
+
+    if changed or ledger.needs_run(stem, "postprocess"):
+        postprocess_args += link_speakers(config_path, audio_dir, store_path, instrument_args)
+        with tracked(ledger, stem, "postprocess"):
+            run_subprocess(
+                main_command(
+                    config_path,
+                    "postprocess",
+                    *postprocess_args,
+                    "--output",
+                    str(formatted_file),
+                    *instrument_args,
+                )
+            )
+        if metrics:
+            write_report([metrics_path], audio_dir / "log" / "metrics.json")
+        logger.info(f"Resumed pipeline complete for {audio_path.name}. Final file: {formatted_file}")
+    else:
+        logger.info(f"Nothing to resume for {audio_path.name}.")
+
+
+def run_pipeline_on_daemon(
+    audio_files: list[Path], output_dir: Path, daemon_url: str, overrides: dict, priority: int, wait: bool
+):
+    """
+    Thin-client mode: submit every recording to a running daemon and optionally wait for the results.
+    """
+    jobs = []
+    for audio_path in audio_files:
+        job = submit_job(daemon_url, str(audio_path), str(output_dir.resolve()), overrides, priority)
+        logger.info(f"Submitted {audio_path.name} as job {job['id']}")
+        jobs.append((audio_path, job["id"]))
+
+    if not wait:
+        return
+
+    for audio_path, job_id in jobs:
+        job = wait_for_job(daemon_url, job_id)
+        if job["status"] == "done":
+            logger.info(f"Pipeline complete for {audio_path.name}. Final file: {job['result']['formatted']}")
+        else:
+            logger.error(f"Pipeline failed for {audio_path.name}: {job['error']}")
+
+
 def main():
     parser = argparse.ArgumentParser(description="Full audio processing pipeline")
-    parser.add_argument("input", nargs="+", help="Path(s) or glob patterns to audio files (e.g. *.wav)")
+    parser.add_argument(
+        "input",
+        nargs="*",
+        help="Path(s) or glob patterns to audio files (e.g. *.wav). With --resume, defaults to the ledger's recordings",
+    )
     parser.add_argument(
         "--output",
         default=".",
         help="Root directory under which each audio file gets its own subfolder",
     )
     parser.add_argument("--config", default="config/settings.toml", help="Path to the TOML config file")
+    parser.add_argument(
+        "--streaming",
+        action="store_true",
+        help="Pipeline chunks through transcription, diarization and alignment instead of running stage by stage",
+    )
+    parser.add_argument(
+        "--daemon",
+        metavar="URL",
+        help="Submit jobs to a running daemon (http://HOST:PORT or unix:///path.sock) instead of running locally",
+    )
+    parser.add_argument("--priority", type=int, default=0, help="Job priority on the daemon (higher runs first)")
+    parser.add_argument(
+        "--set",
+        action="append",
+        default=[],
+        metavar="SECTION.KEY=VALUE",
+        help="Config override sent with daemon jobs (repeatable), e.g. --set WHISPER.language=en",
+    )
+    parser.add_argument("--no-wait", action="store_true", help="With --daemon, return right after submitting")
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Requeue only the recordings, chunks and stages that failed or never ran according to the ledger",
+    )
+    parser.add_argument(
+        "--profile",
+        choices=["cpu", "mem"],
+        help="Profile every step and pool task (cProfile or tracemalloc) into <recording>/log/profiles",
+    )
+    parser.add_argument(
+        "--distributed",
+        metavar="QUEUE_DIR",
+        help="Enqueue inputs into a shared queue directory and work on it alongside other nodes (inputs optional)",
+    )
+    parser.add_argument("--node-id", help="Node name for --distributed leases (default: <hostname>-<pid>)")
+    parser.add_argument(
+        "--local-nodes", type=int, default=1, help="With --distributed, run this many node processes on this machine"
+    )
     args = parser.parse_args()
 
+    output_dir = Path(args.output)
+    output_dir.mkdir(parents=True, exist_ok=True)
+    config_path = Path(args.config)
+
+    if args.distributed:
+        queue_dir = Path(args.distributed)
+        enqueue_recordings(queue_dir, expand_audio_inputs(args.input), output_dir)
+        if args.local_nodes > 1:
+            run_local_nodes(queue_dir, str(config_path), args.local_nodes)
+        else:
+            work(queue_dir, str(config_path), args.node_id)
+        return
+
+    ledger = None if args.daemon or args.streaming else open_pipeline_ledger(output_dir, config_path)
+    use_store = not args.daemon and uses_store(config_path)
+    metrics, prometheus_path = metrics_settings(config_path, output_dir)
+
+    if args.resume and not ledger:
+        parser.error("--resume needs the ledger, which is off with --daemon, --streaming or [LEDGER] enabled = false")
+
     # Expand input patterns into actual file paths
-    audio_files = expand_audio_inputs(args.input)
+    if args.resume and not args.input:
+        audio_files = [Path(row["path"]) for row in ledger.recordings()]
+    else:
+        audio_files = expand_audio_inputs(args.input)
     if not audio_files:
         logger.error(f"No valid audio files found for: {args.input}")
         # print(f"No valid audio files found for: {args.input}")
         return
 
-    output_dir = Path(args.output)
-    output_dir.mkdir(parents=True, exist_ok=True)
-
-    config_path = Path(args.config)
+    if args.daemon:
+        run_pipeline_on_daemon(
+            audio_files, output_dir, args.daemon, parse_overrides(args.set), args.priority, not args.no_wait
+        )
+        return
 
     for audio_path in audio_files:
         try:
-            logger.info(f"Starting pipeline for {audio_path.name}")
-            run_pipeline_for_file(audio_path, output_dir, config_path)
+            if args.resume:
+                logger.info(f"Resuming pipeline for {audio_path.name}")
+                resume_pipeline_for_file(
+                    audio_path,
+                    output_dir,
+                    config_path,
+                    ledger,
+                    use_store=use_store,
+                    metrics=metrics,
+                    profile=args.profile,
+                )
+            else:
+                logger.info(f"Starting pipeline for {audio_path.name}")
+                run_pipeline_for_file(
+                    audio_path,
+                    output_dir,
+                    config_path,
+                    streaming=args.streaming,
+                    ledger=ledger,
+                    use_store=use_store,
+                    metrics=metrics,
+                    profile=args.profile,
+                )
         except Exception as e:
             logger.error(f"Pipeline failed for {audio_path.name}: {e}")
             # print(f"Pipeline failed for {audio_path.name}: {e}")
 
+    if metrics:
+        # One report across every recording (and every worker process) of this run
+        write_report(
+            [output_dir / audio_path.stem / "log" / "metrics.jsonl" for audio_path in audio_files],
+            output_dir / "metrics.json",
+            prometheus_path,
+        )
+
+    if ledger:
+        logger.info(f"Ledger summary ({ledger.path}): {ledger.summary()}")
+        ledger.close()
+
 
 if __name__ == "__main__":
     main()
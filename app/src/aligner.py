@@ -2,12 +2,18 @@ import glob
 import json
 import logging
 import os
+import time
 from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import nullcontext
 from pathlib import Path
 
 from pyannote.core import Annotation, Segment
+from src.ledger import open_ledger, recording_of
+from src.log_service import log_context, pool_logging
+from src.metrics import measured_call, open_collector
+from src.profiling import profile_settings, profiled
+from src.store import RecordingStore, parse_rttm
 from src.utils import load_config, setup_logger
-from tqdm import tqdm
 
 logger = setup_logger("aligner")
 
@@ -18,17 +24,15 @@ def load_transcription(transcription_path: Path) -> dict:
 
 
 def load_diarization(rttm_path: Path) -> Annotation:
-    annotation = Annotation()
     with open(rttm_path, "r") as f:
-        for line in f:
-            parts = line.strip().split()
-            if len(parts) < 8:
-                continue
-            start = float(parts[3])
-            duration = float(parts[4])
-            speaker = parts[7]
-            segment = Segment(start, start + duration)
-            annotation[segment] = speaker
+        return annotation_from_turns(parse_rttm(f))
+
+
+def annotation_from_turns(turns: list[tuple[float, float, str]]) -> Annotation:
+    annotation = Annotation()
+    for start, duration, speaker in turns:
+        segment = Segment(start, start + duration)
+        annotation[segment] = speaker
     return annotation
 
 
@@ -59,25 +63,54 @@ def align_segments(transcription: dict, diarization: Annotation) -> list:
 
 
 def align_pair(transcription_path: Path, diarization_path: Path, output_path: Path):
-    try:
-        transcription = load_transcription(transcription_path)
-        diarization = load_diarization(diarization_path)
-        aligned_segments = align_segments(transcription, diarization)
-
-        combined = {
-            "metadata": {
-                "audio_file": transcription_path.name,
-                "model_name": transcription.get("model_name"),
-                "language": transcription.get("language"),
-                "duration": transcription.get("duration"),
-            },
-            "segments": aligned_segments,
-        }
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(combined, f, ensure_ascii=False, indent=2)
-        logger.info(f"Aligned: {transcription_path.name}")
-    except Exception as e:
-        logger.error(f"Failed to align {transcription_path.name} and {diarization_path.name}: {e}")
+    chunk = transcription_path.stem
+    with log_context(stage="align", recording=recording_of(chunk), chunk=chunk):
+        try:
+            transcription = load_transcription(transcription_path)
+            diarization = load_diarization(diarization_path)
+            aligned_segments = align_segments(transcription, diarization)
+
+            combined = {
+                "metadata": {
+                    "audio_file": transcription_path.name,
+                    "model_name": transcription.get("model_name"),
+                    "language": transcription.get("language"),
+                    "duration": transcription.get("duration"),
+                },
+                "segments": aligned_segments,
+            }
+            with open(output_path, "w", encoding="utf-8") as f:
+                json.dump(combined, f, ensure_ascii=False, indent=2)
+            logger.info(f"Aligned: {transcription_path.name}")
+        except Exception as e:
+            logger.error(f"Failed to align {transcription_path.name} and {diarization_path.name}: {e}")
+            raise
+
+
+def align_store(store: RecordingStore, ledger=None, metrics=None) -> int:
+    """
+    Align every chunk in a recording store that has both a transcription and a diarization,
+    reading and writing the store directly. With a ledger, chunks already aligned are skipped.
+    """
+    aligned = 0
+    for row in store.chunks():
+        chunk = row["chunk"]
+        if not (store.has("transcripts", chunk) and store.has("turns", chunk)):
+            continue
+        if ledger and not ledger.needs_run(recording_of(chunk), "align", chunk):
+            continue
+        context = ledger.track(recording_of(chunk), "align", chunk) if ledger else nullcontext()
+        measure = metrics.measure("align", recording_of(chunk), chunk) if metrics else nullcontext()
+        try:
+            with context, measure:
+                segments = align_segments(store.transcription(chunk), annotation_from_turns(store.diarization(chunk)))
+                store.put_alignment(chunk, segments)
+        except Exception as e:
+            logger.error(f"Failed to align {chunk}: {e}")
+            continue
+        aligned += 1
+    logger.info(f"Aligned {aligned} chunks in {store.path.name}")
+    return aligned
 
 
 def collect_files(paths: list[str], suffix: str) -> dict:
@@ -102,6 +135,19 @@ def cli_entry(args):
         pass
 
     config = load_config(args.config)
+    ledger = open_ledger(args, config)
+    metrics = open_collector(args)
+
+    if getattr(args, "store", None):
+        with RecordingStore(Path(args.store)) as store:
+            align_store(store, ledger, metrics)
+        metrics.flush()
+        return
+
+    if not (args.transcriptions and args.diarizations and args.output):
+        logger.error("--transcriptions, --diarizations and --output are required without --store.")
+        return
+
     output_dir = Path(args.output)
     output_dir.mkdir(parents=True, exist_ok=True)
 
@@ -115,9 +161,16 @@ def cli_entry(args):
 
     logger.info(f"Found {len(common_keys)} matching files. Starting alignment...")
 
-    with ProcessPoolExecutor(max_workers=config.PARALLEL.parallel_workers) as executor:
+    if ledger:
+        for key in common_keys:
+            ledger.start(recording_of(key), "align", key)
+
+    submitted_at = time.time()
+    task = profiled(measured_call, "align", profile_settings(args))
+    with ProcessPoolExecutor(max_workers=config.PARALLEL.parallel_workers, **pool_logging()) as executor:
         futures = {
             executor.submit(
+                task,
                 align_pair,
                 transcription_files[key],
                 diarization_files[key],
@@ -127,4 +180,15 @@ def cli_entry(args):
         }
 
         for future in as_completed(futures):
-            future.result()
+            key = futures[future]
+            try:
+                _, sample = future.result()
+            except Exception as e:
+                if ledger:
+                    ledger.fail(recording_of(key), "align", e, key)
+                continue
+            metrics.add("align", recording_of(key), sample, key, submitted_at=submitted_at)
+            if ledger:
+                ledger.succeed(recording_of(key), "align", key)
+
+    metrics.flush()
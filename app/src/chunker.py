@@ -1,6 +1,17 @@
+import itertools
+import math
+import wave
+from collections import deque
 from pathlib import Path
 
-from pydub import AudioSegment, silence
+import numpy as np
+from pydub import AudioSegment
+from pydub.utils import db_to_float
+from src.log_service import log_context
+from src.metrics import open_collector
+from src.preprocessor import BlockPreprocessor, iter_wav_blocks, preprocess_settings
+from src.scheduler import get_wav_duration
+from src.store import RecordingStore
 from src.utils import (
     estimate_silence_threshold,
     load_config,
@@ -11,7 +22,82 @@ from src.utils import (
 logger = setup_logger("chunker")
 
 
-def chunk_audio(
+def iter_silence(audio: AudioSegment, min_silence_len: int, silence_thresh: float, seek_step: int = 100):
+    """
+    Lazy equivalent of pydub's silence.detect_silence: yield each [start, end] silent range (ms)
+    as soon as it is closed, instead of scanning the whole file first.
+    """
+    seg_len = len(audio)
+    if seg_len < min_silence_len:
+        return
+
+    thresh = db_to_float(silence_thresh) * audio.max_possible_amplitude
+    last_slice_start = seg_len - min_silence_len
+    slice_starts = range(0, last_slice_start + 1, seek_step)
+    if last_slice_start % seek_step:
+        slice_starts = itertools.chain(slice_starts, [last_slice_start])
+
+    range_start = prev_i = None
+    for i in slice_starts:
+        if audio[i : i + min_silence_len].rms > thresh:
+            continue
+        if prev_i is None:
+            range_start = i
+        elif i != prev_i + seek_step and i > prev_i + min_silence_len:
+            yield [range_start, prev_i + min_silence_len]
+            range_start = i
+        prev_i = i
+
+    if prev_i is not None:
+        yield [range_start, prev_i + min_silence_len]
+
+
+def iter_cut_points(
+    silent_ranges, max_duration_ms: int, silence_cut_ratio: float = 0.5, start_ms: int = 0, force_cut: bool = False
+):
+    """
+    Apply the chunking rule to a (possibly lazy) sequence of silent ranges and yield each cut point in ms
+    as soon as it is decided: once a silence ends more than max_duration_ms after the current chunk start,
+    the chunk is cut inside the previous silence.
+
+    Without a silence to cut at, this raises, unless force_cut is set (live streams, where one long
+    monologue must not end the session): the chunk is then cut at max_duration_ms with a warning.
+    With force_cut, silent_ranges may also contain [position, None] items that only report how far
+    the stream has got, so the cut is forced on time rather than at the next silence.
+    """
+    last_chunk_start = start_ms
+    last_valid_silence = None  # tuple: (start, end)
+
+    for start, end in silent_ranges:
+        position = start if end is None else end
+        if position - last_chunk_start > max_duration_ms:
+            cut_point = None
+            if last_valid_silence is not None:
+                sil_start, sil_end = last_valid_silence
+                cut_point = int(sil_start + (sil_end - sil_start) * silence_cut_ratio)
+                if force_cut and cut_point <= last_chunk_start:
+                    cut_point = None  # the silence was used up by an earlier cut
+            if cut_point is not None:
+                yield cut_point
+                last_chunk_start = cut_point
+            elif not force_cut:
+                logger.error(
+                    f"No silence found within {max_duration_ms / 1000:.0f}s from {last_chunk_start}ms. Aborting."
+                )
+                raise RuntimeError("No valid silence to cut at. Adjust chunking settings.")
+            else:
+                while position - last_chunk_start > max_duration_ms:
+                    logger.warning(
+                        f"No silence found within {max_duration_ms / 1000:.0f}s from {last_chunk_start}ms. "
+                        "Forcing a cut."
+                    )
+                    last_chunk_start += max_duration_ms
+                    yield last_chunk_start
+        if end is not None:
+            last_valid_silence = (start, end)
+
+
+def iter_chunks(
     input_file: Path,
     output_dir: Path,
     max_duration_sec: int,
@@ -19,62 +105,242 @@ def chunk_audio(
     min_silence_len_sec: float,
     silence_cut_ratio: float = 0.5,  # NEW: 0.0=start, 1.0=end, 0.5=middle
 ):
+    """
+    Cut a WAV file into chunks at silences, exporting and yielding each chunk as soon as its cut is decided.
+
+    Yields (chunk_path, offset_sec, duration_sec) tuples in chronological order.
+    """
     audio = AudioSegment.from_wav(input_file)
     base_name = input_file.stem
     max_duration_ms = int(max_duration_sec * 1000)
     min_silence_len_ms = int(min_silence_len_sec * 1000)
+    output_dir.mkdir(parents=True, exist_ok=True)
 
     logger.info("Detecting silent chunks...")
-    silent_ranges = silence.detect_silence(
-        audio,
-        min_silence_len=min_silence_len_ms,
-        silence_thresh=silence_thresh_db,
-        seek_step=100,
-    )
+    silent_ranges = iter_silence(audio, min_silence_len_ms, silence_thresh_db, seek_step=100)
+    cut_points = iter_cut_points(silent_ranges, max_duration_ms, silence_cut_ratio)
 
-    if not silent_ranges:
-        logger.warning("No silence found. Exporting original as single chunk.")
-        output_dir.mkdir(parents=True, exist_ok=True)
-        audio.export(output_dir / f"{base_name}_0.wav", format="wav")
-        return
-
-    chunks = []
+    idx = 0
     last_chunk_start = 0
-    last_valid_silence = None  # tuple: (start, end)
+    for cut_point in itertools.chain(cut_points, [len(audio)]):
+        if cut_point <= last_chunk_start:
+            continue
+        chunk_path = output_dir / f"{base_name}_{idx:02d}.wav"
+        audio[last_chunk_start:cut_point].export(chunk_path, format="wav")
+        # logger.debug(f"Exported chunk {idx} ({(cut_point - last_chunk_start) / 1000:.2f} sec)")
+        yield chunk_path, last_chunk_start / 1000.0, (cut_point - last_chunk_start) / 1000.0
+        last_chunk_start = cut_point
+        idx += 1
 
-    for i, (start, end) in enumerate(silent_ranges):
-        duration_since_last = end - last_chunk_start
+    if idx == 1:
+        logger.warning("No cut points found. Exported original as single chunk.")
 
-        if duration_since_last > max_duration_ms:
-            if last_valid_silence is not None:
-                sil_start, sil_end = last_valid_silence
-                cut_point = int(sil_start + (sil_end - sil_start) * silence_cut_ratio)
-                # logger.debug(
-                #     f"Cutting chunk at silence: {sil_start}-{sil_end}ms → cut at {cut_point}ms "
-                #     f"[chunk: {(cut_point - last_chunk_start)/1000:.2f}s]"
-                # )
-                chunks.append(audio[last_chunk_start:cut_point])
-                last_chunk_start = cut_point
-                last_valid_silence = (start, end)
+
+class RollingChunker:
+    """
+    Apply the chunk_audio cut rule incrementally to a stream of 16-bit PCM blocks.
+
+    Audio since the last cut is held in a ring buffer of fixed-size frames; silences are detected
+    frame by frame (seek_step windows) and fed lazily to iter_cut_points, so each chunk is emitted
+    as soon as its cut is decided. Unless a fixed threshold is given, the silence threshold follows
+    the running average loudness of the stream (offset_db below it), like estimate_silence_threshold.
+    With force_cut (live streams), a chunk without any silence is cut at max_duration_sec instead of
+    raising (see iter_cut_points).
+    """
+
+    def __init__(
+        self,
+        sample_rate: int,
+        max_duration_sec: int,
+        min_silence_len_sec: float,
+        silence_thresh_db: float | None = None,
+        offset_db: float = -15.0,
+        silence_cut_ratio: float = 0.5,
+        seek_step_ms: int = 100,
+        force_cut: bool = False,
+    ):
+        self.sample_rate = sample_rate
+        self.max_duration_ms = int(max_duration_sec * 1000)
+        self.min_silence_len_ms = int(min_silence_len_sec * 1000)
+        self.silence_thresh_db = silence_thresh_db
+        self.offset_db = offset_db
+        self.silence_cut_ratio = silence_cut_ratio
+        self.seek_step_ms = seek_step_ms
+        self.force_cut = force_cut
+        self.frame_samples = max(int(sample_rate * seek_step_ms / 1000), 1)
+
+        self._frames = deque()  # ring buffer of (start_sample, samples) since the last cut
+        self._buffer_start = 0  # sample index of the first buffered sample
+        self._total = 0  # samples seen so far
+        self._energy = 0.0  # running sum of squared (normalized) amplitudes
+
+    @property
+    def position_sec(self) -> float:
+        return self._total / self.sample_rate
+
+    def _threshold_db(self) -> float:
+        if self.silence_thresh_db is not None:
+            return self.silence_thresh_db
+        mean_square = self._energy / max(self._total, 1)
+        if mean_square <= 0:
+            return -math.inf
+        return 10 * math.log10(mean_square) + self.offset_db
+
+    def _iter_frames(self, blocks):
+        pending = np.empty((0, 1), dtype=np.int16)
+        for block in blocks:
+            if block.ndim == 1:
+                block = block.reshape(-1, 1)
+            pending = block if not len(pending) else np.concatenate([pending, block])
+            while len(pending) >= self.frame_samples:
+                frame, pending = pending[: self.frame_samples], pending[self.frame_samples :]
+                yield frame
+        if len(pending):
+            yield pending
+
+    def _iter_silence(self, blocks):
+        run_start = run_end = None
+        for frame in self._iter_frames(blocks):
+            start = self._total
+            self._frames.append((start, frame))
+            self._total += len(frame)
+
+            normalized = frame.astype(np.float64) / 32768.0
+            square_sum = float(np.sum(normalized * normalized))
+            self._energy += square_sum / frame.shape[1]
+            rms_db = 10 * math.log10(square_sum / normalized.size) if square_sum > 0 else -math.inf
+
+            start_ms = start * 1000 // self.sample_rate
+            end_ms = self._total * 1000 // self.sample_rate
+            if rms_db <= self._threshold_db():
+                if run_start is None:
+                    run_start = start_ms
+                run_end = end_ms
             else:
-                logger.error(f"No silence found within {max_duration_sec}s from {last_chunk_start}ms. Aborting.")
-                raise RuntimeError("No valid silence to cut at. Adjust chunking settings.")
-        else:
-            last_valid_silence = (start, end)
-            # logger.debug(f"Silence {i+1} accepted for chunk {len(chunks) + 1}")
+                if run_start is not None and run_end - run_start >= self.min_silence_len_ms:
+                    yield [run_start, run_end]
+                run_start = None
+            if self.force_cut:
+                yield [end_ms, None]  # position only, so a cut can be forced on time
+
+        if run_start is not None and run_end - run_start >= self.min_silence_len_ms:
+            yield [run_start, run_end]
 
-    # Add final chunk
-    if last_chunk_start < len(audio):
-        # logger.info(f"Exporting final chunk from {last_chunk_start}ms to end")
-        chunks.append(audio[last_chunk_start:])
+    def _pop(self, cut_sample: int) -> np.ndarray:
+        parts = []
+        while self._frames and self._frames[0][0] < cut_sample:
+            start, frame = self._frames.popleft()
+            if start + len(frame) > cut_sample:
+                split = cut_sample - start
+                parts.append(frame[:split])
+                self._frames.appendleft((cut_sample, frame[split:]))
+                break
+            parts.append(frame)
+        self._buffer_start = cut_sample
+        return np.concatenate(parts) if parts else np.empty((0, 1), dtype=np.int16)
 
-    logger.info(f"Exporting {len(chunks)} chunks...")
+    def chunks(self, blocks):
+        """
+        Consume PCM blocks (int16 arrays shaped (samples, channels)) and yield
+        (samples, offset_sec, duration_sec) for every finalized chunk, including the trailing one.
+        """
+        silences = self._iter_silence(blocks)
+        for cut_ms in iter_cut_points(silences, self.max_duration_ms, self.silence_cut_ratio, force_cut=self.force_cut):
+            cut_sample = cut_ms * self.sample_rate // 1000
+            if cut_sample <= self._buffer_start:
+                continue
+            offset = self._buffer_start
+            samples = self._pop(cut_sample)
+            yield samples, offset / self.sample_rate, len(samples) / self.sample_rate
+
+        if self._total > self._buffer_start:
+            offset = self._buffer_start
+            samples = self._pop(self._total)
+            yield samples, offset / self.sample_rate, len(samples) / self.sample_rate
+
+
+def write_wav(path: Path, samples: np.ndarray, sample_rate: int):
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(samples.shape[1])
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(samples.astype("<i2").tobytes())
+
+
+def iter_preprocessed_chunks(
+    input_file: Path,
+    output_dir: Path,
+    max_duration_sec: int,
+    min_silence_len_sec: float,
+    settings: dict,
+    offset_db: float = -15.0,
+    silence_cut_ratio: float = 0.5,
+):
+    """
+    Preprocess and chunk a WAV file in a single streaming read: each block is high-pass filtered and
+    normalized (preprocessor.BlockPreprocessor) and fed straight into a RollingChunker, so no
+    preprocessed copy of the file is written. The scan that sets the gain also gives the average
+    loudness for the silence threshold, in place of estimate_silence_threshold's read.
+
+    Yields (chunk_path, offset_sec, duration_sec) tuples like iter_chunks.
+    """
+    preprocessor, scan = BlockPreprocessor.for_file(input_file, settings)
+    silence_thresh_db = scan["dbfs"] + preprocessor.gain_db + offset_db
+    logger.info(
+        f"Preprocessing in the chunking pass: {preprocessor.gain_db:+.1f} dB gain, "
+        f"silence threshold {silence_thresh_db:.2f} dBFS"
+    )
     output_dir.mkdir(parents=True, exist_ok=True)
-    for idx, chunk in enumerate(chunks):
-        chunk.export(output_dir / f"{base_name}_{idx:02d}.wav", format="wav")
-        # logger.debug(f"Exported chunk {idx} ({len(chunk) / 1000:.2f} sec)")
 
-    logger.info("Chunking complete.")
+    chunker = RollingChunker(
+        scan["sample_rate"],
+        max_duration_sec=max_duration_sec,
+        min_silence_len_sec=min_silence_len_sec,
+        silence_thresh_db=silence_thresh_db,
+        silence_cut_ratio=silence_cut_ratio,
+    )
+    blocks = map(preprocessor.process, iter_wav_blocks(input_file))
+    for idx, (samples, offset_sec, duration_sec) in enumerate(chunker.chunks(blocks)):
+        chunk_path = output_dir / f"{input_file.stem}_{idx:02d}.wav"
+        write_wav(chunk_path, samples, scan["sample_rate"])
+        yield chunk_path, offset_sec, duration_sec
+
+
+def chunk_audio(
+    input_file: Path,
+    output_dir: Path,
+    max_duration_sec: int,
+    silence_thresh_db: float | None,
+    min_silence_len_sec: float,
+    silence_cut_ratio: float = 0.5,  # NEW: 0.0=start, 1.0=end, 0.5=middle
+    store=None,
+    preprocess: dict | None = None,
+) -> list[Path]:
+    """
+    Export the chunks of a recording. With preprocess settings, the audio is preprocessed on the fly
+    (iter_preprocessed_chunks) and silence_thresh_db is ignored.
+    """
+    if preprocess is not None:
+        chunk_iter = iter_preprocessed_chunks(
+            input_file,
+            output_dir,
+            max_duration_sec,
+            min_silence_len_sec,
+            preprocess,
+            silence_cut_ratio=silence_cut_ratio,
+        )
+    else:
+        chunk_iter = iter_chunks(
+            input_file, output_dir, max_duration_sec, silence_thresh_db, min_silence_len_sec, silence_cut_ratio
+        )
+    chunks = []
+    for idx, (chunk_path, offset_sec, duration_sec) in enumerate(chunk_iter):
+        chunks.append(chunk_path)
+        if store is not None:
+            # Offsets let the postprocessor place chunks without re-reading their audio
+            store.put_chunk(chunk_path.stem, idx, offset_sec, duration_sec)
+    logger.info(f"Chunking complete. Exported {len(chunks)} chunks.")
+    return chunks
 
 
 def cli_entry(args):
@@ -82,15 +348,33 @@ def cli_entry(args):
     input_file = Path(args.input)
     output_dir = Path(args.output)
 
-    # Always auto-estimate threshold
+    settings = preprocess_settings(config)
+    preprocess = settings if getattr(args, "preprocess", False) or settings["enabled"] else None
+
+    # Always auto-estimate threshold (the preprocessing scan does it when preprocessing)
     logger.info(f"Loading audio file: {input_file}")
-    silence_thresh_db = estimate_silence_threshold(str(input_file), offset_db=-15.0)
-    logger.info(f"Auto-estimated silence threshold: {silence_thresh_db:.2f} dBFS")
+    silence_thresh_db = None
+    if preprocess is None:
+        silence_thresh_db = estimate_silence_threshold(str(input_file), offset_db=-15.0)
+        logger.info(f"Auto-estimated silence threshold: {silence_thresh_db:.2f} dBFS")
 
-    chunk_audio(
-        input_file=input_file,
-        output_dir=output_dir,
-        max_duration_sec=config.CHUNKING.max_chunk_duration_sec,
-        silence_thresh_db=silence_thresh_db,
-        min_silence_len_sec=config.CHUNKING.min_silence_duration_sec,
-    )
+    store = RecordingStore(Path(args.store)) if getattr(args, "store", None) else None
+    metrics = open_collector(args)
+    try:
+        with (
+            log_context(stage="chunk", recording=input_file.stem),
+            metrics.measure("chunk", input_file.stem, audio_sec=get_wav_duration(input_file)),
+        ):
+            chunk_audio(
+                input_file=input_file,
+                output_dir=output_dir,
+                max_duration_sec=config.CHUNKING.max_chunk_duration_sec,
+                silence_thresh_db=silence_thresh_db,
+                min_silence_len_sec=config.CHUNKING.min_silence_duration_sec,
+                store=store,
+                preprocess=preprocess,
+            )
+    finally:
+        if store is not None:
+            store.close()
+    metrics.flush()
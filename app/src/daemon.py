@@ -0,0 +1,242 @@
+import itertools
+import json
+import os
+import queue
+import socketserver
+import threading
+import time
+import uuid
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from src.daemon_client import DEFAULT_DAEMON_URL, parse_address
+from src.metrics import MetricsCollector, write_report
+from src.postprocessor import merge_aligned_chunks
+from src.speaker_linking import link_recording, linking_settings
+from src.streaming import WorkerPools, process_recording
+from src.utils import load_config, setup_logger
+
+logger = setup_logger("daemon")
+
+
+class JobDaemon:
+    """
+    Keeps Whisper and pyannote loaded in warm worker pools and runs submitted recordings one at a time,
+    highest priority first (FIFO within the same priority).
+
+    Finished jobs are kept for status queries up to DAEMON.job_retention jobs and DAEMON.job_retention_sec.
+    If a worker process dies, the job fails and the pools are recreated for the next one.
+    """
+
+    def __init__(self, config_path: str, auth_token: str):
+        self.config_path = config_path
+        self.config = load_config(config_path)
+        self.auth_token = auth_token
+        self.pools = WorkerPools(self.config, auth_token)
+        settings = getattr(self.config, "DAEMON", None)
+        self.job_retention = getattr(settings, "job_retention", 100)
+        self.job_retention_sec = getattr(settings, "job_retention_sec", 24 * 3600)
+        self.jobs = {}
+        self._queue = queue.PriorityQueue()
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._runner = threading.Thread(target=self._run, name="job-runner", daemon=True)
+        self._runner.start()
+
+    def submit(self, spec: dict) -> dict:
+        input_path = Path(spec["input"]).resolve()
+        if not input_path.is_file():
+            raise ValueError(f"Recording not found: {input_path}")
+        output_dir = Path(spec.get("output") or input_path.parent).resolve()
+        if not isinstance(spec.get("config") or {}, dict):
+            raise ValueError("'config' must be an object of config overrides.")
+        # Validate overrides up front so a bad job fails at submission, not in the queue
+        load_config(self.config_path, spec.get("config"))
+
+        job = {
+            "id": uuid.uuid4().hex[:12],
+            "status": "queued",
+            "input": str(input_path),
+            "output": str(output_dir / input_path.stem),
+            "config": spec.get("config") or {},
+            "priority": int(spec.get("priority", 0)),
+            "submitted_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "error": None,
+            "result": None,
+        }
+        with self._lock:
+            self.jobs[job["id"]] = job
+        self._queue.put((-job["priority"], next(self._seq), job["id"]))
+        logger.info(f"Queued job {job['id']} for {input_path.name} (priority {job['priority']})")
+        return dict(job)
+
+    def status(self, job_id: str) -> dict | None:
+        with self._lock:
+            job = self.jobs.get(job_id)
+            return dict(job) if job else None
+
+    def list_jobs(self) -> list[dict]:
+        with self._lock:
+            return [dict(job) for job in self.jobs.values()]
+
+    def queued(self) -> int:
+        return self._queue.qsize()
+
+    def _run(self):
+        while True:
+            _, _, job_id = self._queue.get()
+            with self._lock:
+                job = self.jobs[job_id]
+                job["status"] = "running"
+                job["started_at"] = time.time()
+            try:
+                result = self._execute(job)
+                update = {"status": "done", "result": result}
+                logger.info(f"Job {job_id} done in {time.time() - job['started_at']:.1f}s")
+            except BrokenProcessPool as e:
+                update = {"status": "failed", "error": str(e)}
+                logger.error(f"Job {job_id} failed: {e}")
+                self._restart_pools()
+            except Exception as e:
+                update = {"status": "failed", "error": str(e)}
+                logger.error(f"Job {job_id} failed: {e}")
+            with self._lock:
+                job.update(update, finished_at=time.time())
+                self._evict_finished()
+
+    def _restart_pools(self):
+        logger.warning("A worker process died; recreating the worker pools.")
+        broken = self.pools
+        self.pools = WorkerPools(self.config, self.auth_token)
+        broken.transcribe.shutdown(wait=False, cancel_futures=True)
+        broken.diarize.shutdown(wait=False, cancel_futures=True)
+
+    def _evict_finished(self):
+        """
+        Drop finished jobs older than job_retention_sec and all but the job_retention most recent ones.
+        Called with the lock held.
+        """
+        finished = sorted(
+            (job for job in self.jobs.values() if job["finished_at"] is not None), key=lambda job: job["finished_at"]
+        )
+        cutoff = time.time() - self.job_retention_sec
+        excess = len(finished) - self.job_retention
+        for i, job in enumerate(finished):
+            if i < excess or job["finished_at"] < cutoff:
+                del self.jobs[job["id"]]
+
+    def _execute(self, job: dict) -> dict:
+        config = load_config(self.config_path, job["config"])
+        audio_path = Path(job["input"])
+        audio_dir = Path(job["output"])
+        formatted_file = audio_dir / "formatted" / f"{audio_path.stem}.txt"
+
+        metrics_path = audio_dir / "log" / "metrics.jsonl"
+        metrics_path.unlink(missing_ok=True)  # samples of an earlier run of the same recording
+        metrics = MetricsCollector(metrics_path)
+        aligned = process_recording(audio_path, audio_dir, config, pools=self.pools, metrics=metrics)
+        speaker_map = None
+        settings = linking_settings(config)
+        if settings["enabled"]:
+            with metrics.measure("link", audio_path.stem):
+                speaker_map = link_recording(audio_dir / "speaker_map.json", settings, [audio_dir / "diarizations"])
+        with metrics.measure("postprocess", audio_path.stem):
+            merge_aligned_chunks([str(audio_dir / "aligns")], formatted_file, speaker_map)
+        metrics.flush()
+        write_report([metrics_path], audio_dir / "log" / "metrics.json")
+        return {
+            "formatted": str(formatted_file),
+            "aligns": str(audio_dir / "aligns"),
+            "aligned_chunks": len(aligned),
+            "metrics": str(audio_dir / "log" / "metrics.json"),
+        }
+
+    def shutdown(self):
+        self.pools.shutdown()
+
+
+def make_handler(daemon: JobDaemon):
+    class JobRequestHandler(BaseHTTPRequestHandler):
+        def _reply(self, status: int, payload):
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/health":
+                self._reply(200, {"status": "ok", "queued": daemon.queued()})
+            elif self.path == "/jobs":
+                self._reply(200, {"jobs": daemon.list_jobs()})
+            elif self.path.startswith("/jobs/"):
+                job = daemon.status(self.path[len("/jobs/") :])
+                if job is None:
+                    self._reply(404, {"error": "Unknown job"})
+                else:
+                    self._reply(200, job)
+            else:
+                self._reply(404, {"error": f"Unknown path {self.path}"})
+
+        def do_POST(self):
+            if self.path != "/jobs":
+                self._reply(404, {"error": f"Unknown path {self.path}"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                spec = json.loads(self.rfile.read(length) or b"{}")
+                if not isinstance(spec, dict):
+                    raise ValueError("The job spec must be a JSON object.")
+                self._reply(202, daemon.submit(spec))
+            except (KeyError, TypeError, ValueError, OSError) as e:
+                self._reply(400, {"error": str(e)})
+
+        def address_string(self):
+            # client_address is an empty string for Unix sockets
+            return self.client_address[0] if self.client_address else "unix"
+
+        def log_message(self, format, *args):
+            logger.debug(f"{self.address_string()} {format % args}")
+
+    return JobRequestHandler
+
+
+class UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def serve(config_path: str, listen: str = DEFAULT_DAEMON_URL):
+    load_dotenv()
+    auth_token = os.getenv("HF_TOKEN")
+    if not auth_token:
+        logger.error("HF_TOKEN environment variable not set.")
+        return
+
+    daemon = JobDaemon(config_path, auth_token)
+    host, port = parse_address(listen)
+    if host == "unix":
+        Path(port).unlink(missing_ok=True)
+        server = UnixHTTPServer(port, make_handler(daemon))
+    else:
+        server = ThreadingHTTPServer((host, port), make_handler(daemon))
+
+    logger.info(f"Daemon listening on {listen}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("Shutting down daemon...")
+    finally:
+        server.server_close()
+        daemon.shutdown()
+        if host == "unix":
+            Path(port).unlink(missing_ok=True)
+
+
+def cli_entry(args):
+    serve(args.config, args.listen)
@@ -0,0 +1,81 @@
+import http.client
+import json
+import socket
+import time
+from urllib.parse import urlparse
+
+DEFAULT_DAEMON_URL = "http://127.0.0.1:8765"
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTPConnection over a Unix domain socket."""
+
+    def __init__(self, socket_path: str, timeout: float = 30.0):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def parse_address(url: str) -> tuple[str, str | int]:
+    """
+    Parse a daemon address: "unix:///run/transcribeline.sock", "http://127.0.0.1:8765" or "127.0.0.1:8765".
+    Returns ("unix", socket_path) or (host, port).
+    """
+    if url.startswith("unix://"):
+        return "unix", url[len("unix://") :]
+    parsed = urlparse(url if "://" in url else f"http://{url}")
+    return parsed.hostname or "127.0.0.1", parsed.port or 8765
+
+
+def request(url: str, method: str, path: str, payload: dict | None = None, timeout: float = 30.0) -> dict:
+    """
+    Send a JSON request to the daemon and return the decoded JSON response.
+    """
+    host, port = parse_address(url)
+    if host == "unix":
+        conn = UnixHTTPConnection(port, timeout=timeout)
+    else:
+        conn = http.client.HTTPConnection(host, port, timeout=timeout)
+    try:
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = {"Content-Type": "application/json"} if body is not None else {}
+        conn.request(method, path, body=body, headers=headers)
+        response = conn.getresponse()
+        data = json.loads(response.read() or b"{}")
+        if response.status >= 400:
+            raise RuntimeError(f"Daemon returned {response.status}: {data.get('error', data)}")
+        return data
+    finally:
+        conn.close()
+
+
+def submit_job(url: str, input_path: str, output_dir: str, config_overrides: dict | None = None, priority: int = 0):
+    """
+    Queue a recording on the daemon and return the job record (with its "id").
+    """
+    payload = {
+        "input": input_path,
+        "output": output_dir,
+        "config": config_overrides or {},
+        "priority": priority,
+    }
+    return request(url, "POST", "/jobs", payload)
+
+
+def get_job(url: str, job_id: str) -> dict:
+    return request(url, "GET", f"/jobs/{job_id}")
+
+
+def wait_for_job(url: str, job_id: str, poll_interval: float = 1.0) -> dict:
+    """
+    Poll the daemon until the job is done or failed and return its final record.
+    """
+    while True:
+        job = get_job(url, job_id)
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(poll_interval)
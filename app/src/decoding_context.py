@@ -0,0 +1,237 @@
+import json
+import math
+import time
+import wave
+from pathlib import Path
+
+from src.ledger import recording_of
+from src.metrics import measured_call
+from src.scheduler import get_wav_duration
+from src.speaker_linking import chunk_index
+from src.utils import load_config, setup_logger
+
+logger = setup_logger("decoding_context")
+
+CONTEXT_FILE = "decoding_context.json"
+WHISPER_SAMPLE_RATE = 16000
+SILENT_WINDOW_DBFS = -50.0  # windows quieter than this are not used for detection
+DEFAULT_SETTINGS = {
+    "detect_windows": 3,
+    "detect_window_sec": 30.0,  # Whisper looks at 30 s at a time
+    "initial_prompt": "",
+}
+
+
+def decoding_settings(config) -> dict:
+    """
+    [DECODING] settings merged over DEFAULT_SETTINGS, plus the configured WHISPER.language
+    (None when it is unset or "auto", i.e. when the language has to be detected).
+    """
+    section = getattr(config, "DECODING", None)
+    settings = {key: getattr(section, key, default) for key, default in DEFAULT_SETTINGS.items()}
+    language = getattr(config.WHISPER, "language", None)
+    settings["language"] = language if language and language != "auto" else None
+    return settings
+
+
+def load_contexts(path: Path) -> dict[str, dict]:
+    """
+    {recording: context} from a decoding_context.json file, or {} if there is none yet.
+
+    A recording's context holds its language, detected once from a few sampled windows instead of
+    by every chunk (so all its chunks are decoded with the same language), and optionally an
+    initial prompt stored with `detect-language --initial-prompt`.
+    """
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_contexts(path: Path, contexts: dict[str, dict]):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(contexts, f, ensure_ascii=False, indent=2)
+
+
+def read_window(path: Path, start_sec: float, duration_sec: float):
+    """
+    Mono float32 samples of one window of a 16-bit WAV file, resampled to 16 kHz for Whisper.
+    """
+    import numpy as np
+
+    with wave.open(str(path), "rb") as wav:
+        sample_rate, channels = wav.getframerate(), wav.getnchannels()
+        wav.setpos(min(int(start_sec * sample_rate), wav.getnframes()))
+        data = wav.readframes(int(duration_sec * sample_rate))
+    samples = np.frombuffer(data, dtype="<i2").reshape(-1, channels).mean(axis=1) / 32768.0
+    if sample_rate != WHISPER_SAMPLE_RATE:
+        from scipy.signal import resample_poly
+
+        divisor = math.gcd(sample_rate, WHISPER_SAMPLE_RATE)
+        samples = resample_poly(samples, WHISPER_SAMPLE_RATE // divisor, sample_rate // divisor)
+    return samples.astype(np.float32)
+
+
+def sample_windows(audio_paths: list[Path], windows: int, window_sec: float) -> list:
+    """
+    Pick the `windows` loudest of 2 * windows evenly spaced windows over the recording, treating the
+    (chunk) files as one timeline in order. Silent windows are skipped, as they tell nothing about the language.
+    """
+    import numpy as np
+
+    durations = [get_wav_duration(path) for path in audio_paths]
+    total_sec = sum(durations)
+    candidates = []
+    for k in range(2 * windows):
+        position = total_sec * (k + 0.5) / (2 * windows)
+        for path, duration in zip(audio_paths, durations):
+            if position < duration or path == audio_paths[-1]:
+                start = max(min(position - window_sec / 2, duration - window_sec), 0.0)
+                samples = read_window(path, start, window_sec)
+                rms = float(np.sqrt(np.mean(samples**2))) if len(samples) else 0.0
+                candidates.append((rms, samples))
+                break
+            position -= duration
+
+    threshold = 10 ** (SILENT_WINDOW_DBFS / 20)
+    loudest = sorted(candidates, key=lambda candidate: -candidate[0])[:windows]
+    return [samples for rms, samples in loudest if rms > threshold]
+
+
+def detect_language(audio_paths: list[Path], model_name: str, windows: int = 3, window_sec: float = 30.0) -> dict:
+    """
+    Detect the language of a recording (its chunk files, in order, or the whole file) by averaging
+    Whisper's language probabilities over a few sampled windows. Runs in a transcription worker,
+    whose cached model is then reused for its chunks.
+    """
+    import whisper
+
+    from src.transcriber import load_model
+
+    started_at = time.time()
+    model = load_model(model_name)
+    totals = {}
+    sampled = sample_windows(audio_paths, windows, window_sec)
+    for samples in sampled:
+        mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(samples), model.dims.n_mels).to(model.device)
+        _, probs = model.detect_language(mel)
+        for language, probability in probs.items():
+            totals[language] = totals.get(language, 0.0) + probability / len(sampled)
+    if not totals:
+        raise RuntimeError("No non-silent audio to detect the language from.")
+
+    language = max(totals, key=totals.get)
+    return {
+        "language": language,
+        "language_probability": round(totals[language], 4),
+        "detected_with": model_name,
+        "windows": len(sampled),
+        "detect_sec": round(time.time() - started_at, 3),
+    }
+
+
+def group_recordings(audio_files: list[Path], recording: str | None = None) -> dict[str, list[Path]]:
+    """
+    {recording: its chunk files in chunk order}, or all files under `recording` if given.
+    """
+    by_recording = {}
+    for audio_file in sorted(audio_files, key=lambda path: (recording_of(path.stem), chunk_index(path.stem))):
+        by_recording.setdefault(recording or recording_of(audio_file.stem), []).append(audio_file)
+    return by_recording
+
+
+def needs_detection(contexts: dict[str, dict], recording: str, settings: dict, force: bool = False) -> bool:
+    return settings["language"] is None and (force or "language" not in contexts.get(recording, {}))
+
+
+def submit_detection(executor, chunk_files: list[Path], model_name: str, settings: dict):
+    """
+    Start language detection on the executor; the future's result is (context, metrics sample).
+    """
+    windows, window_sec = settings["detect_windows"], settings["detect_window_sec"]
+    return executor.submit(measured_call, detect_language, chunk_files, model_name, windows, window_sec)
+
+
+def record_detection(contexts: dict[str, dict], recording: str, future) -> dict | None:
+    """
+    Store a finished detection in contexts and return its metrics sample (None if it failed).
+    """
+    try:
+        context, sample = future.result()
+    except Exception as e:
+        logger.error(f"Language detection failed for {recording}, chunks will detect their own: {e}")
+        return None
+    contexts.setdefault(recording, {}).update(context)
+    logger.info(
+        f"Detected language of {recording}: {context['language']} "
+        f"(p={context['language_probability']:.2f}, {context['windows']} windows, {context['detect_sec']:.1f}s)"
+    )
+    return sample
+
+
+def ensure_contexts(
+    executor,
+    audio_files: list[Path],
+    context_path: Path,
+    model_name: str,
+    settings: dict,
+    recording: str | None = None,
+    force: bool = False,
+) -> dict[str, dict]:
+    """
+    Decoding context for every recording among the chunk files (or for `recording`, if all files belong
+    to it), from the cache at context_path or, when the language is not configured and not cached yet
+    (or force is set), detected once per recording on the given executor. Waits for the detections;
+    new results are written back to the cache.
+    """
+    contexts = load_contexts(context_path)
+    futures = {
+        recording: submit_detection(executor, chunk_files, model_name, settings)
+        for recording, chunk_files in group_recordings(audio_files, recording).items()
+        if needs_detection(contexts, recording, settings, force)
+    }
+    for recording, future in futures.items():
+        record_detection(contexts, recording, future)
+    if futures:
+        save_contexts(context_path, contexts)
+    return contexts
+
+
+def decoding_options(settings: dict, context: dict) -> tuple[str | None, str | None]:
+    """
+    (language, initial_prompt) for a chunk task: configured values win over the recording's cached ones.
+    """
+    language = settings["language"] or context.get("language")
+    return language, settings["initial_prompt"] or context.get("initial_prompt") or None
+
+
+def cli_entry(args):
+    from concurrent.futures import ThreadPoolExecutor
+
+    config = load_config(args.config)
+    settings = decoding_settings(config)
+    settings["language"] = None  # detect even if a language is configured
+    if args.windows:
+        settings["detect_windows"] = args.windows
+
+    audio_files = []
+    for path in [Path(p) for p in args.input]:
+        if path.is_dir():
+            audio_files.extend(path.glob("*.wav"))
+        elif path.is_file() and path.suffix == ".wav":
+            audio_files.append(path)
+    if not audio_files:
+        logger.warning("No audio files found for language detection.")
+        return
+
+    # Detection runs in this process; the transcriber runs it on its own worker pool instead
+    context_path = Path(args.output)
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        contexts = ensure_contexts(
+            executor, audio_files, context_path, config.WHISPER.model, settings, args.recording, args.force
+        )
+    if args.initial_prompt is not None:
+        for recording in group_recordings(audio_files, args.recording):
+            contexts.setdefault(recording, {})["initial_prompt"] = args.initial_prompt
+        save_contexts(context_path, contexts)
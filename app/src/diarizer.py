@@ -1,52 +1,100 @@
-import logging
+import functools
+import json
 import os
+import time
 from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 
 from dotenv import load_dotenv
-from tqdm import tqdm
 
+from src.ledger import call_with_retry, open_ledger, recording_of, retry_settings
+from src.log_service import log_context, pool_logging
+from src.metrics import measured_call, open_collector
+from src.profiling import profile_settings, profiled
+from src.scheduler import estimate_makespan, get_wav_duration, report_utilization, schedule
+from src.speaker_linking import embeddings_path, embeddings_to_dict, linking_settings
+from src.store import RecordingStore, parse_rttm
 from src.utils import load_config, setup_logger
 
 logger = setup_logger("diarizer")
 
 
+@functools.lru_cache(maxsize=2)
+def load_pipeline(pipeline_name: str, auth_token: str):
+    """
+    Load a pyannote pipeline once per worker process and keep it warm for subsequent chunks.
+    """
+    from pyannote.audio import Pipeline
+
+    return Pipeline.from_pretrained(pipeline_name, use_auth_token=auth_token)
+
+
+def warm_up(pipeline_name: str, auth_token: str):
+    """
+    Pool initializer: preload the pipeline so the first chunk does not pay the load time.
+    """
+    try:
+        load_pipeline(pipeline_name, auth_token)
+    except Exception as e:
+        logger.error(f"Failed to preload pipeline '{pipeline_name}': {e}")
+
+
 def diarize_audio(
     audio_path: Path,
     output_path: Path,
     pipeline_name: str,
     auth_token: str,
-    logger: logging.Logger,
     max_speakers: int | None = None,
-):
-    from pyannote.audio import Pipeline
+    save_embeddings: bool = False,
+) -> tuple[list[tuple[float, float, str]], dict]:
+    """
+    Diarize one chunk, writing RTTM to output_path (if given). Returns the (start, duration, speaker) turns
+    and, with save_embeddings, the centroid embedding of each speaker ({} otherwise), which is also written
+    next to the RTTM file for cross-chunk speaker linking.
+    """
+    with log_context(stage="diarize", recording=recording_of(audio_path.stem), chunk=audio_path.stem):
+        try:
+            pipeline = load_pipeline(pipeline_name, auth_token)
+        except Exception as e:
+            logger.error(f"Failed to load pipeline '{pipeline_name}': {e}")
+            raise
 
-    try:
-        pipeline = Pipeline.from_pretrained(pipeline_name, use_auth_token=auth_token)
-    except Exception as e:
-        logger.error(f"Failed to load pipeline '{pipeline_name}': {e}")
-        return
+        try:
+            logger.info(f"Starting diarization: {audio_path.name}")
+            options = {"num_speakers": max_speakers} if max_speakers else {}
+            embeddings = {}
+            if save_embeddings:
+                diarization, centroids = pipeline(str(audio_path), return_embeddings=True, **options)
+                embeddings = embeddings_to_dict(diarization.labels(), centroids)
+            else:
+                diarization = pipeline(str(audio_path), **options)
 
-    try:
-        logger.info(f"Starting diarization: {audio_path.name}")
-        if max_speakers:
-            diarization = pipeline(str(audio_path), num_speakers=max_speakers)
-        else:
-            diarization = pipeline(str(audio_path))
-
-        with open(output_path, "w", encoding="utf-8") as f:
-            f.write(diarization.to_rttm())
-        logger.info(f"Diarized: {audio_path.name}")
-    except Exception as e:
-        logger.error(f"Failed to diarize {audio_path.name}: {e}")
+            rttm = diarization.to_rttm()
+            if output_path is not None:
+                with open(output_path, "w", encoding="utf-8") as f:
+                    f.write(rttm)
+                if save_embeddings:
+                    with open(embeddings_path(output_path), "w", encoding="utf-8") as f:
+                        json.dump(embeddings, f)
+            logger.info(f"Diarized: {audio_path.name}")
+            return parse_rttm(rttm.splitlines()), embeddings
+        except Exception as e:
+            logger.error(f"Failed to diarize {audio_path.name}: {e}")
+            raise
 
 
 def cli_entry(args):
     load_dotenv()
     config = load_config(args.config)
-    output_dir = Path(args.output)
-    output_dir.mkdir(parents=True, exist_ok=True)
+    store = RecordingStore(Path(args.store)) if getattr(args, "store", None) else None
+    if store is None and not args.output:
+        logger.error("Either --output or --store is required.")
+        return
+    output_dir = Path(args.output) if args.output else None
+    if output_dir is not None:
+        output_dir.mkdir(parents=True, exist_ok=True)
     max_speakers = getattr(config.DIARIZATION, "max_speakers", None)
+    save_embeddings = linking_settings(config)["enabled"]
 
     # Collect input .wav files from files or directories
     input_paths = [Path(p) for p in args.input]
@@ -72,20 +120,75 @@ def cli_entry(args):
         )
         return
 
+    workers = config.PARALLEL.parallel_workers
+    strategy = getattr(config.PARALLEL, "schedule", "longest_first")
+    scheduled = schedule(audio_files, pipeline_name, strategy, getattr(config.PARALLEL, "cost_factors", None))
+    logger.info(
+        f"Scheduling {len(scheduled)} files ({strategy}), "
+        f"estimated makespan {estimate_makespan([cost for _, cost in scheduled], workers):.0f}s"
+    )
+
+    ledger = open_ledger(args, config)
+    max_attempts, backoff_base_sec = retry_settings(config)
+    if ledger:
+        for audio_file, _ in scheduled:
+            ledger.start(recording_of(audio_file.stem), "diarize", audio_file.stem)
+
     # Run diarization in parallel
-    with ProcessPoolExecutor(max_workers=config.PARALLEL.parallel_workers) as executor:
+    metrics = open_collector(args)
+    spans = []
+    failed = []
+    wall_start = time.time()
+    task = profiled(measured_call, "diarize", profile_settings(args))
+    with ProcessPoolExecutor(max_workers=workers, **pool_logging()) as executor:
         futures = {
             executor.submit(
+                task,
+                call_with_retry,
+                max_attempts,
+                backoff_base_sec,
                 diarize_audio,
                 audio_file,
-                output_dir / f"{audio_file.stem}.rttm",
+                output_dir / f"{audio_file.stem}.rttm" if output_dir else None,
                 pipeline_name,
                 auth_token,
-                logger,
                 max_speakers,
+                save_embeddings,
             ): audio_file
-            for audio_file in audio_files
+            for audio_file, _ in scheduled
         }
         # for future in tqdm(as_completed(futures), total=len(futures), desc="Diarizing"):
         for future in as_completed(futures):
-            future.result()
+            audio_file = futures[future]
+            try:
+                ((turns, embeddings), attempts), sample = future.result()
+            except Exception as e:
+                failed.append(audio_file)
+                if ledger:
+                    ledger.fail(
+                        recording_of(audio_file.stem), "diarize", e, audio_file.stem, getattr(e, "attempts", 1)
+                    )
+                continue
+            started_at, finished_at = sample["started_at"], sample["finished_at"]
+            spans.append((started_at, finished_at))
+            metrics.add(
+                "diarize",
+                recording_of(audio_file.stem),
+                sample,
+                audio_file.stem,
+                get_wav_duration(audio_file),
+                submitted_at=wall_start,
+            )
+            if store is not None:
+                store.put_diarization(audio_file.stem, turns)
+                if embeddings:
+                    store.put_embeddings(audio_file.stem, embeddings)
+            if ledger:
+                ledger.succeed(
+                    recording_of(audio_file.stem), "diarize", audio_file.stem, attempts, finished_at - started_at
+                )
+
+    if failed:
+        logger.error(f"{len(failed)} of {len(futures)} files failed to diarize.")
+    metrics.flush()
+    return report_utilization("diarize", spans, workers, wall_start)
@@ -0,0 +1,537 @@
+import json
+import multiprocessing
+import os
+import shutil
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from src.decoding_context import CONTEXT_FILE, decoding_options, decoding_settings, ensure_contexts, load_contexts
+from src.ledger import backoff_delay, is_transient, retry_settings
+from src.utils import estimate_silence_threshold, load_config, setup_logger
+
+logger = setup_logger("distributed")
+
+STAGING_DIR = ".staging"  # <audio_dir>/.staging/<task ID>.<node>: outputs of a task until it is committed
+
+
+def default_node_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+def write_json_atomic(path: Path, payload: dict):
+    """
+    Write via a uniquely named temp file and rename, so readers on other nodes never see partial JSON.
+    """
+    tmp = path.with_name(f".{path.name}.{uuid.uuid4().hex}.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(payload, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+
+class LeaseExpired(TimeoutError):
+    """
+    A node died (or hung) while holding a task. Transient, so the task is retried with backoff
+    until max_attempts, like any other transient failure.
+    """
+
+
+def read_json(path: Path) -> dict | None:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+class TaskQueue:
+    """
+    Chunk-level task queue in a shared directory (e.g. on NFS), claimed cooperatively by many nodes.
+
+    Layout:
+        tasks/<id>.json     spec (kind, recording, chunk, dependencies) of a task that is not finished yet
+        finished/<id>.json  spec of a task that is done or failed for good, moved out of tasks/
+        leases/<id>.lease   held by the node working on the task; its mtime is the heartbeat
+        done/<id>.json      completion marker
+        failed/<id>.json    attempts and last error; terminal once attempts run out
+
+    Leases are created with O_CREAT|O_EXCL, which is atomic on local filesystems and NFSv3+.
+    A lease whose mtime is older than lease_ttl_sec belongs to a dead node and is reclaimed by
+    renaming it away (only one node's rename can succeed); the reclaim counts as a failed attempt,
+    so a task that keeps killing its node stops after max_attempts. Node clocks must be NTP-synchronized.
+    A task writes its outputs to a staging directory and only commits them (and marks itself done) if
+    its node still holds the lease, so a node that missed its heartbeats never races the node redoing it.
+    A plain directory is used instead of SQLite because SQLite locking is unreliable on NFS.
+
+    A claim costs three directory listings (tasks/, done/, failed/) plus reads of the failure
+    records of pending tasks: specs never change, so each is parsed once per node and cached.
+    """
+
+    def __init__(
+        self,
+        root: Path,
+        node_id: str,
+        lease_ttl_sec: float = 60.0,
+        max_attempts: int = 3,
+        backoff_base_sec: float = 5.0,
+    ):
+        self.root = Path(root)
+        self.node_id = node_id
+        self.lease_ttl_sec = lease_ttl_sec
+        self.max_attempts = max_attempts
+        self.backoff_base_sec = backoff_base_sec
+        self._specs = {}  # task ID -> parsed spec
+        for name in ("tasks", "finished", "leases", "done", "failed"):
+            (self.root / name).mkdir(parents=True, exist_ok=True)
+
+    def _path(self, kind: str, task_id: str) -> Path:
+        suffix = ".lease" if kind == "leases" else ".json"
+        return self.root / kind / f"{task_id}{suffix}"
+
+    # --- Tasks ---
+
+    def enqueue(self, task: dict):
+        """
+        Add a task unless it already exists (enqueueing is idempotent across nodes).
+        """
+        path = self._path("tasks", task["id"])
+        if not path.exists() and not self._path("finished", task["id"]).exists():
+            write_json_atomic(path, task)
+
+    def ids(self, kind: str) -> set[str]:
+        return {name[: -len(".json")] for name in os.listdir(self.root / kind) if name.endswith(".json")}
+
+    def tasks(self) -> list[dict]:
+        """
+        Specs of the tasks that are not finished yet, in ID order.
+        """
+        tasks = []
+        for task_id in sorted(self.ids("tasks")):
+            if task_id not in self._specs:
+                task = read_json(self._path("tasks", task_id))
+                if task is None:  # finished and moved away since the listing
+                    continue
+                self._specs[task_id] = task
+            tasks.append(self._specs[task_id])
+        return tasks
+
+    def is_done(self, task_id: str) -> bool:
+        return self._path("done", task_id).exists()
+
+    def finish(self, task_id: str):
+        """
+        Move a done or terminally failed task's spec out of tasks/, so claims no longer list it.
+        """
+        try:
+            os.replace(self._path("tasks", task_id), self._path("finished", task_id))
+        except FileNotFoundError:
+            pass  # already moved by another node
+
+    def failure(self, task_id: str) -> dict | None:
+        return read_json(self._path("failed", task_id))
+
+    def is_terminal_failure(self, task_id: str) -> bool:
+        failure = self.failure(task_id)
+        return bool(failure and failure.get("terminal"))
+
+    def mark_done(self, task_id: str, duration_sec: float):
+        write_json_atomic(
+            self._path("done", task_id), {"node": self.node_id, "finished_at": time.time(), "duration_sec": duration_sec}
+        )
+        self._path("failed", task_id).unlink(missing_ok=True)
+        self.finish(task_id)
+
+    def mark_failed(self, task_id: str, error: BaseException) -> bool:
+        previous = self.failure(task_id) or {}
+        attempts = previous.get("attempts", 0) + 1
+        terminal = not is_transient(error) or attempts >= self.max_attempts
+        write_json_atomic(
+            self._path("failed", task_id),
+            {
+                "node": self.node_id,
+                "attempts": attempts,
+                "error": f"{type(error).__name__}: {error}",
+                "terminal": terminal,
+                "next_attempt_at": None if terminal else time.time() + backoff_delay(attempts, self.backoff_base_sec),
+            },
+        )
+        if terminal:
+            self.finish(task_id)
+        return terminal
+
+    # --- Leases ---
+
+    def acquire(self, task_id: str) -> bool:
+        """
+        Take the lease on a task. A stale lease is reclaimed and recorded as a failed attempt
+        (LeaseExpired); the task is then left to its backoff rather than claimed right away.
+        """
+        lease = self._path("leases", task_id)
+        if self._create_lease(lease):
+            return True
+        try:
+            age = time.time() - lease.stat().st_mtime
+        except FileNotFoundError:
+            return self._create_lease(lease)
+        if age <= self.lease_ttl_sec:
+            return False
+
+        # Stale lease: move it out of the way; only one node's rename succeeds
+        tombstone = lease.with_name(f"{lease.name}.{self.node_id}.{uuid.uuid4().hex}.stale")
+        try:
+            os.rename(lease, tombstone)
+        except FileNotFoundError:
+            return False
+        if time.time() - tombstone.stat().st_mtime <= self.lease_ttl_sec:
+            # Another node reclaimed it (or its owner heartbeated) between our stat and rename: hand the fresh
+            # lease back. If a third node took the empty path meanwhile, or the owner's heartbeat found it
+            # empty, the owner has lost it and abandons the task without committing (see work).
+            try:
+                os.link(tombstone, lease)
+            except FileExistsError:
+                pass
+            tombstone.unlink(missing_ok=True)
+            return False
+        stale = read_json(tombstone) or {}
+        tombstone.unlink(missing_ok=True)
+        node = stale.get("node", "?")
+        terminal = self.mark_failed(task_id, LeaseExpired(f"node {node} stopped heartbeating ({age:.0f}s)"))
+        logger.warning(
+            f"Reclaimed {task_id} from dead node {node} (lease {age:.0f}s old)"
+            + ("; attempts exhausted, giving up" if terminal else "; retrying after backoff")
+        )
+        return False
+
+    def _create_lease(self, lease: Path) -> bool:
+        try:
+            fd = os.open(lease, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"node": self.node_id, "acquired_at": time.time()}, f)
+        return True
+
+    def heartbeat(self, task_id: str) -> bool:
+        """
+        Refresh a held lease. Returns False if it was lost (reclaimed by another node).
+        """
+        lease = self._path("leases", task_id)
+        owner = read_json(lease)
+        if not owner or owner.get("node") != self.node_id:
+            return False
+        try:
+            os.utime(lease)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def release(self, task_id: str):
+        lease = self._path("leases", task_id)
+        owner = read_json(lease)
+        if owner and owner.get("node") == self.node_id:
+            lease.unlink(missing_ok=True)
+
+
+class Heartbeat:
+    """
+    Background thread that keeps the leases of the tasks this node is working on fresh,
+    and remembers the ones it found lost.
+    """
+
+    def __init__(self, queue: TaskQueue, interval_sec: float):
+        self.queue = queue
+        self.interval_sec = interval_sec
+        self.task_id = None
+        self.lost = set()  # IDs of tasks whose lease was reclaimed while this node was running them
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="lease-heartbeat", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval_sec):
+            task_id = self.task_id
+            if task_id and not self.queue.heartbeat(task_id):
+                self.lost.add(task_id)
+                logger.warning(f"Lost lease on {task_id}; its outputs will be discarded, another node redoes it.")
+
+    def holds(self, task_id: str) -> bool:
+        """
+        Whether this node still holds the task's lease, checked right now (not just at the last heartbeat).
+        """
+        return task_id not in self.lost and self.queue.heartbeat(task_id)
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+# --- Task graph ---
+
+
+def recording_tasks(audio_path: Path, output_dir: Path) -> dict:
+    """
+    The root task of a recording: chunking, which fans out into chunk-level tasks when it completes.
+    """
+    audio_dir = output_dir.resolve() / audio_path.stem
+    return {
+        "id": f"{audio_path.stem}.chunk",
+        "kind": "chunk",
+        "recording": audio_path.stem,
+        "audio": str(audio_path.resolve()),
+        "audio_dir": str(audio_dir),
+        "deps": [],
+    }
+
+
+def chunk_tasks(parent: dict, chunk_paths: list[Path]) -> list[dict]:
+    """
+    transcribe + diarize per chunk, align once both are done, and postprocess once all aligns are done.
+    """
+    base = {"recording": parent["recording"], "audio": parent["audio"], "audio_dir": parent["audio_dir"]}
+    tasks = []
+    for chunk_path in chunk_paths:
+        chunk = chunk_path.stem
+        tasks.append({**base, "id": f"{chunk}.transcribe", "kind": "transcribe", "chunk": chunk, "deps": []})
+        tasks.append({**base, "id": f"{chunk}.diarize", "kind": "diarize", "chunk": chunk, "deps": []})
+        tasks.append(
+            {
+                **base,
+                "id": f"{chunk}.align",
+                "kind": "align",
+                "chunk": chunk,
+                "deps": [f"{chunk}.transcribe", f"{chunk}.diarize"],
+            }
+        )
+    tasks.append(
+        {
+            **base,
+            "id": f"{parent['recording']}.postprocess",
+            "kind": "postprocess",
+            "deps": [f"{chunk_path.stem}.align" for chunk_path in chunk_paths],
+        }
+    )
+    return tasks
+
+
+def run_task(task: dict, config, staging_dir: Path) -> list[dict]:
+    """
+    Execute one task in this node's process. Models stay warm across tasks via the per-process caches.
+    Inputs are read from the recording's output directory, outputs are written under staging_dir (laid
+    out the same way) for work() to commit. Returns the tasks it fans out into.
+    """
+    audio_dir = Path(task["audio_dir"])
+    chunk = task.get("chunk")
+    children = []
+
+    if task["kind"] == "chunk":
+        from src.chunker import chunk_audio
+        from src.preprocessor import preprocess_settings
+
+        audio_path = Path(task["audio"])
+        # Same chunk boundaries as `process` and streaming for the same config
+        preprocess = preprocess_settings(config)
+        if preprocess["enabled"]:
+            silence_thresh_db = None  # taken from the preprocessed scan
+        else:
+            silence_thresh_db = estimate_silence_threshold(str(audio_path), offset_db=-15.0)
+        chunk_paths = chunk_audio(
+            input_file=audio_path,
+            output_dir=staging_dir / "chunks",
+            max_duration_sec=config.CHUNKING.max_chunk_duration_sec,
+            silence_thresh_db=silence_thresh_db,
+            min_silence_len_sec=config.CHUNKING.min_silence_duration_sec,
+            preprocess=preprocess if preprocess["enabled"] else None,
+        )
+        decoding = decoding_settings(config)
+        if decoding["language"] is None:
+            # Detect the language once here (warming this node's Whisper model) instead of in every chunk task
+            context_path = staging_dir / CONTEXT_FILE
+            if (audio_dir / CONTEXT_FILE).exists():
+                shutil.copy2(audio_dir / CONTEXT_FILE, context_path)  # keep the cached contexts
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                ensure_contexts(executor, [audio_path], context_path, config.WHISPER.model, decoding, task["recording"])
+        children = chunk_tasks(task, chunk_paths)
+
+    elif task["kind"] == "transcribe":
+        from src.transcriber import transcribe_audio
+
+        context = load_contexts(audio_dir / CONTEXT_FILE).get(task["recording"], {})
+        (staging_dir / "transcripts").mkdir(parents=True, exist_ok=True)
+        transcribe_audio(
+            audio_dir / "chunks" / f"{chunk}.wav",
+            staging_dir / "transcripts" / f"{chunk}.json",
+            config.WHISPER.model,
+            *decoding_options(decoding_settings(config), context),
+        )
+
+    elif task["kind"] == "diarize":
+        from src.diarizer import diarize_audio
+        from src.speaker_linking import linking_settings
+
+        (staging_dir / "diarizations").mkdir(parents=True, exist_ok=True)
+        diarize_audio(
+            audio_dir / "chunks" / f"{chunk}.wav",
+            staging_dir / "diarizations" / f"{chunk}.rttm",
+            config.DIARIZATION.model,
+            os.getenv("HF_TOKEN"),
+            getattr(config.DIARIZATION, "max_speakers", None),
+            linking_settings(config)["enabled"],
+        )
+
+    elif task["kind"] == "align":
+        from src.aligner import align_pair
+
+        (staging_dir / "aligns").mkdir(parents=True, exist_ok=True)
+        align_pair(
+            audio_dir / "transcripts" / f"{chunk}.json",
+            audio_dir / "diarizations" / f"{chunk}.rttm",
+            staging_dir / "aligns" / f"{chunk}.aligned.json",
+        )
+
+    elif task["kind"] == "postprocess":
+        from src.postprocessor import merge_aligned_chunks
+        from src.speaker_linking import link_recording, linking_settings
+
+        speaker_map = None
+        settings = linking_settings(config)
+        if settings["enabled"]:
+            speaker_map = link_recording(staging_dir / "speaker_map.json", settings, [audio_dir / "diarizations"])
+        merge_aligned_chunks(
+            [str(audio_dir / "aligns")], staging_dir / "formatted" / f"{task['recording']}.txt", speaker_map
+        )
+
+    else:
+        raise ValueError(f"Unknown task kind: {task['kind']}")
+    return children
+
+
+def commit_outputs(staging_dir: Path, audio_dir: Path):
+    """
+    Move a task's staged outputs into the recording's output directory. Each file is replaced atomically,
+    so readers never see a partial output, and a rerun never leaves a stale one in place.
+    """
+    for staged in sorted(staging_dir.rglob("*")):
+        if staged.is_file():
+            target = audio_dir / staged.relative_to(staging_dir)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(staged, target)
+
+
+def claim_next(queue: TaskQueue) -> tuple[dict | None, bool]:
+    """
+    Claim the next ready task: not done, not backing off and with all dependencies done.
+    A task whose dependency failed for good fails for good too. Returns (task, all_finished).
+    """
+    tasks = queue.tasks()
+    done = queue.ids("done")
+    failed = queue.ids("failed")
+    now = time.time()
+    for task in tasks:
+        if task["id"] in done:
+            queue.finish(task["id"])  # its node died between marking it done and moving it
+            continue
+        failure = queue.failure(task["id"]) if task["id"] in failed else None
+        if failure and failure.get("terminal"):
+            queue.finish(task["id"])
+            continue
+        blocked_by = [dep for dep in task.get("deps", []) if dep in failed and queue.is_terminal_failure(dep)]
+        if blocked_by:
+            queue.mark_failed(task["id"], RuntimeError(f"dependency {blocked_by[0]} failed for good"))
+            continue
+        if failure and (failure.get("next_attempt_at") or 0) > now:
+            continue
+        if not all(dep in done for dep in task.get("deps", [])) or not queue.acquire(task["id"]):
+            continue
+        if queue.is_done(task["id"]):  # finished by another node just before we claimed it
+            queue.release(task["id"])
+            continue
+        return task, False
+    return None, not tasks
+
+
+def work(queue_dir: Path, config_path: str, node_id: str | None = None) -> int:
+    """
+    Node main loop: claim and run tasks until every task in the queue is finished.
+    Returns the number of tasks this node completed.
+    """
+    load_dotenv()
+    config = load_config(config_path)
+    settings = getattr(config, "DISTRIBUTED", None)
+    lease_ttl_sec = getattr(settings, "lease_ttl_sec", 60.0)
+    poll_interval_sec = getattr(settings, "poll_interval_sec", 2.0)
+    max_attempts, backoff_base_sec = retry_settings(config)
+
+    node_id = node_id or default_node_id()
+    queue = TaskQueue(queue_dir, node_id, lease_ttl_sec, max_attempts, backoff_base_sec)
+    heartbeat = Heartbeat(queue, getattr(settings, "heartbeat_sec", lease_ttl_sec / 4))
+    completed = 0
+    logger.info(f"Node {node_id} working on {queue_dir}")
+
+    try:
+        while True:
+            task, all_finished = claim_next(queue)
+            if task is None:
+                if all_finished:
+                    break
+                time.sleep(poll_interval_sec)
+                continue
+
+            heartbeat.lost.discard(task["id"])
+            heartbeat.task_id = task["id"]
+            started_at = time.time()
+            staging_dir = Path(task["audio_dir"]) / STAGING_DIR / f"{task['id']}.{node_id}"
+            try:
+                logger.info(f"[{node_id}] Running {task['id']}")
+                children = run_task(task, config, staging_dir)
+                # A node whose lease was reclaimed (missed heartbeats) must not overwrite the outputs of the
+                # node redoing the task, nor mark it done
+                if not heartbeat.holds(task["id"]):
+                    logger.warning(f"[{node_id}] Lost the lease on {task['id']}; discarding its outputs.")
+                    continue
+                commit_outputs(staging_dir, Path(task["audio_dir"]))
+                for child in children:
+                    queue.enqueue(child)
+                queue.mark_done(task["id"], time.time() - started_at)
+                completed += 1
+            except Exception as e:
+                if not heartbeat.holds(task["id"]):
+                    logger.warning(f"[{node_id}] {task['id']} failed after its lease was lost: {e}")
+                    continue
+                terminal = queue.mark_failed(task["id"], e)
+                logger.error(f"[{node_id}] {task['id']} failed{' for good' if terminal else ''}: {e}")
+            finally:
+                heartbeat.task_id = None
+                shutil.rmtree(staging_dir, ignore_errors=True)
+                queue.release(task["id"])
+    finally:
+        heartbeat.stop()
+
+    logger.info(f"Node {node_id} finished: {completed} tasks completed, queue drained.")
+    return completed
+
+
+def enqueue_recordings(queue_dir: Path, audio_files: list[Path], output_dir: Path):
+    queue = TaskQueue(queue_dir, default_node_id())
+    for audio_path in audio_files:
+        queue.enqueue(recording_tasks(audio_path, output_dir))
+        logger.info(f"Enqueued {audio_path.name}")
+
+
+def run_local_nodes(queue_dir: Path, config_path: str, count: int):
+    """
+    Run `count` node processes on this machine (e.g. to exercise the protocol without a cluster).
+    """
+    base = default_node_id()
+    nodes = [
+        multiprocessing.Process(target=work, args=(queue_dir, config_path, f"{base}-{i}"), name=f"node-{i}")
+        for i in range(count)
+    ]
+    for node in nodes:
+        node.start()
+    for node in nodes:
+        node.join()
@@ -0,0 +1,232 @@
+import sqlite3
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from src.utils import setup_logger
+
+logger = setup_logger("ledger")
+
+# Failures worth retrying: I/O hiccups on shared storage, network (model downloads), memory pressure
+TRANSIENT_ERRORS = (OSError, TimeoutError, ConnectionError, MemoryError)
+
+RECORDING_STAGES = ("chunk", "postprocess")
+CHUNK_STAGES = ("transcribe", "diarize", "align")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS recordings (
+    recording TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    output_dir TEXT NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS tasks (
+    recording TEXT NOT NULL,
+    chunk TEXT NOT NULL DEFAULT '',
+    stage TEXT NOT NULL,
+    state TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    started_at REAL,
+    finished_at REAL,
+    duration_sec REAL,
+    error TEXT,
+    next_attempt_at REAL,
+    PRIMARY KEY (recording, chunk, stage)
+);
+"""
+
+
+def is_transient(error: BaseException) -> bool:
+    return isinstance(error, TRANSIENT_ERRORS)
+
+
+def backoff_delay(attempt: int, base_sec: float, max_sec: float = 300.0) -> float:
+    """
+    Exponential backoff: base, 2*base, 4*base, ... capped at max_sec.
+    """
+    return min(base_sec * 2 ** (attempt - 1), max_sec)
+
+
+def call_with_retry(max_attempts: int, backoff_base_sec: float, func, *args, **kwargs) -> tuple:
+    """
+    Run func, retrying transient failures with exponential backoff. Returns (result, attempts).
+
+    The final exception is re-raised with an `attempts` attribute so callers can record it.
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            return func(*args, **kwargs), attempt
+        except Exception as e:
+            if not is_transient(e) or attempt >= max_attempts:
+                e.attempts = attempt
+                raise
+            delay = backoff_delay(attempt, backoff_base_sec)
+            logger.warning(f"Transient failure ({e}), retrying in {delay:.0f}s (attempt {attempt}/{max_attempts})")
+            time.sleep(delay)
+
+
+def retry_settings(config) -> tuple[int, float]:
+    """
+    (max_attempts, backoff_base_sec) from the [LEDGER] config section.
+    """
+    ledger_config = getattr(config, "LEDGER", None)
+    return getattr(ledger_config, "max_attempts", 3), getattr(ledger_config, "backoff_base_sec", 5.0)
+
+
+def recording_of(chunk_stem: str) -> str:
+    """
+    Chunk files are named "<recording>_<NN>"; strip the index to get the recording name.
+    """
+    return chunk_stem.rsplit("_", 1)[0]
+
+
+class Ledger:
+    """
+    SQLite-backed record of every recording, chunk and stage: state (pending/running/done/failed),
+    timings, attempts and the last error. Used by `pipeline.py --resume` to requeue only unfinished work.
+    """
+
+    def __init__(self, path: Path, max_attempts: int = 3, backoff_base_sec: float = 5.0):
+        self.path = Path(path)
+        self.max_attempts = max_attempts
+        self.backoff_base_sec = backoff_base_sec
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=30.0, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(SCHEMA)
+
+    @classmethod
+    def from_config(cls, path: Path, config) -> "Ledger":
+        max_attempts, backoff_base_sec = retry_settings(config)
+        return cls(path, max_attempts=max_attempts, backoff_base_sec=backoff_base_sec)
+
+    def close(self):
+        self._conn.close()
+
+    def add_recording(self, recording: str, audio_path: Path, output_dir: Path):
+        self._conn.execute(
+            "INSERT OR IGNORE INTO recordings (recording, path, output_dir, created_at) VALUES (?, ?, ?, ?)",
+            (recording, str(audio_path), str(output_dir), time.time()),
+        )
+
+    def recordings(self) -> list[sqlite3.Row]:
+        return self._conn.execute("SELECT * FROM recordings ORDER BY recording").fetchall()
+
+    def task(self, recording: str, stage: str, chunk: str = "") -> sqlite3.Row | None:
+        return self._conn.execute(
+            "SELECT * FROM tasks WHERE recording = ? AND chunk = ? AND stage = ?", (recording, chunk, stage)
+        ).fetchone()
+
+    def start(self, recording: str, stage: str, chunk: str = ""):
+        self._conn.execute(
+            """
+            INSERT INTO tasks (recording, chunk, stage, state, started_at) VALUES (?, ?, ?, 'running', ?)
+            ON CONFLICT (recording, chunk, stage)
+            DO UPDATE SET state = 'running', started_at = excluded.started_at, finished_at = NULL
+            """,
+            (recording, chunk, stage, time.time()),
+        )
+
+    def succeed(self, recording: str, stage: str, chunk: str = "", attempts: int = 1, duration_sec=None):
+        now = time.time()
+        self._conn.execute(
+            """
+            UPDATE tasks SET state = 'done', attempts = attempts + ?, finished_at = ?,
+                duration_sec = COALESCE(?, ? - started_at), error = NULL, next_attempt_at = NULL
+            WHERE recording = ? AND chunk = ? AND stage = ?
+            """,
+            (attempts, now, duration_sec, now, recording, chunk, stage),
+        )
+
+    def fail(self, recording: str, stage: str, error: BaseException, chunk: str = "", attempts: int = 1):
+        now = time.time()
+        row = self.task(recording, stage, chunk)
+        total_attempts = (row["attempts"] if row else 0) + attempts
+        next_attempt_at = None
+        if is_transient(error) and total_attempts < self.max_attempts:
+            next_attempt_at = now + backoff_delay(total_attempts, self.backoff_base_sec)
+        self._conn.execute(
+            """
+            UPDATE tasks SET state = 'failed', attempts = ?, finished_at = ?, duration_sec = ? - started_at,
+                error = ?, next_attempt_at = ?
+            WHERE recording = ? AND chunk = ? AND stage = ?
+            """,
+            (total_attempts, now, now, f"{type(error).__name__}: {error}", next_attempt_at, recording, chunk, stage),
+        )
+
+    @contextmanager
+    def track(self, recording: str, stage: str, chunk: str = ""):
+        """
+        Record an in-process stage run: running on entry, done or failed (re-raising) on exit.
+        """
+        self.start(recording, stage, chunk)
+        try:
+            yield
+        except Exception as e:
+            self.fail(recording, stage, e, chunk)
+            raise
+        self.succeed(recording, stage, chunk)
+
+    def _record_interrupted(self, row: sqlite3.Row) -> sqlite3.Row:
+        """
+        Count a leftover 'running' row (its process crashed or was killed before recording the outcome)
+        as a failed attempt, backing off from when it started.
+        """
+        attempts = row["attempts"] + 1
+        next_attempt_at = None
+        if attempts < self.max_attempts:
+            next_attempt_at = (row["started_at"] or time.time()) + backoff_delay(attempts, self.backoff_base_sec)
+        self._conn.execute(
+            """
+            UPDATE tasks SET state = 'failed', attempts = ?, error = ?, next_attempt_at = ?
+            WHERE recording = ? AND chunk = ? AND stage = ?
+            """,
+            (
+                attempts,
+                "Interrupted: the process running it exited without recording a result",
+                next_attempt_at,
+                row["recording"],
+                row["chunk"],
+                row["stage"],
+            ),
+        )
+        return self.task(row["recording"], row["stage"], row["chunk"])
+
+    def needs_run(self, recording: str, stage: str, chunk: str = "") -> bool:
+        """
+        True if the task never ran or failed and is still eligible: under the attempt limit
+        and past its backoff time. Meant for resuming, when nothing else is running: a task
+        still marked running was interrupted and counts as a failed attempt.
+        """
+        row = self.task(recording, stage, chunk)
+        if row is None:
+            return True
+        if row["state"] == "done":
+            return False
+        if row["state"] == "running":
+            row = self._record_interrupted(row)
+        if row["attempts"] >= self.max_attempts:
+            logger.warning(f"Giving up on {stage} {chunk or recording}: {row['attempts']} attempts, {row['error']}")
+            return False
+        if row["next_attempt_at"] and row["next_attempt_at"] > time.time():
+            wait = row["next_attempt_at"] - time.time()
+            logger.info(f"Backing off {stage} {chunk or recording} for another {wait:.0f}s")
+            return False
+        return True
+
+    def summary(self) -> dict:
+        rows = self._conn.execute("SELECT stage, state, COUNT(*) AS n FROM tasks GROUP BY stage, state").fetchall()
+        summary = {}
+        for row in rows:
+            summary.setdefault(row["stage"], {})[row["state"]] = row["n"]
+        return summary
+
+
+def open_ledger(args, config) -> Ledger | None:
+    """
+    Open the ledger given by a subcommand's --ledger option, if any.
+    """
+    path = getattr(args, "ledger", None)
+    return Ledger.from_config(Path(path), config) if path else None
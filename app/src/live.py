@@ -0,0 +1,205 @@
+import json
+import os
+import statistics
+import struct
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+from dotenv import load_dotenv
+
+from src.chunker import RollingChunker, write_wav
+from src.profiling import profile_settings
+from src.streaming import ChunkPipeline
+from src.utils import load_config, setup_logger
+
+logger = setup_logger("live")
+
+READ_SIZE = 64 * 1024
+
+
+def read_wav_header(stream) -> dict:
+    """
+    Parse a RIFF/WAVE header from a (possibly non-seekable) byte stream, leaving the stream
+    positioned at the first PCM byte. The data chunk size is ignored so growing files work.
+    """
+    riff = stream.read(12)
+    if len(riff) < 12 or riff[:4] != b"RIFF" or riff[8:12] != b"WAVE":
+        raise ValueError("Input is not a RIFF/WAVE stream.")
+
+    params = None
+    while True:
+        header = stream.read(8)
+        if len(header) < 8:
+            raise ValueError("WAV stream ended before the data chunk.")
+        chunk_id, size = header[:4], struct.unpack("<I", header[4:])[0]
+        if chunk_id == b"data":
+            if params is None:
+                raise ValueError("WAV data chunk found before the fmt chunk.")
+            return params
+        body = stream.read(size + (size & 1))
+        if chunk_id == b"fmt ":
+            audio_format, channels, sample_rate = struct.unpack("<HHI", body[:8])
+            bits = struct.unpack("<H", body[14:16])[0]
+            if audio_format not in (1, 0xFFFE):
+                raise ValueError(f"Unsupported WAV encoding (format tag {audio_format}); only PCM is supported.")
+            params = {"sample_rate": sample_rate, "channels": channels, "sample_width": bits // 8}
+
+
+def iter_pcm_blocks(stream, channels: int, follow: bool = False, poll_interval: float = 0.2, idle_timeout=10.0):
+    """
+    Read 16-bit PCM from a stream and yield int16 arrays shaped (samples, channels).
+
+    With follow=True the stream is treated as a growing file: at EOF, keep polling for new data
+    until nothing has been appended for idle_timeout seconds.
+    """
+    frame_bytes = 2 * channels
+    leftover = b""
+    last_data_at = time.monotonic()
+    while True:
+        data = stream.read(READ_SIZE)
+        if not data:
+            if not follow or time.monotonic() - last_data_at > idle_timeout:
+                break
+            time.sleep(poll_interval)
+            continue
+        last_data_at = time.monotonic()
+        data = leftover + data
+        usable = len(data) - len(data) % frame_bytes
+        leftover = data[usable:]
+        if usable:
+            yield np.frombuffer(data[:usable], dtype="<i2").reshape(-1, channels)
+
+
+def latency_summary(latencies: list[float]) -> dict:
+    if not latencies:
+        return {"chunks": 0}
+    ordered = sorted(latencies)
+    return {
+        "chunks": len(ordered),
+        "mean_sec": round(statistics.fmean(ordered), 3),
+        "p50_sec": round(ordered[len(ordered) // 2], 3),
+        "p95_sec": round(ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)], 3),
+        "max_sec": round(ordered[-1], 3),
+    }
+
+
+def stream_transcribe(
+    stream,
+    config,
+    output_path: Path,
+    work_dir: Path,
+    base_name: str = "stream",
+    input_format: str = "raw",
+    sample_rate: int = 16000,
+    channels: int = 1,
+    follow: bool = False,
+    idle_timeout: float = 10.0,
+    silence_thresh_db: float | None = None,
+    profile: tuple[str, Path] | None = None,
+) -> dict:
+    """
+    Transcribe a live PCM stream: cut it into chunks with the rolling chunker, send each finalized chunk
+    to warm transcriber/diarizer workers and append aligned speaker turns to output_path (JSON lines)
+    as they arrive. Returns the end-to-end latency summary (chunk finalized -> turns written).
+    """
+    if input_format == "wav":
+        params = read_wav_header(stream)
+        if params["sample_width"] != 2:
+            raise ValueError(f"Only 16-bit PCM is supported, got {8 * params['sample_width']}-bit.")
+        sample_rate, channels = params["sample_rate"], params["channels"]
+    logger.info(f"Streaming {channels}ch {sample_rate}Hz PCM ({input_format}) from {base_name}")
+
+    load_dotenv()
+    auth_token = os.getenv("HF_TOKEN")
+    if not auth_token:
+        raise RuntimeError("HF_TOKEN environment variable not set.")
+
+    chunks_dir = work_dir / "chunks"
+    chunks_dir.mkdir(parents=True, exist_ok=True)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+
+    finalized_at = {}
+    latencies = []
+    out = open(output_path, "a", encoding="utf-8")
+
+    def append_turns(stem: str, aligned_path: Path, offset_sec: float):
+        with open(aligned_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        for seg in data.get("segments", []):
+            turn = {
+                "chunk": stem,
+                "start": round(seg["start"] + offset_sec, 3),
+                "end": round(seg["end"] + offset_sec, 3),
+                "speaker": seg["speaker"],
+                "text": seg["text"].strip(),
+            }
+            out.write(json.dumps(turn, ensure_ascii=False) + "\n")
+        out.flush()
+        latency = time.monotonic() - finalized_at[stem]
+        latencies.append(latency)
+        logger.info(f"Chunk {stem} appended, end-to-end latency {latency:.2f}s")
+
+    chunker = RollingChunker(
+        sample_rate,
+        max_duration_sec=config.CHUNKING.max_chunk_duration_sec,
+        min_silence_len_sec=config.CHUNKING.min_silence_duration_sec,
+        silence_thresh_db=silence_thresh_db,
+        force_cut=True,
+    )
+    pipeline = ChunkPipeline(
+        config,
+        work_dir / "transcripts",
+        work_dir / "diarizations",
+        work_dir / "aligns",
+        auth_token,
+        on_aligned=append_turns,
+        profile=profile,
+    )
+    try:
+        blocks = iter_pcm_blocks(stream, channels, follow=follow, idle_timeout=idle_timeout)
+        for idx, (samples, offset_sec, duration_sec) in enumerate(chunker.chunks(blocks)):
+            chunk_path = chunks_dir / f"{base_name}_{idx:02d}.wav"
+            write_wav(chunk_path, samples, sample_rate)
+            finalized_at[chunk_path.stem] = time.monotonic()
+            logger.info(f"Chunk finalized: {chunk_path.name} ({duration_sec:.1f}s at {offset_sec:.1f}s)")
+            pipeline.submit(chunk_path, offset_sec)
+    finally:
+        pipeline.close()
+        out.close()
+
+    summary = latency_summary(latencies)
+    logger.info(f"Stream finished after {chunker.position_sec:.1f}s of audio. Latency: {summary}")
+    return summary
+
+
+def cli_entry(args):
+    config = load_config(args.config)
+    input_format = args.format or ("wav" if args.input.lower().endswith(".wav") else "raw")
+    base_name = "stream" if args.input == "-" else Path(args.input).stem
+    work_dir = Path(args.work_dir) if args.work_dir else Path(args.output).parent / base_name
+
+    if args.input == "-":
+        stream = sys.stdin.buffer
+    else:
+        # Also works for FIFOs: open() blocks until a writer connects, read() returns b"" when it closes
+        stream = open(args.input, "rb")
+    try:
+        stream_transcribe(
+            stream,
+            config,
+            Path(args.output),
+            work_dir,
+            base_name=base_name,
+            input_format=input_format,
+            sample_rate=args.sample_rate,
+            channels=args.channels,
+            follow=args.follow,
+            idle_timeout=args.idle_timeout,
+            silence_thresh_db=args.silence_thresh,
+            profile=profile_settings(args),
+        )
+    finally:
+        if stream is not sys.stdin.buffer:
+            stream.close()
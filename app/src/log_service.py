@@ -0,0 +1,140 @@
+import contextvars
+import json
+import logging
+import multiprocessing
+from contextlib import contextmanager
+from logging.handlers import QueueHandler, QueueListener
+from pathlib import Path
+
+CONTEXT_FIELDS = ("recording", "chunk", "stage")
+
+_context = contextvars.ContextVar("log_context", default={})
+_queue = None  # queue of the running LogService, handed to pool workers by pool_logging
+
+
+@contextmanager
+def log_context(**ids):
+    """
+    Tag every record logged inside the block (in this thread or task) with the given IDs,
+    e.g. log_context(stage="transcribe", recording="interview", chunk="interview_003").
+    """
+    token = _context.set({**_context.get(), **ids})
+    try:
+        yield
+    finally:
+        _context.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """
+    Copy the current log_context onto the record. Runs in the emitting process, before the record is queued.
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        for key, value in _context.get().items():
+            if not hasattr(record, key):
+                setattr(record, key, value)
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per record: time, level, logger, pid, message and any recording/chunk/stage IDs.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "pid": record.process,
+            "message": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False)
+
+
+def queue_handler(queue) -> QueueHandler:
+    handler = QueueHandler(queue)
+    handler.addFilter(ContextFilter())
+    return handler
+
+
+def replace_root_handlers(*handlers: logging.Handler) -> list[logging.Handler]:
+    """
+    Swap the root logger's handlers for the given ones and return the previous handlers.
+    """
+    root = logging.getLogger()
+    previous = root.handlers[:]
+    for handler in previous:
+        root.removeHandler(handler)
+    for handler in handlers:
+        root.addHandler(handler)
+    return previous
+
+
+class LogService:
+    """
+    Routes all records of this process and of the pools created with pool_logging() through one queue.
+    Workers never write to the console themselves: the listener thread in the parent owns the real
+    handlers, the existing console handler plus, with json_path, a JSON-lines file tagged with the
+    log_context IDs. Use as a context manager, or call stop() to flush and restore the handlers.
+    """
+
+    def __init__(self, json_path: Path | None = None):
+        global _queue
+        self.queue = multiprocessing.Queue()
+        self.json_handler = None
+        handlers = logging.getLogger().handlers[:]
+        if json_path is not None:
+            Path(json_path).parent.mkdir(parents=True, exist_ok=True)
+            self.json_handler = logging.FileHandler(json_path, encoding="utf-8")
+            self.json_handler.setFormatter(JsonFormatter())
+            handlers.append(self.json_handler)
+
+        self.listener = QueueListener(self.queue, *handlers, respect_handler_level=True)
+        self.listener.start()
+        self.previous_handlers = replace_root_handlers(queue_handler(self.queue))
+        _queue = self.queue
+
+    def stop(self):
+        global _queue
+        _queue = None
+        replace_root_handlers(*self.previous_handlers)
+        self.listener.stop()  # writes out the records still queued
+        if self.json_handler is not None:
+            self.json_handler.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def start_logging(json_path: Path | None = None) -> LogService:
+    return LogService(Path(json_path) if json_path else None)
+
+
+def init_worker(queue, initializer=None, *initargs):
+    """
+    Pool initializer: send this worker's records to the parent's listener, then run the pool's own initializer.
+    """
+    replace_root_handlers(queue_handler(queue))
+    if initializer is not None:
+        initializer(*initargs)
+
+
+def pool_logging(initializer=None, *initargs) -> dict:
+    """
+    ProcessPoolExecutor keyword arguments that run initializer(*initargs) in each worker and,
+    while a LogService is running, route the worker's records to it.
+    """
+    if _queue is None:
+        return {"initializer": initializer, "initargs": initargs}
+    return {"initializer": init_worker, "initargs": (_queue, initializer, *initargs)}
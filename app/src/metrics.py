@@ -0,0 +1,244 @@
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from src.utils import setup_logger
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = setup_logger("metrics")
+
+PROMETHEUS_PREFIX = "transcribeline"
+
+# (field, metric name, help) exported per recording and stage to the Prometheus textfile
+PROMETHEUS_METRICS = (
+    ("tasks", "stage_tasks", "Tasks (chunks, or whole recordings for chunk/postprocess) run in a stage."),
+    ("wall_sec", "stage_wall_seconds", "Wall time spent in a stage, summed over its tasks."),
+    ("cpu_sec", "stage_cpu_seconds", "CPU time spent in a stage, summed over its tasks."),
+    ("audio_sec", "stage_audio_seconds", "Seconds of audio processed by a stage."),
+    ("rtf", "stage_real_time_factor", "Wall time per second of audio (below 1 is faster than real time)."),
+    ("throughput", "stage_throughput_ratio", "Seconds of audio processed per second of stage wall clock."),
+    ("peak_rss_mb", "stage_peak_rss_megabytes", "Highest resident set size of any process running the stage."),
+    ("queue_wait_sec", "stage_queue_wait_seconds", "Time tasks spent submitted but not yet running, summed."),
+)
+
+
+def peak_rss_mb() -> float | None:
+    """
+    High-water mark of this process's resident set size, in MB (None where unsupported).
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes on macOS and in kilobytes on Linux
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def measured_call(func, *args, **kwargs) -> tuple:
+    """
+    Run func (typically in a pool worker) and return (result, sample) with the wall/CPU time
+    and peak RSS of the worker. The parent completes the sample with stage, chunk and queue wait.
+    """
+    started_at = time.time()
+    cpu_start = time.process_time()
+    result = func(*args, **kwargs)
+    sample = {
+        "started_at": started_at,
+        "finished_at": time.time(),
+        "cpu_sec": time.process_time() - cpu_start,
+        "peak_rss_mb": peak_rss_mb(),
+        "pid": os.getpid(),
+    }
+    return result, sample
+
+
+class MetricsCollector:
+    """
+    Collects one sample per stage task (per chunk, or per recording for chunk/postprocess)
+    and appends them as JSON lines to a metrics file shared by every stage of a recording.
+    """
+
+    def __init__(self, path: Path | None = None):
+        self.path = Path(path) if path else None
+        self.samples = []
+
+    def add(
+        self,
+        stage: str,
+        recording: str,
+        sample: dict,
+        chunk: str = "",
+        audio_sec: float | None = None,
+        submitted_at: float | None = None,
+    ) -> dict:
+        wall_sec = sample["finished_at"] - sample["started_at"]
+        sample = {
+            "stage": stage,
+            "recording": recording,
+            "chunk": chunk,
+            "audio_sec": audio_sec,
+            "wall_sec": round(wall_sec, 4),
+            "cpu_sec": round(sample["cpu_sec"], 4),
+            "rtf": round(wall_sec / audio_sec, 4) if audio_sec else None,
+            "peak_rss_mb": sample.get("peak_rss_mb"),
+            "queue_wait_sec": round(max(sample["started_at"] - submitted_at, 0.0), 4) if submitted_at else 0.0,
+            "started_at": sample["started_at"],
+            "finished_at": sample["finished_at"],
+            "pid": sample.get("pid", os.getpid()),
+        }
+        self.samples.append(sample)
+        return sample
+
+    @contextmanager
+    def measure(self, stage: str, recording: str, chunk: str = "", audio_sec: float | None = None):
+        """
+        Measure an in-process stage run (e.g. chunking or postprocessing in the stage's parent).
+        """
+        started_at = time.time()
+        cpu_start = time.process_time()
+        yield
+        self.add(
+            stage,
+            recording,
+            {
+                "started_at": started_at,
+                "finished_at": time.time(),
+                "cpu_sec": time.process_time() - cpu_start,
+                "peak_rss_mb": peak_rss_mb(),
+            },
+            chunk,
+            audio_sec,
+        )
+
+    def flush(self):
+        """
+        Append collected samples to the metrics file (if any) and clear them.
+        """
+        if self.path is None or not self.samples:
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            for sample in self.samples:
+                f.write(json.dumps(sample) + "\n")
+        self.samples = []
+
+
+def open_collector(args) -> MetricsCollector:
+    """
+    Collector for a subcommand's --metrics option; without it samples are collected but not written.
+    """
+    return MetricsCollector(getattr(args, "metrics", None))
+
+
+def load_samples(paths: list[Path]) -> list[dict]:
+    samples = []
+    for path in paths:
+        if not Path(path).exists():
+            continue
+        with open(path, "r", encoding="utf-8") as f:
+            samples.extend(json.loads(line) for line in f if line.strip())
+    return samples
+
+
+def aggregate(samples: list[dict]) -> dict:
+    """
+    Totals for a group of samples. RTF uses only samples whose audio duration is known.
+    """
+    timed = [s for s in samples if s["audio_sec"]]
+    audio_sec = sum(s["audio_sec"] for s in timed)
+    elapsed = max(s["finished_at"] for s in samples) - min(s["started_at"] for s in samples)
+    rss = [s["peak_rss_mb"] for s in samples if s["peak_rss_mb"] is not None]
+    return {
+        "tasks": len(samples),
+        "wall_sec": round(sum(s["wall_sec"] for s in samples), 3),
+        "cpu_sec": round(sum(s["cpu_sec"] for s in samples), 3),
+        "audio_sec": round(audio_sec, 3),
+        "rtf": round(sum(s["wall_sec"] for s in timed) / audio_sec, 4) if audio_sec else None,
+        "throughput": round(audio_sec / elapsed, 4) if audio_sec and elapsed > 0 else None,
+        "peak_rss_mb": max(rss) if rss else None,
+        "queue_wait_sec": round(sum(s["queue_wait_sec"] for s in samples), 3),
+        "queue_wait_max_sec": round(max(s["queue_wait_sec"] for s in samples), 3),
+        "workers": len({s["pid"] for s in samples}),
+    }
+
+
+def fill_audio_durations(samples: list[dict]):
+    """
+    Stages that don't read audio (align, postprocess) take the duration another stage recorded
+    for the same chunk or recording.
+    """
+    by_chunk = {(s["recording"], s["chunk"]): s["audio_sec"] for s in samples if s["audio_sec"]}
+    for s in samples:
+        if not s["audio_sec"] and (s["recording"], s["chunk"]) in by_chunk:
+            s["audio_sec"] = by_chunk[(s["recording"], s["chunk"])]
+            s["rtf"] = round(s["wall_sec"] / s["audio_sec"], 4)
+
+
+def summarize(samples: list[dict]) -> dict:
+    """
+    Aggregate samples from any number of processes per stage, and per recording and stage.
+    """
+    fill_audio_durations(samples)
+    by_stage = {}
+    by_recording = {}
+    for s in samples:
+        by_stage.setdefault(s["stage"], []).append(s)
+        by_recording.setdefault(s["recording"], {}).setdefault(s["stage"], []).append(s)
+    return {
+        "generated_at": time.time(),
+        "stages": {stage: aggregate(group) for stage, group in by_stage.items()},
+        "recordings": {
+            recording: {stage: aggregate(group) for stage, group in stages.items()}
+            for recording, stages in by_recording.items()
+        },
+        "chunks": samples,
+    }
+
+
+def prometheus_text(summary: dict) -> str:
+    lines = []
+    for field, name, help_text in PROMETHEUS_METRICS:
+        metric = f"{PROMETHEUS_PREFIX}_{name}"
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} gauge")
+        for recording, stages in sorted(summary["recordings"].items()):
+            for stage, totals in sorted(stages.items()):
+                if totals[field] is not None:
+                    lines.append(f'{metric}{{recording="{escape_label(recording)}",stage="{stage}"}} {totals[field]}')
+    return "\n".join(lines) + "\n"
+
+
+def escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def write_report(sample_paths: list[Path], json_path: Path, prometheus_path: Path | None = None) -> dict:
+    """
+    Summarize the sample files into a JSON report and, optionally, a Prometheus textfile-collector file.
+    The textfile is written to a temp file and renamed so node_exporter never reads it half-written.
+    """
+    summary = summarize(load_samples(sample_paths))
+    json_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(json_path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+
+    if prometheus_path is not None:
+        prometheus_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = prometheus_path.with_name(f".{prometheus_path.name}.{os.getpid()}.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(prometheus_text(summary))
+        os.replace(tmp, prometheus_path)
+
+    for stage, totals in summary["stages"].items():
+        rtf = f"RTF {totals['rtf']:.3f}" if totals["rtf"] is not None else "RTF n/a"
+        logger.info(
+            f"[{stage}] {totals['tasks']} tasks, wall {totals['wall_sec']:.1f}s, cpu {totals['cpu_sec']:.1f}s, "
+            f"{rtf}, peak RSS {totals['peak_rss_mb']} MB, queue wait {totals['queue_wait_sec']:.1f}s"
+        )
+    return summary
@@ -4,7 +4,11 @@ import logging
 import re
 from pathlib import Path
 
-from pydub import AudioSegment
+from src.log_service import log_context
+from src.metrics import open_collector
+from src.scheduler import get_wav_duration
+from src.speaker_linking import load_speaker_map
+from src.store import RecordingStore
 from src.utils import seconds_to_hhmmss, setup_logger
 
 logger = setup_logger("postprocessing")
@@ -44,12 +48,16 @@ def get_chunk_durations(json_files: list[Path]) -> list[float]:
             logger.warning(f"Missing chunk audio for {json_file.name}: {wav_path}")
             durations.append(0.0)
         else:
-            audio = AudioSegment.from_wav(wav_path)
-            durations.append(len(audio) / 1000.0)
+            durations.append(get_wav_duration(wav_path))
     return durations
 
 
-def merge_aligned_chunks(input_patterns: list[str], output_file: Path):
+def merge_aligned_chunks(input_patterns: list[str], output_file: Path, speaker_map: dict | None = None):
+    """
+    Merge aligned chunk files into the formatted transcript. With a speaker_map
+    ({chunk: {local label: global label}}, from link-speakers) chunk labels are relabelled consistently.
+    """
+    speaker_map = speaker_map or {}
     aligned_files = collect_aligned_files(input_patterns)
     if not aligned_files:
         logger.warning(f"No aligned files found for patterns: {input_patterns}.")
@@ -65,8 +73,9 @@ def merge_aligned_chunks(input_patterns: list[str], output_file: Path):
         try:
             with open(file, "r", encoding="utf-8") as f:
                 data = json.load(f)
+            labels = speaker_map.get(file.name.removesuffix(".aligned.json"), {})
             for seg in data.get("segments", []):
-                speaker = seg["speaker"]
+                speaker = labels.get(seg["speaker"], seg["speaker"])
                 start = seg["start"] + offset
                 text = seg["text"].strip()
                 speaker_blocks.append((start, speaker, text))
@@ -74,6 +83,33 @@ def merge_aligned_chunks(input_patterns: list[str], output_file: Path):
             logger.error(f"Failed to load or parse {file.name}: {e}")
         offset += duration
 
+    write_speaker_blocks(speaker_blocks, output_file)
+
+
+def merge_store(store_path: Path, output_file: Path, speaker_map: dict | None = None):
+    """
+    Merge the aligned chunks of a recording store. Chunk offsets come from the store,
+    so no chunk audio has to be read.
+    """
+    speaker_map = speaker_map or {}
+    speaker_blocks = []
+    with RecordingStore(store_path) as store:
+        for chunk, segments in store.iter_alignments():
+            labels = speaker_map.get(chunk["chunk"], {})
+            for seg in segments:
+                speaker = labels.get(seg["speaker"], seg["speaker"])
+                speaker_blocks.append((seg["start"] + chunk["offset_sec"], speaker, seg["text"].strip()))
+
+    if not speaker_blocks:
+        logger.warning(f"No aligned segments found in {store_path}.")
+        return
+    write_speaker_blocks(speaker_blocks, output_file)
+
+
+def write_speaker_blocks(speaker_blocks: list[tuple[float, str, str]], output_file: Path):
+    """
+    Group consecutive (start, speaker, text) blocks by speaker and write the formatted transcript.
+    """
     speaker_blocks.sort(key=lambda x: x[0])
 
     formatted_lines = []
@@ -114,4 +150,15 @@ def cli_entry(args):
     input_patterns = args.input
     output_file = Path(args.output)
 
-    merge_aligned_chunks(input_patterns, output_file)
+    if not (getattr(args, "store", None) or input_patterns):
+        logger.error("Either --input or --store is required.")
+        return
+
+    speaker_map = load_speaker_map(Path(args.speaker_map)) if getattr(args, "speaker_map", None) else None
+    metrics = open_collector(args)
+    with log_context(stage="postprocess", recording=output_file.stem), metrics.measure("postprocess", output_file.stem):
+        if getattr(args, "store", None):
+            merge_store(Path(args.store), output_file, speaker_map)
+        else:
+            merge_aligned_chunks(input_patterns, output_file, speaker_map)
+    metrics.flush()
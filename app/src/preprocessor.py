@@ -1,40 +1,192 @@
+import math
+import wave
 from pathlib import Path
 
-from pydub import AudioSegment, effects
-from src.utils import setup_logger
+import numpy as np
+from src.utils import load_config, setup_logger
 
 logger = setup_logger("preprocessor")
 
+BLOCK_SAMPLES = 64 * 1024  # samples per channel read and filtered at a time
+NORMALIZE_MODES = ("peak", "loudness", "none")
+DEFAULT_SETTINGS = {
+    "enabled": False,
+    "normalize": "peak",
+    "headroom_db": 0.1,
+    "target_dbfs": -20.0,
+    "high_pass_hz": 80.0,
+    "high_pass_order": 2,
+}
+
+
+def preprocess_settings(config) -> dict:
+    """
+    [PREPROCESSING] settings merged over DEFAULT_SETTINGS.
+    """
+    section = getattr(config, "PREPROCESSING", None)
+    settings = {key: getattr(section, key, default) for key, default in DEFAULT_SETTINGS.items()}
+    if settings["normalize"] not in NORMALIZE_MODES:
+        raise ValueError(f"PREPROCESSING.normalize must be one of {NORMALIZE_MODES}, got '{settings['normalize']}'")
+    return settings
+
+
+def iter_wav_blocks(path: Path, block_samples: int = BLOCK_SAMPLES):
+    """
+    Read a 16-bit PCM WAV file block by block, yielding int16 arrays shaped (samples, channels).
+    """
+    with wave.open(str(path), "rb") as wav:
+        if wav.getsampwidth() != 2:
+            raise ValueError(f"Only 16-bit PCM is supported, got {8 * wav.getsampwidth()}-bit ({path}).")
+        channels = wav.getnchannels()
+        while True:
+            data = wav.readframes(block_samples)
+            if not data:
+                break
+            yield np.frombuffer(data, dtype="<i2").reshape(-1, channels)
+
+
+class HighPassFilter:
+    """
+    Butterworth high-pass filter in second-order sections. The filter state (zi) is carried over
+    from block to block, so filtering a file block-wise gives the same output as filtering it whole.
+    """
+
+    def __init__(self, cutoff_hz: float, sample_rate: int, channels: int, order: int = 2):
+        from scipy.signal import butter, sosfilt
+
+        self._sosfilt = sosfilt
+        self.sos = butter(order, cutoff_hz, btype="highpass", fs=sample_rate, output="sos")
+        self.zi = np.zeros((self.sos.shape[0], 2, channels))
+
+    def __call__(self, block: np.ndarray) -> np.ndarray:
+        filtered, self.zi = self._sosfilt(self.sos, block, axis=0, zi=self.zi)
+        return filtered
+
+
+def scan_wav(path: Path, high_pass_hz: float = 0.0, high_pass_order: int = 2) -> dict:
+    """
+    One pass over a WAV file, measuring the peak and mean-square level of the (high-passed) signal.
+    Returns {"sample_rate", "channels", "samples", "peak", "dbfs"}, amplitudes relative to int16 full scale.
+    """
+    with wave.open(str(path), "rb") as wav:
+        sample_rate, channels = wav.getframerate(), wav.getnchannels()
+    high_pass = HighPassFilter(high_pass_hz, sample_rate, channels, high_pass_order) if high_pass_hz else None
+
+    samples = 0
+    peak = 0.0
+    square_sum = 0.0
+    for block in iter_wav_blocks(path):
+        signal = block.astype(np.float64)
+        if high_pass is not None:
+            signal = high_pass(signal)
+        samples += len(signal)
+        peak = max(peak, float(np.max(np.abs(signal), initial=0.0)))
+        square_sum += float(np.einsum("ij,ij->", signal, signal))
+
+    mean_square = square_sum / max(samples * channels, 1) / 32768.0**2
+    return {
+        "sample_rate": sample_rate,
+        "channels": channels,
+        "samples": samples,
+        "peak": peak / 32768.0,
+        "dbfs": 10 * math.log10(mean_square) if mean_square > 0 else -math.inf,
+    }
+
+
+def normalization_gain_db(scan: dict, settings: dict) -> float:
+    """
+    Gain that brings the peak to -headroom_db dBFS ("peak", like pydub's effects.normalize) or the average
+    loudness to target_dbfs without letting the peak exceed -headroom_db ("loudness").
+    """
+    if settings["normalize"] == "none" or scan["peak"] <= 0:
+        return 0.0
+    peak_gain_db = -settings["headroom_db"] - 20 * math.log10(scan["peak"])
+    if settings["normalize"] == "peak":
+        return peak_gain_db
+    return min(settings["target_dbfs"] - scan["dbfs"], peak_gain_db)
+
+
+class BlockPreprocessor:
+    """
+    Block-wise high-pass filter and gain for 16-bit PCM. Feed it the blocks of a file in order
+    (e.g. map(preprocessor.process, iter_wav_blocks(path))); it keeps the filter state between them.
+    """
+
+    def __init__(
+        self,
+        sample_rate: int,
+        channels: int,
+        gain_db: float = 0.0,
+        high_pass_hz: float = 80.0,
+        high_pass_order: int = 2,
+    ):
+        self.gain_db = gain_db
+        self.gain = 10 ** (gain_db / 20)
+        self.high_pass = HighPassFilter(high_pass_hz, sample_rate, channels, high_pass_order) if high_pass_hz else None
+
+    @classmethod
+    def for_file(cls, path: Path, settings: dict) -> tuple["BlockPreprocessor", dict]:
+        """
+        Scan the file once and return (preprocessor with the normalization gain for it, scan result).
+        """
+        scan = scan_wav(path, settings["high_pass_hz"], settings["high_pass_order"])
+        preprocessor = cls(
+            scan["sample_rate"],
+            scan["channels"],
+            normalization_gain_db(scan, settings),
+            settings["high_pass_hz"],
+            settings["high_pass_order"],
+        )
+        return preprocessor, scan
+
+    def process(self, block: np.ndarray) -> np.ndarray:
+        signal = block.astype(np.float64)
+        if self.high_pass is not None:
+            signal = self.high_pass(signal)
+        if self.gain != 1.0:
+            signal *= self.gain
+        return np.clip(np.rint(signal), -32768, 32767).astype(np.int16)
+
 
 def preprocess_audio(
     input_path: Path,
     output_path: Path,
     apply_high_pass: bool = True,
+    settings: dict | None = None,
 ):
     """
     Preprocess an audio file by:
-    - Normalizing volume
+    - Normalizing volume (peak or loudness, from a one-pass scan)
     - Optionally applying a high-pass filter
     - Saving a cleaned version of the file
 
+    Works block by block, so memory use does not grow with the file length.
     (Silence is NOT removed to preserve structure for chunking.)
+    To skip the extra copy entirely, chunk with --preprocess instead, which applies the same
+    processing inside the chunker's read pass.
     """
-    logger.info(f"Loading audio file: {input_path}")
-    audio = AudioSegment.from_wav(input_path)
-
-    logger.info("Normalizing audio...")
-    audio = effects.normalize(audio)
+    settings = dict(settings or DEFAULT_SETTINGS)
+    if not apply_high_pass:
+        settings["high_pass_hz"] = 0.0
 
-    if apply_high_pass:
-        logger.info("Applying high-pass filter at 80Hz...")
-        audio = audio.high_pass_filter(80)
+    logger.info(f"Scanning audio file: {input_path}")
+    preprocessor, scan = BlockPreprocessor.for_file(input_path, settings)
+    logger.info(
+        f"Normalizing ({settings['normalize']}) with {preprocessor.gain_db:+.1f} dB gain"
+        + (f", high-pass filter at {settings['high_pass_hz']:.0f}Hz" if settings["high_pass_hz"] else "")
+    )
 
     output_path.parent.mkdir(parents=True, exist_ok=True)
-    audio.export(output_path, format="wav")
+    with wave.open(str(output_path), "wb") as wav:
+        wav.setnchannels(scan["channels"])
+        wav.setsampwidth(2)
+        wav.setframerate(scan["sample_rate"])
+        for block in iter_wav_blocks(input_path):
+            wav.writeframes(preprocessor.process(block).astype("<i2").tobytes())
     logger.info(f"Preprocessed audio saved to {output_path}")
 
 
 def cli_entry(args):
     input_path = Path(args.input)
     output_path = Path(args.output)
-    preprocess_audio(input_path, output_path)
+    preprocess_audio(input_path, output_path, settings=preprocess_settings(load_config(args.config)))
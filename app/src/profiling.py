@@ -0,0 +1,151 @@
+import functools
+import os
+import uuid
+from pathlib import Path
+
+from src.utils import setup_logger
+
+logger = setup_logger("profiling")
+
+PROFILE_MODES = ("cpu", "mem")
+TRACEMALLOC_FRAMES = 32
+RAW_SUFFIXES = {"cpu": ".prof", "mem": ".tracemalloc"}
+
+
+def profile_settings(args) -> tuple[str, Path] | None:
+    """
+    (mode, output directory) from the --profile / --profile-dir options, or None when profiling is off.
+    """
+    mode = getattr(args, "profile", None)
+    if not mode:
+        return None
+    return mode, Path(getattr(args, "profile_dir", None) or "profiles")
+
+
+def profiled(func, stage: str, settings: tuple[str, Path] | None):
+    """
+    Wrap func (a stage function or pool task) in the configured profiler. Returns func itself when
+    profiling is off, so there is no overhead at all. The wrapper is picklable for process pools.
+    """
+    if settings is None:
+        return func
+    mode, output_dir = settings
+    return functools.partial(profiled_call, mode, str(output_dir), stage, func)
+
+
+def profiled_call(mode: str, output_dir: str, stage: str, func, *args, **kwargs):
+    """
+    Run func under cProfile (cpu) or tracemalloc (mem) and dump one raw profile per call
+    into <output_dir>/raw, to be merged per stage by merge_profiles.
+    """
+    raw_dir = Path(output_dir) / "raw"
+    raw_dir.mkdir(parents=True, exist_ok=True)
+    raw_path = raw_dir / f"{stage}.{os.getpid()}.{uuid.uuid4().hex[:8]}{RAW_SUFFIXES[mode]}"
+
+    if mode == "cpu":
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.disable()
+            profiler.dump_stats(raw_path)
+
+    import tracemalloc
+
+    tracemalloc.start(TRACEMALLOC_FRAMES)
+    try:
+        return func(*args, **kwargs)
+    finally:
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        snapshot.dump(raw_path)
+        with open(raw_path.with_suffix(".peak"), "w") as f:
+            f.write(str(peak))
+
+
+def collapsed_stacks(snapshots: list) -> dict[str, int]:
+    """
+    Sum the bytes still allocated at the end of each task (tracemalloc snapshots) per call stack,
+    in the collapsed-stack format used by flamegraph.pl / speedscope ("outer;inner;innermost <bytes>").
+    """
+    stacks = {}
+    for snapshot in snapshots:
+        for stat in snapshot.statistics("traceback"):
+            # Traceback frames are ordered from the oldest call to the most recent one
+            stack = ";".join(f"{Path(frame.filename).name}:{frame.lineno}" for frame in stat.traceback)
+            stacks[stack] = stacks.get(stack, 0) + stat.size
+    return stacks
+
+
+def merge_profiles(settings: tuple[str, Path]) -> list[Path]:
+    """
+    Merge the raw per-worker profiles into one output per stage and remove the raw files:
+    cpu -> <stage>.prof (pstats, e.g. for snakeviz or gprof2dot) and <stage>.txt (top functions);
+    mem -> <stage>.collapsed (flamegraph-compatible) and <stage>.txt (top allocation sites, peaks).
+    """
+    mode, output_dir = settings
+    raw_dir = output_dir / "raw"
+    by_stage = {}
+    for raw_path in sorted(raw_dir.glob(f"*{RAW_SUFFIXES[mode]}")):
+        by_stage.setdefault(raw_path.name.split(".", 1)[0], []).append(raw_path)
+
+    merged = []
+    for stage, raw_paths in by_stage.items():
+        if mode == "cpu":
+            merged.append(merge_cpu_profiles(stage, raw_paths, output_dir))
+        else:
+            merged.append(merge_mem_profiles(stage, raw_paths, output_dir))
+        for raw_path in raw_paths:
+            raw_path.unlink()
+            raw_path.with_suffix(".peak").unlink(missing_ok=True)
+        logger.info(f"[{stage}] Merged {len(raw_paths)} {mode} profiles into {merged[-1]}")
+    return merged
+
+
+def merge_cpu_profiles(stage: str, raw_paths: list[Path], output_dir: Path) -> Path:
+    import pstats
+
+    stats = pstats.Stats(*[str(p) for p in raw_paths])
+    output_path = output_dir / f"{stage}.prof"
+    stats.dump_stats(output_path)
+    with open(output_dir / f"{stage}.txt", "w", encoding="utf-8") as f:
+        f.write(f"{stage}: {len(raw_paths)} profiled calls\n\n")
+        pstats.Stats(str(output_path), stream=f).sort_stats("cumulative").print_stats(40)
+    return output_path
+
+
+def merge_mem_profiles(stage: str, raw_paths: list[Path], output_dir: Path) -> Path:
+    import tracemalloc
+
+    snapshots = [tracemalloc.Snapshot.load(str(p)) for p in raw_paths]
+    peaks = []
+    for raw_path in raw_paths:
+        peak_path = raw_path.with_suffix(".peak")
+        if peak_path.exists():
+            peaks.append(int(peak_path.read_text()))
+
+    stacks = collapsed_stacks(snapshots)
+    output_path = output_dir / f"{stage}.collapsed"
+    with open(output_path, "w", encoding="utf-8") as f:
+        for stack, size in sorted(stacks.items(), key=lambda item: -item[1]):
+            f.write(f"{stack} {size}\n")
+
+    top = {}
+    for snapshot in snapshots:
+        for stat in snapshot.statistics("lineno"):
+            frame = stat.traceback[0]
+            key = f"{frame.filename}:{frame.lineno}"
+            top[key] = top.get(key, 0) + stat.size
+    with open(output_dir / f"{stage}.txt", "w", encoding="utf-8") as f:
+        f.write(f"{stage}: {len(raw_paths)} profiled calls (Python allocations only)\n")
+        if peaks:
+            f.write(f"Peak traced memory per call: max {max(peaks) / 2**20:.1f} MB, ")
+            f.write(f"mean {sum(peaks) / len(peaks) / 2**20:.1f} MB\n")
+        f.write("\nStill allocated at the end of the calls, by allocation site:\n")
+        for key, size in sorted(top.items(), key=lambda item: -item[1])[:40]:
+            f.write(f"{size / 1024:12.1f} KiB  {key}\n")
+    return output_path
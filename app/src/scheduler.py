@@ -0,0 +1,120 @@
+import heapq
+import wave
+from pathlib import Path
+
+from src.utils import setup_logger
+
+logger = setup_logger("scheduler")
+
+# Rough CPU real-time factors (processing seconds per audio second) for each model.
+# Only the relative order matters for scheduling; absolute values feed the makespan estimate.
+MODEL_COST_FACTORS = {
+    "tiny": 0.05,
+    "base": 0.1,
+    "small": 0.3,
+    "medium": 0.7,
+    "turbo": 0.4,
+    "large": 1.2,
+    "pyannote/speaker-diarization-3.1": 0.15,
+}
+DEFAULT_COST_FACTOR = 1.0
+
+
+def get_wav_duration(path: Path) -> float:
+    """
+    Return the duration of a WAV file in seconds by reading only its header.
+    """
+    try:
+        with wave.open(str(path), "rb") as wav:
+            return wav.getnframes() / float(wav.getframerate())
+    except (wave.Error, EOFError, OSError) as e:
+        logger.warning(f"Could not read duration of {path.name}: {e}")
+        return 0.0
+
+
+def model_cost_factor(model_name: str, overrides: dict | None = None) -> float:
+    """
+    Look up the cost factor for a model, matching e.g. "large-v3" against "large".
+    """
+    factors = {**MODEL_COST_FACTORS, **(overrides or {})}
+    if model_name in factors:
+        return factors[model_name]
+    for key, factor in factors.items():
+        if model_name.startswith(key):
+            return factor
+    return DEFAULT_COST_FACTOR
+
+
+def estimate_cost(duration_sec: float, model_name: str, overrides: dict | None = None) -> float:
+    """
+    Estimate the processing time of a chunk in seconds.
+    """
+    return duration_sec * model_cost_factor(model_name, overrides)
+
+
+def order_longest_first(
+    audio_files: list[Path], model_name: str, overrides: dict | None = None
+) -> list[tuple[Path, float]]:
+    """
+    Sort audio files by estimated cost, most expensive first (longest-processing-time-first).
+
+    Returns a list of (path, estimated_cost) pairs. Ties are broken by file name to keep runs reproducible.
+    """
+    costed = [(path, estimate_cost(get_wav_duration(path), model_name, overrides)) for path in audio_files]
+    return sorted(costed, key=lambda item: (-item[1], item[0].name))
+
+
+def schedule(
+    audio_files: list[Path], model_name: str, strategy: str = "longest_first", overrides: dict | None = None
+) -> list[tuple[Path, float]]:
+    """
+    Order audio files for submission according to the configured strategy ("longest_first" or "fifo").
+    """
+    if overrides is not None and not isinstance(overrides, dict):
+        overrides = vars(overrides)  # [PARALLEL.cost_factors] table from the config
+    if strategy == "fifo":
+        return [(path, estimate_cost(get_wav_duration(path), model_name, overrides)) for path in audio_files]
+    if strategy != "longest_first":
+        logger.warning(f"Unknown scheduling strategy '{strategy}', falling back to longest_first.")
+    return order_longest_first(audio_files, model_name, overrides)
+
+
+def estimate_makespan(costs: list[float], workers: int) -> float:
+    """
+    Simulate greedy assignment of tasks (in the given order) to the first idle worker.
+    """
+    loads = [0.0] * max(workers, 1)
+    heapq.heapify(loads)
+    for cost in costs:
+        heapq.heappush(loads, heapq.heappop(loads) + cost)
+    return max(loads)
+
+
+def report_utilization(stage: str, spans: list[tuple[float, float]], workers: int, wall_start: float) -> dict:
+    """
+    Summarize how busy a worker pool was for one stage and log the result.
+
+    spans: (started_at, finished_at) for every task that ran in the pool.
+    """
+    if not spans:
+        return {"stage": stage, "workers": workers, "tasks": 0, "utilization": 0.0}
+
+    wall_end = max(end for _, end in spans)
+    wall = max(wall_end - wall_start, 1e-9)
+    busy = sum(end - start for start, end in spans)
+    # Tail: time from the moment the first worker ran out of work until the stage finished
+    first_idle = sorted(end for _, end in spans)[max(len(spans) - workers, 0)]
+    stats = {
+        "stage": stage,
+        "workers": workers,
+        "tasks": len(spans),
+        "wall_sec": round(wall, 3),
+        "busy_sec": round(busy, 3),
+        "utilization": round(busy / (wall * workers), 4),
+        "tail_sec": round(max(wall_end - first_idle, 0.0), 3),
+    }
+    logger.info(
+        f"[{stage}] {stats['tasks']} tasks on {workers} workers in {stats['wall_sec']:.1f}s, "
+        f"utilization {stats['utilization']:.1%}, tail {stats['tail_sec']:.1f}s"
+    )
+    return stats
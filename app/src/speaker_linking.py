@@ -0,0 +1,206 @@
+import json
+import math
+from pathlib import Path
+
+from src.log_service import log_context
+from src.metrics import open_collector
+from src.store import RecordingStore
+from src.utils import load_config, setup_logger
+
+logger = setup_logger("speaker_linking")
+
+DEFAULT_SETTINGS = {
+    "enabled": False,
+    "threshold": 0.7,  # max average cosine distance between two clusters that are merged
+}
+EMBEDDINGS_SUFFIX = ".embeddings.json"
+
+
+def linking_settings(config) -> dict:
+    """
+    [SPEAKER_LINKING] settings merged over DEFAULT_SETTINGS, plus DIARIZATION.max_speakers as a cap on the clusters.
+    """
+    section = getattr(config, "SPEAKER_LINKING", None)
+    settings = {key: getattr(section, key, default) for key, default in DEFAULT_SETTINGS.items()}
+    settings["max_speakers"] = getattr(config.DIARIZATION, "max_speakers", None)
+    return settings
+
+
+def embeddings_path(rttm_path: Path) -> Path:
+    return rttm_path.with_suffix(EMBEDDINGS_SUFFIX)
+
+
+def embeddings_to_dict(labels: list[str], vectors) -> dict[str, list[float] | None]:
+    """
+    {label: centroid} from pyannote's labels and embedding rows; speakers without a usable
+    embedding (pyannote returns NaN for them) map to None. Without any centroids (pyannote returns
+    None, e.g. for a chunk without speech) this is {}, so the chunk keeps its local labels.
+    """
+    if vectors is None:
+        if labels:
+            logger.warning(f"No speaker embeddings returned for {len(labels)} speakers; they keep chunk-local labels.")
+        return {}
+    embeddings = {}
+    for label, vector in zip(labels, vectors):
+        vector = [float(x) for x in vector]
+        embeddings[label] = None if any(math.isnan(x) for x in vector) else vector
+    return embeddings
+
+
+def chunk_index(chunk: str) -> int:
+    suffix = chunk.rsplit("_", 1)[-1]
+    return int(suffix) if suffix.isdigit() else 0
+
+
+def load_embeddings(inputs: list[Path]) -> dict[str, dict[str, list[float] | None]]:
+    """
+    {chunk: {label: centroid}} from *.embeddings.json files or directories containing them.
+    """
+    files = []
+    for path in inputs:
+        if path.is_dir():
+            files.extend(path.glob(f"*{EMBEDDINGS_SUFFIX}"))
+        elif path.is_file() and path.name.endswith(EMBEDDINGS_SUFFIX):
+            files.append(path)
+    embeddings = {}
+    for file in files:
+        with open(file, "r", encoding="utf-8") as f:
+            embeddings[file.name[: -len(EMBEDDINGS_SUFFIX)]] = json.load(f)
+    return embeddings
+
+
+def cluster_speakers(
+    vectors: list[list[float]], groups: list[str], threshold: float, max_speakers: int | None = None
+) -> list[int]:
+    """
+    Average-linkage agglomerative clustering on cosine distance with cannot-link constraints:
+    rows in the same group (chunk) never end up in the same cluster. Merging stops at the threshold,
+    or continues past it while there are more than max_speakers clusters. Returns a cluster ID per row.
+    """
+    import numpy as np
+
+    vectors = np.asarray(vectors, dtype=np.float64)
+    n = len(vectors)
+    unit = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    dist = 1.0 - unit @ unit.T
+    groups = np.asarray(groups)
+    conflict = groups[:, None] == groups[None, :]  # includes the diagonal
+    dist[conflict] = np.inf
+    sizes = np.ones(n)
+    members = {i: [i] for i in range(n)}
+
+    while len(members) > 1:
+        i, j = np.unravel_index(np.argmin(dist), dist.shape)
+        if not np.isfinite(dist[i, j]):
+            break  # every remaining pair is cannot-linked
+        if dist[i, j] > threshold and (max_speakers is None or len(members) <= max_speakers):
+            break
+
+        # Lance-Williams update for average linkage: cluster j is folded into cluster i
+        merged = (sizes[i] * dist[i] + sizes[j] * dist[j]) / (sizes[i] + sizes[j])
+        conflict[i] |= conflict[j]
+        conflict[:, i] = conflict[i]
+        merged[conflict[i]] = np.inf
+        dist[i, :] = merged
+        dist[:, i] = merged
+        dist[j, :] = np.inf
+        dist[:, j] = np.inf
+        sizes[i] += sizes[j]
+        members[i].extend(members.pop(j))
+
+    labels = [0] * n
+    for cluster, rows in enumerate(members.values()):
+        for row in rows:
+            labels[row] = cluster
+    return labels
+
+
+def link_speakers(
+    embeddings: dict[str, dict[str, list[float] | None]], threshold: float, max_speakers: int | None = None
+) -> dict[str, dict[str, str]]:
+    """
+    Map every (chunk, local label) to a global SPEAKER_NN label, numbered in order of first appearance.
+
+    Every chunk is diarized on its own, so its labels only hold within that chunk; the saved centroids
+    are clustered over the whole recording (see cluster_speakers) without reading audio again.
+    Speakers without an embedding cannot be linked and get a global label of their own, so the
+    number of global speakers can exceed max_speakers by the number of such speakers.
+    """
+    items = [
+        (chunk, label, vector)
+        for chunk in sorted(embeddings, key=chunk_index)
+        for label, vector in sorted(embeddings[chunk].items())
+    ]
+    linkable = [k for k, (_, _, vector) in enumerate(items) if vector is not None]
+    clusters = {}
+    if linkable:
+        vectors = [items[k][2] for k in linkable]
+        groups = [items[k][0] for k in linkable]
+        clusters = dict(zip(linkable, cluster_speakers(vectors, groups, threshold, max_speakers)))
+
+    unlinked = len(items) - len(linkable)
+    if unlinked:
+        logger.warning(f"{unlinked} chunk speakers have no embedding and keep a label of their own.")
+
+    speaker_map = {}
+    global_labels = {}
+    for k, (chunk, label, _) in enumerate(items):
+        key = clusters.get(k, ("unlinked", k))
+        if key not in global_labels:
+            global_labels[key] = f"SPEAKER_{len(global_labels):02d}"
+        speaker_map.setdefault(chunk, {})[label] = global_labels[key]
+    return speaker_map
+
+
+def write_speaker_map(speaker_map: dict[str, dict[str, str]], output_path: Path, threshold: float):
+    speakers = sorted({label for labels in speaker_map.values() for label in labels.values()})
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump({"threshold": threshold, "speakers": speakers, "chunks": speaker_map}, f, indent=2)
+
+
+def load_speaker_map(path: Path) -> dict[str, dict[str, str]]:
+    """
+    {chunk: {local label: global label}} from a speaker_map.json written by link-speakers.
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)["chunks"]
+
+
+def link_recording(
+    output_path: Path, settings: dict, inputs: list[Path] | None = None, store_path: Path | None = None
+) -> dict[str, dict[str, str]]:
+    """
+    Link the speakers of one recording from its saved embeddings (files or store) and write speaker_map.json.
+    """
+    if store_path is not None:
+        with RecordingStore(store_path) as store:
+            embeddings = store.embeddings()
+    else:
+        embeddings = load_embeddings(inputs or [])
+    if not embeddings:
+        logger.warning("No speaker embeddings found; diarize with [SPEAKER_LINKING] enabled to save them.")
+
+    speaker_map = link_speakers(embeddings, settings["threshold"], settings["max_speakers"])
+    write_speaker_map(speaker_map, output_path, settings["threshold"])
+    speakers = len({label for labels in speaker_map.values() for label in labels.values()})
+    logger.info(f"Linked the speakers of {len(speaker_map)} chunks into {speakers} global speakers: {output_path}")
+    return speaker_map
+
+
+def cli_entry(args):
+    config = load_config(args.config)
+    settings = linking_settings(config)
+    if args.threshold is not None:
+        settings["threshold"] = args.threshold
+    if not (args.input or getattr(args, "store", None)):
+        logger.error("Either --input or --store is required.")
+        return
+
+    output_path = Path(args.output)
+    store_path = Path(args.store) if getattr(args, "store", None) else None
+    recording = store_path.stem if store_path else output_path.parent.name
+    metrics = open_collector(args)
+    with log_context(stage="link", recording=recording), metrics.measure("link", recording):
+        link_recording(output_path, settings, [Path(p) for p in args.input or []], store_path)
+    metrics.flush()
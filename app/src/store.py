@@ -0,0 +1,272 @@
+import json
+import sqlite3
+from pathlib import Path
+
+from src.utils import setup_logger
+
+logger = setup_logger("store")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS chunks (
+    chunk TEXT PRIMARY KEY,
+    idx INTEGER NOT NULL,
+    offset_sec REAL NOT NULL,
+    duration_sec REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS transcripts (
+    chunk TEXT PRIMARY KEY,
+    model_name TEXT,
+    language TEXT,
+    duration REAL,
+    text TEXT
+);
+CREATE TABLE IF NOT EXISTS segments (
+    chunk TEXT NOT NULL,
+    seg_id INTEGER NOT NULL,
+    start REAL NOT NULL,
+    end REAL NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (chunk, seg_id)
+);
+CREATE TABLE IF NOT EXISTS turns (
+    chunk TEXT NOT NULL,
+    start REAL NOT NULL,
+    duration REAL NOT NULL,
+    speaker TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS turns_chunk ON turns (chunk);
+CREATE TABLE IF NOT EXISTS embeddings (
+    chunk TEXT NOT NULL,
+    speaker TEXT NOT NULL,
+    vector TEXT,
+    PRIMARY KEY (chunk, speaker)
+);
+CREATE TABLE IF NOT EXISTS aligned (
+    chunk TEXT NOT NULL,
+    seg_id INTEGER NOT NULL,
+    start REAL NOT NULL,
+    end REAL NOT NULL,
+    speaker TEXT NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (chunk, seg_id)
+);
+"""
+
+
+def compact_transcription(result: dict) -> dict:
+    """
+    Keep only what later stages read from a Whisper result: no tokens, log-probs or temperatures.
+    """
+    return {
+        "text": result.get("text"),
+        "language": result.get("language"),
+        "duration": result.get("duration"),
+        "model_name": result.get("model_name"),
+        "segments": [
+            {"id": i, "start": seg["start"], "end": seg["end"], "text": seg["text"]}
+            for i, seg in enumerate(result.get("segments", []))
+        ],
+    }
+
+
+def parse_rttm(lines) -> list[tuple[float, float, str]]:
+    """
+    Parse RTTM lines into (start, duration, speaker) turns.
+    """
+    turns = []
+    for line in lines:
+        parts = line.strip().split()
+        if len(parts) < 8:
+            continue
+        turns.append((float(parts[3]), float(parts[4]), parts[7]))
+    return turns
+
+
+class RecordingStore:
+    """
+    Compact per-recording store: one SQLite file holding chunk offsets, Whisper segments, diarization
+    turns and alignments, replacing the per-chunk JSON/RTTM files. Everything is read lazily per chunk.
+
+    Writes happen from a single process (the stage's parent); pool workers return results instead.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, timeout=30.0)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.executescript(SCHEMA)
+
+    def close(self):
+        self._conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- Writers ---
+
+    def put_chunk(self, chunk: str, idx: int, offset_sec: float, duration_sec: float):
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO chunks (chunk, idx, offset_sec, duration_sec) VALUES (?, ?, ?, ?)",
+                (chunk, idx, offset_sec, duration_sec),
+            )
+
+    def put_transcription(self, chunk: str, result: dict):
+        result = compact_transcription(result)
+        with self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO transcripts (chunk, model_name, language, duration, text) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (chunk, result["model_name"], result["language"], result["duration"], result["text"]),
+            )
+            self._conn.execute("DELETE FROM segments WHERE chunk = ?", (chunk,))
+            self._conn.executemany(
+                "INSERT INTO segments (chunk, seg_id, start, end, text) VALUES (?, ?, ?, ?, ?)",
+                [(chunk, seg["id"], seg["start"], seg["end"], seg["text"]) for seg in result["segments"]],
+            )
+
+    def put_diarization(self, chunk: str, turns: list[tuple[float, float, str]]):
+        with self._conn:
+            self._conn.execute("DELETE FROM turns WHERE chunk = ?", (chunk,))
+            self._conn.executemany(
+                "INSERT INTO turns (chunk, start, duration, speaker) VALUES (?, ?, ?, ?)",
+                [(chunk, start, duration, speaker) for start, duration, speaker in turns],
+            )
+
+    def put_embeddings(self, chunk: str, embeddings: dict[str, list[float] | None]):
+        with self._conn:
+            self._conn.execute("DELETE FROM embeddings WHERE chunk = ?", (chunk,))
+            self._conn.executemany(
+                "INSERT INTO embeddings (chunk, speaker, vector) VALUES (?, ?, ?)",
+                [
+                    (chunk, speaker, json.dumps(vector) if vector is not None else None)
+                    for speaker, vector in embeddings.items()
+                ],
+            )
+
+    def put_alignment(self, chunk: str, segments: list[dict]):
+        with self._conn:
+            self._conn.execute("DELETE FROM aligned WHERE chunk = ?", (chunk,))
+            self._conn.executemany(
+                "INSERT INTO aligned (chunk, seg_id, start, end, speaker, text) VALUES (?, ?, ?, ?, ?, ?)",
+                [
+                    (chunk, i, seg["start"], seg["end"], seg["speaker"], seg["text"])
+                    for i, seg in enumerate(segments)
+                ],
+            )
+
+    # --- Readers ---
+
+    def chunks(self) -> list[sqlite3.Row]:
+        return self._conn.execute("SELECT * FROM chunks ORDER BY idx").fetchall()
+
+    def has(self, table: str, chunk: str) -> bool:
+        if table not in ("transcripts", "turns", "aligned"):
+            raise ValueError(f"Unknown store table: {table}")
+        return self._conn.execute(f"SELECT 1 FROM {table} WHERE chunk = ? LIMIT 1", (chunk,)).fetchone() is not None
+
+    def transcription(self, chunk: str) -> dict | None:
+        """
+        Rebuild a (compact) Whisper result dict for one chunk.
+        """
+        row = self._conn.execute("SELECT * FROM transcripts WHERE chunk = ?", (chunk,)).fetchone()
+        if row is None:
+            return None
+        segments = self._conn.execute(
+            "SELECT seg_id, start, end, text FROM segments WHERE chunk = ? ORDER BY seg_id", (chunk,)
+        ).fetchall()
+        return {
+            "text": row["text"],
+            "language": row["language"],
+            "duration": row["duration"],
+            "model_name": row["model_name"],
+            "segments": [
+                {"id": seg["seg_id"], "start": seg["start"], "end": seg["end"], "text": seg["text"]}
+                for seg in segments
+            ],
+        }
+
+    def diarization(self, chunk: str) -> list[tuple[float, float, str]]:
+        rows = self._conn.execute(
+            "SELECT start, duration, speaker FROM turns WHERE chunk = ? ORDER BY start", (chunk,)
+        ).fetchall()
+        return [(row["start"], row["duration"], row["speaker"]) for row in rows]
+
+    def embeddings(self) -> dict[str, dict[str, list[float] | None]]:
+        """
+        {chunk: {speaker: centroid embedding}} for every chunk diarized with embeddings.
+        """
+        embeddings = {}
+        for row in self._conn.execute("SELECT chunk, speaker, vector FROM embeddings"):
+            vector = json.loads(row["vector"]) if row["vector"] is not None else None
+            embeddings.setdefault(row["chunk"], {})[row["speaker"]] = vector
+        return embeddings
+
+    def alignment(self, chunk: str) -> dict:
+        """
+        Rebuild the aligned JSON document (metadata + segments) for one chunk.
+        """
+        transcript = self._conn.execute("SELECT * FROM transcripts WHERE chunk = ?", (chunk,)).fetchone()
+        segments = self._conn.execute(
+            "SELECT start, end, speaker, text FROM aligned WHERE chunk = ? ORDER BY seg_id", (chunk,)
+        ).fetchall()
+        return {
+            "metadata": {
+                "audio_file": f"{chunk}.json",
+                "model_name": transcript["model_name"] if transcript else None,
+                "language": transcript["language"] if transcript else None,
+                "duration": transcript["duration"] if transcript else None,
+            },
+            "segments": [dict(seg) for seg in segments],
+        }
+
+    def iter_alignments(self):
+        """
+        Lazily yield (chunk_row, aligned_segments) in chunk order.
+        """
+        for chunk in self.chunks():
+            rows = self._conn.execute(
+                "SELECT start, end, speaker, text FROM aligned WHERE chunk = ? ORDER BY seg_id", (chunk["chunk"],)
+            ).fetchall()
+            yield chunk, [dict(row) for row in rows]
+
+    # --- Export ---
+
+    def export(self, output_dir: Path):
+        """
+        Write the store back out as the regular file layout (transcripts/, diarizations/, aligns/) for debugging.
+        """
+        transcripts_dir = output_dir / "transcripts"
+        diarizations_dir = output_dir / "diarizations"
+        aligns_dir = output_dir / "aligns"
+        for d in (transcripts_dir, diarizations_dir, aligns_dir):
+            d.mkdir(parents=True, exist_ok=True)
+
+        embeddings = self.embeddings()
+        for row in self.chunks():
+            chunk = row["chunk"]
+            transcription = self.transcription(chunk)
+            if transcription is not None:
+                with open(transcripts_dir / f"{chunk}.json", "w", encoding="utf-8") as f:
+                    json.dump(transcription, f, ensure_ascii=False, indent=2)
+            if self.has("turns", chunk):
+                with open(diarizations_dir / f"{chunk}.rttm", "w", encoding="utf-8") as f:
+                    for start, duration, speaker in self.diarization(chunk):
+                        f.write(f"SPEAKER {chunk} 1 {start:.3f} {duration:.3f} <NA> <NA> {speaker} <NA> <NA>\n")
+            if chunk in embeddings:
+                with open(diarizations_dir / f"{chunk}.embeddings.json", "w", encoding="utf-8") as f:
+                    json.dump(embeddings[chunk], f)
+            if self.has("aligned", chunk):
+                with open(aligns_dir / f"{chunk}.aligned.json", "w", encoding="utf-8") as f:
+                    json.dump(self.alignment(chunk), f, ensure_ascii=False, indent=2)
+
+        logger.info(f"Exported {len(self.chunks())} chunks from {self.path} to {output_dir}")
+
+
+def cli_entry(args):
+    with RecordingStore(Path(args.store)) as store:
+        store.export(Path(args.output))
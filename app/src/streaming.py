@@ -0,0 +1,318 @@
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from src.aligner import align_pair
+from src.chunker import iter_chunks, iter_preprocessed_chunks
+from src.decoding_context import (
+    CONTEXT_FILE,
+    decoding_options,
+    decoding_settings,
+    load_contexts,
+    needs_detection,
+    record_detection,
+    save_contexts,
+    submit_detection,
+)
+from src.diarizer import diarize_audio, warm_up as warm_up_diarizer
+from src.ledger import recording_of
+from src.log_service import pool_logging
+from src.metrics import MetricsCollector, measured_call, open_collector
+from src.preprocessor import preprocess_settings
+from src.profiling import profile_settings, profiled
+from src.scheduler import get_wav_duration
+from src.speaker_linking import linking_settings
+from src.transcriber import transcribe_audio, warm_up as warm_up_transcriber
+from src.utils import estimate_silence_threshold, load_config, setup_logger
+
+logger = setup_logger("streaming")
+
+
+class WorkerPools:
+    """
+    Transcription and diarization process pools whose workers load their models once at startup
+    and keep them warm for every chunk. Can be shared by consecutive ChunkPipelines (e.g. in the daemon).
+    """
+
+    def __init__(self, config, auth_token: str):
+        streaming = getattr(config, "STREAMING", None)
+        self.transcribe_workers = getattr(streaming, "transcribe_workers", config.PARALLEL.parallel_workers)
+        self.diarize_workers = getattr(streaming, "diarize_workers", config.PARALLEL.parallel_workers)
+        self.transcribe = ProcessPoolExecutor(
+            max_workers=self.transcribe_workers, **pool_logging(warm_up_transcriber, config.WHISPER.model)
+        )
+        self.diarize = ProcessPoolExecutor(
+            max_workers=self.diarize_workers, **pool_logging(warm_up_diarizer, config.DIARIZATION.model, auth_token)
+        )
+
+    def shutdown(self):
+        self.transcribe.shutdown(wait=True)
+        self.diarize.shutdown(wait=True)
+
+
+class ChunkPipeline:
+    """
+    Chunk-level streaming pipeline: every submitted chunk is transcribed and diarized concurrently,
+    and aligned as soon as both of its outputs exist.
+
+    Each stage admits at most `workers + queue_size` chunks at a time, so `submit` blocks (backpressure)
+    when transcription or diarization falls behind the producer.
+    """
+
+    def __init__(
+        self,
+        config,
+        transcripts_dir: Path,
+        diarizations_dir: Path,
+        aligns_dir: Path,
+        auth_token: str,
+        on_aligned=None,
+        pools: WorkerPools | None = None,
+        metrics: MetricsCollector | None = None,
+        profile: tuple[str, Path] | None = None,
+    ):
+        queue_size = getattr(getattr(config, "STREAMING", None), "queue_size", 2)
+
+        self.config = config
+        self.transcripts_dir = transcripts_dir
+        self.diarizations_dir = diarizations_dir
+        self.aligns_dir = aligns_dir
+        self.auth_token = auth_token
+        # on_aligned(stem, aligned_path, offset_sec) is called from the alignment thread
+        self.on_aligned = on_aligned
+        self.metrics = metrics or MetricsCollector()
+        self._transcribe_task = profiled(measured_call, "transcribe", profile)
+        self._diarize_task = profiled(measured_call, "diarize", profile)
+        self.decoding = decoding_settings(config)
+        self.context = {}  # decoding context of the recording (language, initial prompt), see prepare_context
+        self._detection = None  # language detection in flight, resolved before the first chunk is transcribed
+
+        for d in (transcripts_dir, diarizations_dir, aligns_dir):
+            d.mkdir(parents=True, exist_ok=True)
+
+        self._owns_pools = pools is None
+        self._pools = pools or WorkerPools(config, auth_token)
+        self._align_pool = ThreadPoolExecutor(max_workers=1)
+        self._transcribe_slots = threading.BoundedSemaphore(self._pools.transcribe_workers + queue_size)
+        self._diarize_slots = threading.BoundedSemaphore(self._pools.diarize_workers + queue_size)
+
+        self._lock = threading.Lock()
+        self._joined = threading.Condition(self._lock)
+        self._submitted = 0
+        self._joined_count = 0
+        self._pending = {}  # chunk stem -> {finished stage: whether it succeeded}
+        self._offsets = {}  # chunk stem -> offset of the chunk in the recording (sec)
+        self._durations = {}  # chunk stem -> chunk duration (sec)
+        self._align_futures = []
+        self.aligned = []
+        self.started_at = time.time()
+        self.first_aligned_at = None
+        self.broken = False  # a worker process died: the pools fail every later task and must be recreated
+
+    def prepare_context(self, recording: str, audio_paths: list[Path], context_path: Path):
+        """
+        Load the recording's decoding context from the cache or, when its language is not configured and
+        not cached yet, start detecting it on a warm transcription worker. The detection runs while the
+        first chunks are cut and diarized; it is waited for before the first chunk is transcribed, so every
+        chunk is decoded with the same language.
+        """
+        contexts = load_contexts(context_path)
+        self.context = contexts.get(recording, {})
+        if needs_detection(contexts, recording, self.decoding):
+            future = submit_detection(self._pools.transcribe, audio_paths, self.config.WHISPER.model, self.decoding)
+            self._detection = (recording, audio_paths, context_path, contexts, future, time.time())
+
+    def _resolve_context(self):
+        if self._detection is None:
+            return
+        recording, audio_paths, context_path, contexts, future, submitted_at = self._detection
+        self._detection = None
+        sample = record_detection(contexts, recording, future)
+        if sample is not None:
+            audio_sec = sum(get_wav_duration(path) for path in audio_paths)
+            self.metrics.add("detect", recording, sample, audio_sec=audio_sec, submitted_at=submitted_at)
+            save_contexts(context_path, contexts)
+        self.context = contexts.get(recording, {})
+
+    def submit(self, chunk_path: Path, offset_sec: float = 0.0):
+        """
+        Queue one chunk for transcription and diarization. Blocks while either stage queue is full.
+        """
+        stem = chunk_path.stem
+        duration_sec = get_wav_duration(chunk_path)
+        with self._lock:
+            self._pending[stem] = {}
+            self._offsets[stem] = offset_sec
+            self._durations[stem] = duration_sec
+
+        # Queue wait includes the time spent blocked on a full stage queue. Diarization goes first, so it
+        # is not held back by a language detection still in flight.
+        diarize_submitted_at = time.time()
+        self._diarize_slots.acquire()
+        diarize_future = self._pools.diarize.submit(
+            self._diarize_task,
+            diarize_audio,
+            chunk_path,
+            self.diarizations_dir / f"{stem}.rttm",
+            self.config.DIARIZATION.model,
+            self.auth_token,
+            getattr(self.config.DIARIZATION, "max_speakers", None),
+            linking_settings(self.config)["enabled"],
+        )
+        diarize_future.add_done_callback(
+            lambda f: self._stage_done(f, stem, "diarize", self._diarize_slots, diarize_submitted_at)
+        )
+
+        self._resolve_context()
+        transcribe_submitted_at = time.time()
+        self._transcribe_slots.acquire()
+        transcribe_future = self._pools.transcribe.submit(
+            self._transcribe_task,
+            transcribe_audio,
+            chunk_path,
+            self.transcripts_dir / f"{stem}.json",
+            self.config.WHISPER.model,
+            *decoding_options(self.decoding, self.context),
+        )
+        transcribe_future.add_done_callback(
+            lambda f: self._stage_done(f, stem, "transcribe", self._transcribe_slots, transcribe_submitted_at)
+        )
+        with self._lock:
+            self._submitted += 1
+
+    def _stage_done(
+        self, future, stem: str, stage: str, slots: threading.BoundedSemaphore, submitted_at: float
+    ):
+        slots.release()
+        if future.exception() is not None:
+            logger.error(f"{stage} failed for {stem}: {future.exception()}")
+            if isinstance(future.exception(), BrokenProcessPool):
+                self.broken = True
+        with self._lock:
+            if future.exception() is None:
+                _, sample = future.result()
+                self.metrics.add(stage, recording_of(stem), sample, stem, self._durations[stem], submitted_at)
+            done = self._pending[stem]
+            done[stage] = future.exception() is None
+            if done.keys() != {"transcribe", "diarize"}:
+                return
+            del self._pending[stem]
+            if all(done.values()):
+                self._align_futures.append(self._align_pool.submit(self._align, stem))
+            else:
+                # Chunk stems are reused across runs: an output left by an earlier run must not be aligned
+                failed = ", ".join(name for name, succeeded in done.items() if not succeeded)
+                logger.warning(f"Skipping alignment of {stem}: {failed} failed.")
+            self._joined_count += 1
+            self._joined.notify_all()
+
+    def _align(self, stem: str):
+        transcription_path = self.transcripts_dir / f"{stem}.json"
+        diarization_path = self.diarizations_dir / f"{stem}.rttm"
+        if not transcription_path.exists() or not diarization_path.exists():
+            logger.warning(f"Skipping alignment of {stem}: transcription or diarization is missing.")
+            return
+
+        output_path = self.aligns_dir / f"{stem}.aligned.json"
+        try:
+            with self.metrics.measure("align", recording_of(stem), stem, self._durations[stem]):
+                align_pair(transcription_path, diarization_path, output_path)
+        except Exception:
+            return  # already logged by align_pair
+
+        if self.first_aligned_at is None:
+            self.first_aligned_at = time.time()
+            logger.info(f"First aligned chunk after {self.first_aligned_at - self.started_at:.1f}s")
+        self.aligned.append(output_path)
+        if self.on_aligned is not None:
+            self.on_aligned(stem, output_path, self._offsets[stem])
+
+    def close(self) -> list[Path]:
+        """
+        Wait for all submitted chunks to be aligned and shut down the worker pools it owns.
+        """
+        self._resolve_context()  # cache the detected language even if no chunk was submitted
+        with self._joined:
+            self._joined.wait_for(lambda: self._joined_count == self._submitted)
+        if self._owns_pools:
+            self._pools.shutdown()
+        # Every chunk has queued its alignment by now
+        wait(self._align_futures)
+        self._align_pool.shutdown(wait=True)
+        return sorted(self.aligned)
+
+
+def process_recording(
+    audio_path: Path,
+    audio_dir: Path,
+    config,
+    pools: WorkerPools | None = None,
+    metrics: MetricsCollector | None = None,
+    profile: tuple[str, Path] | None = None,
+) -> list[Path]:
+    """
+    Run chunking, transcription, diarization and alignment for one recording as a chunk-level stream.
+    """
+    load_dotenv()
+    auth_token = os.getenv("HF_TOKEN")
+    if not auth_token:
+        raise RuntimeError("HF_TOKEN environment variable not set.")
+
+    preprocess = preprocess_settings(config)
+    if preprocess["enabled"]:
+        chunks = iter_preprocessed_chunks(
+            audio_path,
+            audio_dir / "chunks",
+            config.CHUNKING.max_chunk_duration_sec,
+            config.CHUNKING.min_silence_duration_sec,
+            preprocess,
+        )
+    else:
+        silence_thresh_db = estimate_silence_threshold(str(audio_path), offset_db=-15.0)
+        logger.info(f"Auto-estimated silence threshold: {silence_thresh_db:.2f} dBFS")
+        chunks = iter_chunks(
+            input_file=audio_path,
+            output_dir=audio_dir / "chunks",
+            max_duration_sec=config.CHUNKING.max_chunk_duration_sec,
+            silence_thresh_db=silence_thresh_db,
+            min_silence_len_sec=config.CHUNKING.min_silence_duration_sec,
+        )
+
+    pipeline = ChunkPipeline(
+        config,
+        audio_dir / "transcripts",
+        audio_dir / "diarizations",
+        audio_dir / "aligns",
+        auth_token,
+        pools=pools,
+        metrics=metrics,
+        profile=profile,
+    )
+    try:
+        pipeline.prepare_context(audio_path.stem, [audio_path], audio_dir / CONTEXT_FILE)
+        for chunk_path, offset_sec, duration_sec in chunks:
+            logger.info(f"Chunk ready: {chunk_path.name} ({duration_sec:.1f}s at {offset_sec:.1f}s)")
+            pipeline.submit(chunk_path, offset_sec)
+    finally:
+        aligned = pipeline.close()
+    if pipeline.broken:
+        raise BrokenProcessPool(f"A worker process died while processing {audio_path.name}")
+
+    logger.info(f"Streamed {len(aligned)} aligned chunks in {time.time() - pipeline.started_at:.1f}s")
+    return aligned
+
+
+def cli_entry(args):
+    config = load_config(args.config)
+    metrics = open_collector(args)
+    try:
+        process_recording(
+            Path(args.input), Path(args.output), config, metrics=metrics, profile=profile_settings(args)
+        )
+    finally:
+        metrics.flush()
@@ -1,31 +1,76 @@
+import functools
 import json
-import logging
+import time
 from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 
+from src.decoding_context import (
+    decoding_options,
+    decoding_settings,
+    group_recordings,
+    load_contexts,
+    needs_detection,
+    record_detection,
+    save_contexts,
+    submit_detection,
+)
+from src.ledger import call_with_retry, open_ledger, recording_of, retry_settings
+from src.log_service import log_context, pool_logging
+from src.metrics import measured_call, open_collector
+from src.profiling import profile_settings, profiled
+from src.scheduler import estimate_makespan, get_wav_duration, report_utilization, schedule
+from src.store import RecordingStore, compact_transcription
 from src.utils import load_config, setup_logger
-from tqdm import tqdm
 
 logger = setup_logger("transcriber")
 
 
-def transcribe_audio(audio_path: Path, output_path: Path, model_name: str, language: str, logger: logging.Logger):
-    # import warnings
-    # warnings.filterwarnings("ignore", category=UserWarning)
-
+@functools.lru_cache(maxsize=2)
+def load_model(model_name: str):
+    """
+    Load a Whisper model once per worker process and keep it warm for subsequent chunks.
+    """
     import whisper
 
-    model = whisper.load_model(model_name)
+    return whisper.load_model(model_name)
 
+
+def warm_up(model_name: str):
+    """
+    Pool initializer: preload the model so the first chunk does not pay the load time.
+    """
     try:
-        logger.info(f"Starting transcription: {audio_path.name}")
-        result = model.transcribe(str(audio_path), language=language)
-        result["model_name"] = model_name
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(result, f, ensure_ascii=False, indent=2)
-        logger.info(f"Transcribed: {audio_path.name}")
+        load_model(model_name)
     except Exception as e:
-        logger.error(f"Failed to transcribe {audio_path.name}: {e}")
+        logger.error(f"Failed to preload Whisper model '{model_name}': {e}")
+
+
+def transcribe_audio(
+    audio_path: Path, output_path: Path | None, model_name: str, language: str | None, initial_prompt: str | None = None
+) -> dict:
+    """
+    Transcribe one chunk. The full Whisper result is written to output_path (if given);
+    a compact copy (segments without tokens) is returned for the recording store.
+    Without a language Whisper detects it from the chunk's first 30 s (see decoding_context).
+    """
+    # import warnings
+    # warnings.filterwarnings("ignore", category=UserWarning)
+
+    model = load_model(model_name)
+
+    with log_context(stage="transcribe", recording=recording_of(audio_path.stem), chunk=audio_path.stem):
+        try:
+            logger.info(f"Starting transcription: {audio_path.name}")
+            result = model.transcribe(str(audio_path), language=language, initial_prompt=initial_prompt)
+            result["model_name"] = model_name
+            if output_path is not None:
+                with open(output_path, "w", encoding="utf-8") as f:
+                    json.dump(result, f, ensure_ascii=False, indent=2)
+            logger.info(f"Transcribed: {audio_path.name}")
+            return compact_transcription(result)
+        except Exception as e:
+            logger.error(f"Failed to transcribe {audio_path.name}: {e}")
+            raise
 
 
 def cli_entry(args):
@@ -33,8 +78,13 @@ def cli_entry(args):
     # chunk_dir = Path(config.GENERAL.processed_output_dir) / "chunks"
     # output_dir = Path(config.GENERAL.processed_output_dir) / "transcripts"
     # input_paths = Path(args.input)
-    output_dir = Path(args.output)
-    output_dir.mkdir(parents=True, exist_ok=True)
+    store = RecordingStore(Path(args.store)) if getattr(args, "store", None) else None
+    if store is None and not args.output:
+        logger.error("Either --output or --store is required.")
+        return
+    output_dir = Path(args.output) if args.output else None
+    if output_dir is not None:
+        output_dir.mkdir(parents=True, exist_ok=True)
 
     input_paths = [Path(p) for p in args.input]
     audio_files = []
@@ -52,16 +102,110 @@ def cli_entry(args):
     logger.info(f"Found {len(audio_files)} chunks. Starting transcription...")
 
     model_name = config.WHISPER.model
-    language = config.WHISPER.language
+    decoding = decoding_settings(config)
+    context_path = Path(args.context) if getattr(args, "context", None) else None
+    workers = config.PARALLEL.parallel_workers
+
+    # Submit the most expensive chunks first so no worker is left with a long chunk at the end
+    strategy = getattr(config.PARALLEL, "schedule", "longest_first")
+    scheduled = schedule(audio_files, model_name, strategy, getattr(config.PARALLEL, "cost_factors", None))
+    logger.info(
+        f"Scheduling {len(scheduled)} chunks ({strategy}), "
+        f"estimated makespan {estimate_makespan([cost for _, cost in scheduled], workers):.0f}s"
+    )
+
+    ledger = open_ledger(args, config)
+    max_attempts, backoff_base_sec = retry_settings(config)
+    if ledger:
+        for audio_file, _ in scheduled:
+            ledger.start(recording_of(audio_file.stem), "transcribe", audio_file.stem)
 
-    with ProcessPoolExecutor(max_workers=config.PARALLEL.parallel_workers) as executor:
-        futures = {
-            executor.submit(
-                transcribe_audio, audio_file, output_dir / f"{audio_file.stem}.json", model_name, language, logger
-            ): audio_file
-            for audio_file in audio_files
-        }
+    metrics = open_collector(args)
+    spans = []
+    failed = []
+    wall_start = time.time()
+    task = profiled(measured_call, "transcribe", profile_settings(args))
+    with ProcessPoolExecutor(max_workers=workers, **pool_logging()) as executor:
+        # Recording-level pre-pass: detect each recording's language once (cached in the context file),
+        # on a worker that keeps its model warm for the chunks. Chunks of recordings whose language is
+        # configured or cached are submitted right away, the others as soon as their detection is done.
+        contexts = load_contexts(context_path) if context_path is not None else {}
+        detections = {}
+        if context_path is not None:
+            for recording, chunk_files in group_recordings(audio_files).items():
+                if needs_detection(contexts, recording, decoding):
+                    future = submit_detection(executor, chunk_files, model_name, decoding)
+                    detections[future] = (recording, time.time(), sum(map(get_wav_duration, chunk_files)))
+        detecting = {recording for recording, _, _ in detections.values()}
+
+        futures = {}
+        submitted_at = {}  # queue wait is measured from here, not from before the language pre-pass
+
+        def submit(audio_file: Path):
+            submitted_at[audio_file] = time.time()
+            future = executor.submit(
+                task,
+                call_with_retry,
+                max_attempts,
+                backoff_base_sec,
+                transcribe_audio,
+                audio_file,
+                output_dir / f"{audio_file.stem}.json" if output_dir else None,
+                model_name,
+                *decoding_options(decoding, contexts.get(recording_of(audio_file.stem), {})),
+            )
+            futures[future] = audio_file
+
+        for audio_file, _ in scheduled:
+            if recording_of(audio_file.stem) not in detecting:
+                submit(audio_file)
+        detect_sec = 0.0
+        for detection in as_completed(detections):
+            recording, detection_submitted_at, audio_sec = detections[detection]
+            sample = record_detection(contexts, recording, detection)
+            if sample is not None:
+                metrics.add("detect", recording, sample, audio_sec=audio_sec, submitted_at=detection_submitted_at)
+                detect_sec += sample["finished_at"] - sample["started_at"]
+            for audio_file, _ in scheduled:
+                if recording_of(audio_file.stem) == recording:
+                    submit(audio_file)
+        if detections:
+            save_contexts(context_path, contexts)
 
         # for future in tqdm(as_completed(futures), total=len(futures), desc="Transcribing"):
         for future in as_completed(futures):
-            future.result()
+            audio_file = futures[future]
+            try:
+                (result, attempts), sample = future.result()
+            except Exception as e:
+                failed.append(audio_file)
+                if ledger:
+                    ledger.fail(
+                        recording_of(audio_file.stem), "transcribe", e, audio_file.stem, getattr(e, "attempts", 1)
+                    )
+                continue
+            started_at, finished_at = sample["started_at"], sample["finished_at"]
+            spans.append((started_at, finished_at))
+            metrics.add(
+                "transcribe",
+                recording_of(audio_file.stem),
+                sample,
+                audio_file.stem,
+                get_wav_duration(audio_file),
+                submitted_at=submitted_at[audio_file],
+            )
+            if store is not None:
+                store.put_transcription(audio_file.stem, result)
+            if ledger:
+                ledger.succeed(
+                    recording_of(audio_file.stem), "transcribe", audio_file.stem, attempts, finished_at - started_at
+                )
+
+    if failed:
+        logger.error(f"{len(failed)} of {len(futures)} chunks failed to transcribe.")
+    if detections:
+        busy_sec = detect_sec + sum(finished_at - started_at for started_at, finished_at in spans)
+        share = f", {detect_sec / busy_sec:.1%} of transcription worker time" if busy_sec > 0 else ""
+        logger.info(f"Language detection of {len(detections)} recordings took {detect_sec:.1f}s{share}")
+    metrics.flush()
+    return report_utilization("transcribe", spans, workers, wall_start)
@@ -5,18 +5,57 @@ from datetime import timedelta
 from pathlib import Path
 from types import SimpleNamespace
 
-from pydub import AudioSegment
+CONSOLE_FORMAT = "[%(name)s] %(levelname)s: %(message)s"
 
 
-def load_config(config_path: str) -> SimpleNamespace:
+def load_config(config_path: str, overrides: dict | None = None) -> SimpleNamespace:
     """
     Load and parse the TOML configuration file into a SimpleNamespace for dot-notation access.
+
+    Optional overrides (e.g. {"WHISPER": {"language": "en"}}) are merged on top of the file contents.
     """
     with open(config_path, "rb") as f:
         config_dict = tomllib.load(f)
+    if overrides:
+        config_dict = merge_dicts(config_dict, overrides)
     return dict_to_namespace(config_dict)
 
 
+def merge_dicts(base: dict, overrides: dict) -> dict:
+    """
+    Recursively merge overrides into a copy of base.
+    """
+    merged = dict(base)
+    for key, value in overrides.items():
+        if isinstance(value, dict) and isinstance(merged.get(key), dict):
+            merged[key] = merge_dicts(merged[key], value)
+        else:
+            merged[key] = value
+    return merged
+
+
+def parse_overrides(assignments: list[str]) -> dict:
+    """
+    Turn ["WHISPER.language=\"en\"", "PARALLEL.parallel_workers=4"] into a nested overrides dict.
+    Values are parsed as TOML literals, falling back to plain strings.
+    """
+    overrides = {}
+    for assignment in assignments or []:
+        key, sep, raw_value = assignment.partition("=")
+        if not sep:
+            raise ValueError(f"Invalid override '{assignment}', expected SECTION.key=value")
+        try:
+            value = tomllib.loads(f"value = {raw_value}")["value"]
+        except tomllib.TOMLDecodeError:
+            value = raw_value
+        node = overrides
+        *sections, leaf = key.strip().split(".")
+        for section in sections:
+            node = node.setdefault(section, {})
+        node[leaf] = value
+    return overrides
+
+
 def dict_to_namespace(d: dict) -> SimpleNamespace:
     """
     Recursively convert a dictionary to a SimpleNamespace.
@@ -40,17 +79,19 @@ def load_substitutions(path: str) -> dict:
 
 def setup_logger(module_name: str = "pipeline", log_path: str = "transcribeline.log") -> logging.Logger:
     """
-    Configure and return a logger that logs both to the console and a file.
+    Return the logger for a module. Records propagate to the root logger, which gets a single console
+    handler the first time this is called; calling it again (e.g. on import in every worker) changes nothing.
+    log_service.LogService later routes the root handlers through a queue listener.
     """
     logger = logging.getLogger(module_name)
     logger.setLevel(logging.INFO)
-    logger.handlers.clear()
 
     # Console handler
-    console_handler = logging.StreamHandler()
-    console_formatter = logging.Formatter(f"[{module_name}] %(levelname)s: %(message)s")
-    console_handler.setFormatter(console_formatter)
-    logger.addHandler(console_handler)
+    root = logging.getLogger()
+    if not root.handlers:
+        console_handler = logging.StreamHandler()
+        console_handler.setFormatter(logging.Formatter(CONSOLE_FORMAT))
+        root.addHandler(console_handler)
 
     # File handler
     # Path(log_dir).mkdir(parents=True, exist_ok=True)
@@ -74,6 +115,8 @@ def estimate_silence_threshold(audio_path: str, offset_db: float = -20.0) -> flo
     Returns:
         float: Estimated silence threshold in dBFS.
     """
+    from pydub import AudioSegment
+
     audio = AudioSegment.from_file(audio_path)
     average_loudness = audio.dBFS
     return average_loudness + offset_db  # offset_db is negative
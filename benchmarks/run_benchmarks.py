@@ -0,0 +1,249 @@
+#!/usr/bin/env python3
+"""
+Reproducible benchmark of the CPU-side pipeline stages.
+
+Generates a synthetic multi-speaker recording (with RTTM ground truth), then runs the real chunker,
+aligner and postprocessor on it, using stub ASR and diarization models that answer from the
+ground truth. Throughput (audio seconds per wall second, best of --repeat runs) and peak traced
+Python memory per stage are compared against a baseline file; a regression past --threshold fails.
+
+    python benchmarks/run_benchmarks.py                    # compare against benchmarks/baseline.json
+    python benchmarks/run_benchmarks.py --update-baseline  # record a new baseline on this machine
+
+Baselines are machine-specific, so none is committed: record one on the machine (or CI runner) you
+compare on. Without a baseline the run fails. Correctness (every cut inside a silence gap, no words
+lost) is checked on every run, baseline or not.
+"""
+
+import argparse
+import json
+import logging
+import platform
+import re
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+APP_DIR = BENCH_DIR.parent / "app"
+sys.path.insert(0, str(APP_DIR))
+sys.path.insert(0, str(BENCH_DIR))
+
+from src.aligner import align_pair  # noqa: E402
+from src.chunker import iter_chunks  # noqa: E402
+from src.postprocessor import merge_aligned_chunks  # noqa: E402
+from src.utils import estimate_silence_threshold, load_config  # noqa: E402
+from stubs import stub_diarize, stub_transcribe, turn_segments  # noqa: E402
+from synthetic import generate_recording, write_rttm  # noqa: E402
+
+DEFAULT_BASELINE = BENCH_DIR / "baseline.json"
+STAGES = ("chunk", "align", "postprocess")
+WORD_PATTERN = re.compile(r"speaker_\d+-\d+-\d+-\d+")
+NOISE_FLOOR_SEC = 0.01  # slowdowns smaller than this are timer noise, whatever the ratio
+
+
+def measure(func, trace_memory: bool) -> tuple:
+    """
+    Run func and return (result, wall_sec, peak_mb). Memory is only traced on request,
+    since tracemalloc slows down the code it observes.
+    """
+    if trace_memory:
+        tracemalloc.start()
+    started_at = time.perf_counter()
+    result = func()
+    wall_sec = time.perf_counter() - started_at
+    peak_mb = None
+    if trace_memory:
+        peak_mb = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+    return result, wall_sec, peak_mb
+
+
+def run_once(audio_path: Path, truth: dict, work_dir: Path, config, trace_memory: bool) -> tuple[dict, dict]:
+    """
+    One pass over the recording. Returns (per-stage measurements, correctness checks).
+    """
+    shutil.rmtree(work_dir, ignore_errors=True)
+    chunks_dir = work_dir / "chunks"
+    transcripts_dir = work_dir / "transcripts"
+    diarizations_dir = work_dir / "diarizations"
+    aligns_dir = work_dir / "aligns"
+    formatted_file = work_dir / "formatted" / f"{audio_path.stem}.txt"
+    for d in (transcripts_dir, diarizations_dir, aligns_dir):
+        d.mkdir(parents=True)
+
+    def chunk():
+        silence_thresh_db = estimate_silence_threshold(str(audio_path), offset_db=-15.0)
+        return list(
+            iter_chunks(
+                audio_path,
+                chunks_dir,
+                config.CHUNKING.max_chunk_duration_sec,
+                silence_thresh_db,
+                config.CHUNKING.min_silence_duration_sec,
+            )
+        )
+
+    stages = {}
+    chunks, wall_sec, peak_mb = measure(chunk, trace_memory)
+    stages["chunk"] = (wall_sec, peak_mb)
+
+    # Stub models: not measured
+    segments = turn_segments(truth["turns"])
+    for chunk_path, offset_sec, duration_sec in chunks:
+        stem = chunk_path.stem
+        stub_transcribe(segments, chunk_path, offset_sec, duration_sec, transcripts_dir / f"{stem}.json")
+        stub_diarize(truth["turns"], chunk_path, offset_sec, duration_sec, diarizations_dir / f"{stem}.rttm")
+
+    def align():
+        for chunk_path, _, _ in chunks:
+            stem = chunk_path.stem
+            align_pair(
+                transcripts_dir / f"{stem}.json",
+                diarizations_dir / f"{stem}.rttm",
+                aligns_dir / f"{stem}.aligned.json",
+            )
+
+    _, wall_sec, peak_mb = measure(align, trace_memory)
+    stages["align"] = (wall_sec, peak_mb)
+
+    _, wall_sec, peak_mb = measure(lambda: merge_aligned_chunks([str(aligns_dir)], formatted_file), trace_memory)
+    stages["postprocess"] = (wall_sec, peak_mb)
+
+    cuts = [offset_sec for _, offset_sec, _ in chunks[1:]]
+    words_in = sum(len(seg["text"].split()) for seg in segments)
+    words_out = len(WORD_PATTERN.findall(formatted_file.read_text(encoding="utf-8")))
+    checks = {
+        "chunks": len(chunks),
+        "cuts_in_silence": sum(any(start <= cut <= end for start, end in truth["gaps"]) for cut in cuts),
+        "cuts": len(cuts),
+        "words_in": words_in,
+        "words_out": words_out,
+    }
+    return stages, checks
+
+
+def run_benchmark(args) -> dict:
+    config = load_config(args.config)
+    if args.max_chunk_sec:
+        config.CHUNKING.max_chunk_duration_sec = args.max_chunk_sec
+
+    with tempfile.TemporaryDirectory(prefix="transcribeline-bench-") as tmp:
+        tmp = Path(tmp)
+        audio_path = tmp / "synthetic.wav"
+        truth = generate_recording(audio_path, args.duration, args.speakers, args.seed)
+        write_rttm(truth["turns"], tmp / "synthetic.rttm", audio_path.stem)
+
+        walls = {stage: [] for stage in STAGES}
+        for _ in range(args.repeat):
+            stages, checks = run_once(audio_path, truth, tmp / "work", config, trace_memory=False)
+            for stage, (wall_sec, _) in stages.items():
+                walls[stage].append(wall_sec)
+        memory, _ = run_once(audio_path, truth, tmp / "work", config, trace_memory=True)
+
+    return {
+        "benchmark": {
+            "duration_sec": args.duration,
+            "speakers": args.speakers,
+            "seed": args.seed,
+            "max_chunk_sec": config.CHUNKING.max_chunk_duration_sec,
+            "min_silence_sec": config.CHUNKING.min_silence_duration_sec,
+        },
+        "machine": {"python": platform.python_version(), "platform": platform.platform()},
+        "stages": {
+            stage: {
+                "wall_sec": round(min(walls[stage]), 4),
+                "throughput_x": round(args.duration / min(walls[stage]), 2),
+                "peak_mem_mb": round(memory[stage][1], 2),
+            }
+            for stage in STAGES
+        },
+        "checks": checks,
+    }
+
+
+def correctness_failures(checks: dict) -> list[str]:
+    """
+    Checks that hold whatever the baseline: chunks are cut in silence gaps only and no words are lost.
+    """
+    failures = []
+    if checks["cuts_in_silence"] != checks["cuts"]:
+        failures.append(f"check cuts_in_silence: {checks['cuts_in_silence']} of {checks['cuts']} cuts")
+    if checks["words_out"] != checks["words_in"]:
+        failures.append(f"check words_out: {checks['words_out']} of {checks['words_in']} words")
+    return failures
+
+
+def find_regressions(results: dict, baseline: dict, threshold: float) -> list[str]:
+    """
+    Throughput below baseline * (1 - threshold) or peak memory above baseline * (1 + threshold).
+    Correctness checks must match the baseline exactly.
+    """
+    regressions = []
+    for stage, current in results["stages"].items():
+        base = baseline["stages"].get(stage)
+        if base is None:
+            continue
+        slower = current["wall_sec"] - base["wall_sec"] > NOISE_FLOOR_SEC
+        if slower and current["throughput_x"] < base["throughput_x"] * (1 - threshold):
+            regressions.append(
+                f"{stage}: throughput {current['throughput_x']}x vs baseline {base['throughput_x']}x"
+            )
+        if current["peak_mem_mb"] > base["peak_mem_mb"] * (1 + threshold):
+            regressions.append(f"{stage}: peak memory {current['peak_mem_mb']} MB vs baseline {base['peak_mem_mb']} MB")
+    for name, value in results["checks"].items():
+        if baseline["checks"].get(name) != value:
+            regressions.append(f"check {name}: {value} vs baseline {baseline['checks'].get(name)}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the chunker, aligner and postprocessor on synthetic audio")
+    parser.add_argument("--duration", type=float, default=900.0, help="Synthetic recording length in seconds")
+    parser.add_argument("--speakers", type=int, default=3, help="Number of synthetic speakers")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for the synthetic recording")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per stage (the fastest one counts)")
+    parser.add_argument("--max-chunk-sec", type=int, help="Override CHUNKING.max_chunk_duration_sec")
+    parser.add_argument("--config", default=str(APP_DIR / "config" / "settings.toml"), help="Pipeline config")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE), help="Baseline results file")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed relative regression (default 0.2)")
+    parser.add_argument("--update-baseline", action="store_true", help="Write the results as the new baseline")
+    parser.add_argument("--output", help="Also write the results JSON here")
+    args = parser.parse_args()
+
+    for name in ("chunker", "aligner", "postprocessing"):
+        logging.getLogger(name).setLevel(logging.WARNING)
+
+    results = run_benchmark(args)
+    print(json.dumps(results, indent=2))
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+    failures = correctness_failures(results["checks"])
+    if failures:
+        print("Correctness checks failed:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+
+    baseline_path = Path(args.baseline)
+    if args.update_baseline:
+        baseline_path.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"Baseline written to {baseline_path}")
+        return
+    if not baseline_path.exists():
+        sys.exit(f"No baseline at {baseline_path}: record one on this machine with --update-baseline.")
+
+    baseline = json.loads(baseline_path.read_text())
+    if baseline["benchmark"] != results["benchmark"]:
+        sys.exit(f"Baseline was recorded with different settings: {baseline['benchmark']}")
+    regressions = find_regressions(results, baseline, args.threshold)
+    if regressions:
+        print("Regressions against baseline:\n  " + "\n  ".join(regressions))
+        sys.exit(1)
+    print(f"No regressions against {baseline_path} (threshold {args.threshold:.0%})")
+
+
+if __name__ == "__main__":
+    main()
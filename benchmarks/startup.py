@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+CLI startup benchmark: how long `main.py` spends importing modules for light subcommands.
+
+Runs each command under `python -X importtime`, subtracts the interpreter's own startup imports,
+and fails if the median import time exceeds --target-ms or if a heavy dependency (pydub, numpy,
+pyannote, torch, whisper, ...) is imported by a command that does not need it.
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --target-ms 80 --top 15
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+APP_DIR = BENCH_DIR.parent / "app"
+MAIN_PATH = APP_DIR / "main.py"
+
+# Modules no light command should pull in
+HEAVY_MODULES = ("pydub", "numpy", "scipy", "pyannote", "torch", "whisper", "tqdm")
+
+
+def light_commands(tmp: Path) -> dict[str, list[str]]:
+    (tmp / "aligns").mkdir(exist_ok=True)
+    return {
+        "help": ["--help"],
+        "generate-config": ["generate-config", str(tmp / "settings.toml"), "--overwrite"],
+        "postprocess": ["postprocess", "--input", str(tmp / "aligns"), "--output", str(tmp / "out.txt")],
+        "export-store": ["export-store", "--store", str(tmp / "empty.sqlite"), "--output", str(tmp / "export")],
+    }
+
+
+def parse_importtime(stderr: str) -> tuple[dict[str, int], set[str]]:
+    """
+    Parse `-X importtime` output into ({top-level module: cumulative_us}, every imported module).
+    Nested imports are already included in their top-level parent's cumulative time.
+    """
+    top_level = {}
+    imported = set()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "imported package" in line:
+            continue
+        _, cumulative_us, name = line[len("import time:") :].split("|")
+        imported.add(name.strip())
+        if not name.startswith("  "):
+            top_level[name.strip()] = int(cumulative_us)
+    return top_level, imported
+
+
+def run_importtime(argv: list[str], cwd: Path) -> tuple[float, dict[str, int], set[str]]:
+    """
+    (total import time in ms, top-level modules, all imported modules) for one run of argv.
+    """
+    result = subprocess.run([sys.executable, "-X", "importtime", *argv], cwd=cwd, capture_output=True, text=True)
+    top_level, imported = parse_importtime(result.stderr)
+    return sum(top_level.values()) / 1000.0, top_level, imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure main.py import time for light subcommands")
+    parser.add_argument("--target-ms", type=float, default=100.0, help="Max median import time per command")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per command (the median counts)")
+    parser.add_argument("--top", type=int, default=10, help="Show the N most expensive top-level imports")
+    args = parser.parse_args()
+
+    interpreter_ms = statistics.median(run_importtime(["-c", "pass"], APP_DIR)[0] for _ in range(args.repeat))
+    print(f"Interpreter startup imports: {interpreter_ms:.1f} ms (subtracted below)")
+
+    failures = []
+    with tempfile.TemporaryDirectory(prefix="transcribeline-startup-") as tmp:
+        for name, argv in light_commands(Path(tmp)).items():
+            argv = [str(MAIN_PATH), *argv]
+            runs = [run_importtime(argv, APP_DIR) for _ in range(args.repeat)]
+            median_ms = statistics.median(ms for ms, _, _ in runs) - interpreter_ms
+            _, top_level, imported = runs[-1]
+            print(f"\n{name}: {median_ms:.1f} ms of imports (target {args.target_ms:.0f} ms)")
+            for module, cumulative_us in sorted(top_level.items(), key=lambda item: -item[1])[: args.top]:
+                print(f"  {cumulative_us / 1000:8.1f} ms  {module}")
+
+            if median_ms > args.target_ms:
+                failures.append(f"{name}: {median_ms:.1f} ms > {args.target_ms:.0f} ms")
+            heavy = sorted(module for module in imported if module.split(".")[0] in HEAVY_MODULES)
+            if heavy:
+                failures.append(f"{name}: imports heavy modules {', '.join(heavy[:5])}")
+
+    if failures:
+        print("\nStartup regressions:\n  " + "\n  ".join(failures))
+        sys.exit(1)
+    print("\nAll light commands within target.")
+
+
+if __name__ == "__main__":
+    main()
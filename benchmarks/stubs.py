@@ -0,0 +1,71 @@
+"""
+Stand-ins for Whisper and pyannote that answer instantly from the ground truth, so the benchmark
+measures only the real chunker, aligner and postprocessor. They write the same files as
+transcribe_audio (Whisper JSON) and diarize_audio (RTTM) for one chunk.
+"""
+
+import json
+from pathlib import Path
+
+SEGMENT_SEC = 6.0  # Whisper-like segment length
+
+
+def turn_segments(turns: list[tuple[float, float, str]]) -> list[dict]:
+    """
+    Split every ground-truth turn into short segments with deterministic, countable words.
+    """
+    segments = []
+    for turn_idx, (start, duration, speaker) in enumerate(turns):
+        pieces = max(int(duration // SEGMENT_SEC), 1)
+        step = duration / pieces
+        for k in range(pieces):
+            seg_start = start + k * step
+            words = " ".join(f"{speaker.lower()}-{turn_idx}-{k}-{w}" for w in range(int(step * 2) + 1))
+            segments.append({"start": seg_start, "end": seg_start + step, "text": " " + words})
+    return segments
+
+
+def stub_transcribe(segments: list[dict], chunk_path: Path, offset_sec: float, duration_sec: float, output_path: Path):
+    """
+    Segments whose midpoint falls in the chunk, shifted to chunk time and clipped to its bounds.
+    """
+    end_sec = offset_sec + duration_sec
+    chunk_segments = []
+    for seg in segments:
+        if offset_sec <= (seg["start"] + seg["end"]) / 2 < end_sec:
+            chunk_segments.append(
+                {
+                    "id": len(chunk_segments),
+                    "start": round(max(seg["start"], offset_sec) - offset_sec, 3),
+                    "end": round(min(seg["end"], end_sec) - offset_sec, 3),
+                    "text": seg["text"],
+                }
+            )
+    result = {
+        "text": "".join(seg["text"] for seg in chunk_segments),
+        "segments": chunk_segments,
+        "language": "en",
+        "duration": duration_sec,
+        "model_name": "stub",
+    }
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(result, f, ensure_ascii=False, indent=2)
+
+
+def stub_diarize(
+    turns: list[tuple[float, float, str]], chunk_path: Path, offset_sec: float, duration_sec: float, output_path: Path
+):
+    """
+    Ground-truth turns clipped to the chunk, relabelled per chunk in order of appearance like pyannote does.
+    """
+    end_sec = offset_sec + duration_sec
+    labels = {}
+    with open(output_path, "w", encoding="utf-8") as f:
+        for start, duration, speaker in turns:
+            begin, end = max(start, offset_sec), min(start + duration, end_sec)
+            if end <= begin:
+                continue
+            label = labels.setdefault(speaker, f"SPEAKER_{len(labels):02d}")
+            f.write(
+                f"SPEAKER {chunk_path.stem} 1 {begin - offset_sec:.3f} {end - begin:.3f} <NA> <NA> {label} <NA> <NA>\n"
+            )
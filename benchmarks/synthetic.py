@@ -0,0 +1,93 @@
+"""
+Synthetic multi-speaker recordings with known silence gaps and RTTM ground truth.
+
+Each speaker is a harmonic "voice" with its own pitch and a syllable-rate loudness envelope.
+Turns are separated by gaps longer than the chunker's minimum silence; within a turn there are
+short pauses the chunker must not cut at. Everything is derived from a seed, so runs are reproducible.
+"""
+
+import wave
+from pathlib import Path
+
+import numpy as np
+
+SPEAKER_PITCHES_HZ = (110.0, 165.0, 220.0, 140.0, 190.0, 250.0)
+
+
+def make_turns(
+    duration_sec: float,
+    speakers: int,
+    rng: np.random.Generator,
+    turn_sec: tuple[float, float] = (3.0, 20.0),
+    gap_sec: tuple[float, float] = (1.6, 3.0),
+) -> tuple[list[tuple[float, float, str]], list[tuple[float, float]]]:
+    """
+    Lay out speaker turns and the silences between them.
+    Returns (turns as (start, duration, speaker), gaps as (start, end)).
+    """
+    turns = []
+    gaps = []
+    t = rng.uniform(*gap_sec)
+    gaps.append((0.0, t))
+    speaker = 0
+    while t < duration_sec - turn_sec[0]:
+        length = min(rng.uniform(*turn_sec), duration_sec - t)
+        turns.append((round(t, 3), round(length, 3), f"SPEAKER_{speaker:02d}"))
+        t += length
+        gap = rng.uniform(*gap_sec)
+        gaps.append((t, min(t + gap, duration_sec)))
+        t += gap
+        speaker = (speaker + int(rng.integers(1, speakers))) % speakers if speakers > 1 else 0
+    return turns, gaps
+
+
+def voice(length: int, sample_rate: int, pitch_hz: float, rng: np.random.Generator) -> np.ndarray:
+    """
+    Harmonic tone with slight vibrato, a ~4 Hz syllable envelope and short in-turn pauses.
+    """
+    t = np.arange(length) / sample_rate
+    phase = 2 * np.pi * pitch_hz * (t + 0.002 * np.sin(2 * np.pi * 5.0 * t))
+    signal = sum(np.sin(k * phase) / k for k in range(1, 7))
+    envelope = 0.4 + 0.6 * np.sin(2 * np.pi * rng.uniform(3.0, 5.0) * t) ** 2
+
+    # Pauses shorter than the chunker's minimum silence, which must not become cut points
+    pause_len = int(rng.uniform(0.2, 0.8) * sample_rate)
+    for _ in range(int(length / sample_rate // 6)):
+        start = int(rng.integers(0, max(length - pause_len, 1)))
+        envelope[start : start + pause_len] = 0.0
+    return signal * envelope
+
+
+def generate_recording(
+    path: Path, duration_sec: float = 900.0, speakers: int = 3, seed: int = 0, sample_rate: int = 16000
+) -> dict:
+    """
+    Write a mono 16-bit WAV to path and return its ground truth:
+    {"turns": [(start, duration, speaker)], "gaps": [(start, end)], "duration_sec", "sample_rate"}.
+    """
+    rng = np.random.default_rng(seed)
+    total = int(duration_sec * sample_rate)
+    turns, gaps = make_turns(duration_sec, speakers, rng)
+
+    # Background noise around -60 dBFS so silences have a finite loudness
+    audio = rng.normal(0.0, 30.0, total)
+    for start, length, speaker in turns:
+        begin = int(start * sample_rate)
+        end = min(begin + int(length * sample_rate), total)
+        pitch = SPEAKER_PITCHES_HZ[int(speaker.rsplit("_", 1)[1]) % len(SPEAKER_PITCHES_HZ)]
+        audio[begin:end] += 4000.0 * voice(end - begin, sample_rate, pitch, rng)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(np.clip(audio, -32768, 32767).astype("<i2").tobytes())
+
+    return {"turns": turns, "gaps": gaps, "duration_sec": duration_sec, "sample_rate": sample_rate}
+
+
+def write_rttm(turns: list[tuple[float, float, str]], path: Path, file_id: str):
+    with open(path, "w", encoding="utf-8") as f:
+        for start, duration, speaker in turns:
+            f.write(f"SPEAKER {file_id} 1 {start:.3f} {duration:.3f} <NA> <NA> {speaker} <NA> <NA>\n")
@@ -0,0 +1,91 @@
+import wave
+
+import numpy as np
+import pytest
+from pydub import AudioSegment
+from pydub.silence import detect_silence
+
+from src.chunker import RollingChunker, chunk_audio, iter_chunks, iter_cut_points, iter_silence, write_wav
+from src.preprocessor import iter_wav_blocks
+
+SAMPLE_RATE = 16000
+
+
+def tone(seconds: float, amplitude: float = 0.3) -> np.ndarray:
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (amplitude * 32767 * np.sin(2 * np.pi * 220 * t)).astype(np.int16).reshape(-1, 1)
+
+
+def silence(seconds: float) -> np.ndarray:
+    return np.zeros((int(seconds * SAMPLE_RATE), 1), dtype=np.int16)
+
+
+def blocks_of(signal: np.ndarray, block_samples: int = 4096):
+    for start in range(0, len(signal), block_samples):
+        yield signal[start : start + block_samples]
+
+
+@pytest.fixture
+def speech_wav(tmp_path):
+    """
+    ~70 s of tone "utterances" (3-6 s) separated by 0.8-1.5 s of digital silence, on a 100 ms grid.
+    """
+    rng = np.random.default_rng(0)
+    parts = []
+    for _ in range(12):
+        parts.append(tone(int(rng.integers(30, 60)) / 10))
+        parts.append(silence(int(rng.integers(8, 15)) / 10))
+    path = tmp_path / "speech.wav"
+    write_wav(path, np.concatenate(parts), SAMPLE_RATE)
+    return path
+
+
+def wav_offsets(paths) -> list[float]:
+    offsets = [0.0]
+    for path in paths[:-1]:
+        with wave.open(str(path), "rb") as wav:
+            offsets.append(offsets[-1] + wav.getnframes() / wav.getframerate())
+    return offsets
+
+
+def test_iter_silence_matches_pydub(speech_wav):
+    audio = AudioSegment.from_wav(speech_wav)
+    assert list(iter_silence(audio, 500, -40.0, seek_step=100)) == detect_silence(audio, 500, -40.0, seek_step=100)
+
+
+def test_streamed_cut_points_match_chunk_audio(speech_wav, tmp_path):
+    chunk_paths = chunk_audio(speech_wav, tmp_path / "batch", 15, -40.0, 0.5)
+    expected = [round(offset, 3) for offset in wav_offsets(chunk_paths)]
+    assert len(expected) > 3
+
+    streamed = [round(offset, 3) for _, offset, _ in iter_chunks(speech_wav, tmp_path / "stream", 15, -40.0, 0.5)]
+    chunker = RollingChunker(SAMPLE_RATE, max_duration_sec=15, min_silence_len_sec=0.5, silence_thresh_db=-40.0)
+    rolling = [round(offset, 3) for _, offset, _ in chunker.chunks(iter_wav_blocks(speech_wav))]
+    assert streamed == expected
+    assert rolling == expected
+
+    audio = AudioSegment.from_wav(speech_wav)
+    silences = detect_silence(audio, 500, -40.0, seek_step=100)
+    for cut in expected[1:]:
+        assert any(start <= cut * 1000 <= end for start, end in silences)
+
+
+def test_cut_points_cut_in_the_previous_silence():
+    silences = [[4000, 5000], [9000, 10000], [14000, 15000]]
+    assert list(iter_cut_points(silences, max_duration_ms=10000)) == [9500]
+
+
+def test_cut_points_without_silence_raise_unless_forced():
+    with pytest.raises(RuntimeError):
+        list(iter_cut_points([[25000, 26000]], max_duration_ms=10000))
+    assert list(iter_cut_points([[25000, 26000]], max_duration_ms=10000, force_cut=True)) == [10000, 20000]
+
+
+def test_rolling_chunker_forces_cuts_in_a_monologue():
+    signal = np.concatenate([tone(25.0), silence(1.0), tone(3.0)])
+    chunker = RollingChunker(SAMPLE_RATE, max_duration_sec=10, min_silence_len_sec=0.5, force_cut=True)
+    chunks = list(chunker.chunks(blocks_of(signal)))
+
+    assert [round(offset, 1) for _, offset, _ in chunks] == [0.0, 10.0, 20.0]
+    assert max(duration for _, _, duration in chunks) <= 10.0
+    assert sum(len(samples) for samples, _, _ in chunks) == len(signal)
@@ -0,0 +1,72 @@
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import src.decoding_context as decoding_context
+from src.decoding_context import decoding_options, ensure_contexts, group_recordings, load_contexts, save_contexts
+
+
+def settings(language=None, initial_prompt="") -> dict:
+    return {"detect_windows": 3, "detect_window_sec": 30.0, "initial_prompt": initial_prompt, "language": language}
+
+
+def fake_detection(monkeypatch, language="de") -> list:
+    calls = []
+
+    def detect_language(audio_paths, model_name, windows, window_sec):
+        calls.append([path.name for path in audio_paths])
+        return {
+            "language": language,
+            "language_probability": 0.9,
+            "detected_with": model_name,
+            "windows": 2,
+            "detect_sec": 0.1,
+        }
+
+    monkeypatch.setattr(decoding_context, "detect_language", detect_language)
+    return calls
+
+
+def test_group_recordings_orders_chunks_numerically():
+    files = [Path(name) for name in ["talk_100.wav", "talk_11.wav", "intro_02.wav", "talk_02.wav"]]
+    assert {recording: [path.name for path in paths] for recording, paths in group_recordings(files).items()} == {
+        "intro": ["intro_02.wav"],
+        "talk": ["talk_02.wav", "talk_11.wav", "talk_100.wav"],
+    }
+    assert list(group_recordings(files, "all")) == ["all"]
+
+
+def test_configured_options_win_over_cached_context():
+    context = {"language": "fr", "initial_prompt": "cached"}
+    assert decoding_options(settings(), context) == ("fr", "cached")
+    assert decoding_options(settings("en", "configured"), context) == ("en", "configured")
+    assert decoding_options(settings(), {}) == (None, None)
+
+
+def test_ensure_contexts_detects_once_and_caches(tmp_path, monkeypatch):
+    calls = fake_detection(monkeypatch)
+    context_path = tmp_path / "decoding_context.json"
+    files = [Path("talk_10.wav"), Path("talk_9.wav")]
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        contexts = ensure_contexts(executor, files, context_path, "tiny", settings())
+        assert ensure_contexts(executor, files, context_path, "tiny", settings()) == contexts
+
+    assert calls == [["talk_9.wav", "talk_10.wav"]]
+    assert contexts["talk"]["language"] == "de"
+    assert load_contexts(context_path) == contexts
+
+
+def test_ensure_contexts_keeps_cached_prompt_on_redetection(tmp_path, monkeypatch):
+    fake_detection(monkeypatch, "nl")
+    context_path = tmp_path / "decoding_context.json"
+    save_contexts(context_path, {"talk": {"language": "de", "initial_prompt": "names"}})
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        contexts = ensure_contexts(executor, [Path("talk_00.wav")], context_path, "tiny", settings(), force=True)
+    assert contexts["talk"]["language"] == "nl" and contexts["talk"]["initial_prompt"] == "names"
+
+
+def test_ensure_contexts_writes_nothing_with_configured_language(tmp_path, monkeypatch):
+    calls = fake_detection(monkeypatch)
+    context_path = tmp_path / "decoding_context.json"
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        assert ensure_contexts(executor, [Path("talk_00.wav")], context_path, "tiny", settings("en")) == {}
+    assert calls == [] and not context_path.exists()
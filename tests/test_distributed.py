@@ -0,0 +1,139 @@
+import json
+import multiprocessing
+import os
+import signal
+import threading
+import time
+import uuid
+from pathlib import Path
+
+import pytest
+
+from src import distributed
+from src.distributed import TaskQueue, claim_next, run_local_nodes
+
+CONFIG = """
+[LEDGER]
+max_attempts = 2
+backoff_base_sec = 0.1
+
+[DISTRIBUTED]
+lease_ttl_sec = 1.0
+heartbeat_sec = 0.2
+poll_interval_sec = 0.1
+"""
+
+
+def record_attempt(task: dict) -> int:
+    task_id = task["id"]
+    attempts_dir = Path(task["audio_dir"]) / "attempts"
+    attempts_dir.mkdir(exist_ok=True)
+    (attempts_dir / f"{task_id}.{uuid.uuid4().hex}").touch()
+    return len(list(attempts_dir.glob(f"{task_id}.*")))
+
+
+def attempts_of(tmp_path, task_id: str) -> int:
+    return len(list((tmp_path / "attempts").glob(f"{task_id}.*")))
+
+
+def stub_run_task(task, config, staging_dir):
+    attempt = record_attempt(task)
+    behaviour = task.get("behaviour")
+    if behaviour == "crash" or (behaviour == "crash_once" and attempt == 1):
+        os.kill(os.getpid(), signal.SIGKILL)  # the node dies mid-task, holding the lease
+    if behaviour == "error":
+        raise OSError("disk hiccup")
+    if behaviour == "hang_once" and attempt == 1:
+        time.sleep(2.5)  # misses its heartbeats: the lease goes stale and is reclaimed meanwhile
+    staging_dir.mkdir(parents=True)
+    (staging_dir / f"{task['id']}.out").write_text(f"attempt {attempt} by {os.getpid()}")
+    time.sleep(0.05)
+    return []
+
+
+def make_task(tmp_path, task_id: str, deps=(), behaviour=None) -> dict:
+    return {"id": task_id, "kind": "test", "audio_dir": str(tmp_path), "deps": list(deps), "behaviour": behaviour}
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork", reason="the stubbed run_task reaches nodes via fork")
+def test_local_nodes_reclaim_dead_leases_and_stop_after_max_attempts(tmp_path, monkeypatch):
+    monkeypatch.setattr(distributed, "run_task", stub_run_task)
+    config_path = tmp_path / "settings.toml"
+    config_path.write_text(CONFIG)
+    queue_dir = tmp_path / "queue"
+    queue = TaskQueue(queue_dir, "test")
+    for task in [
+        make_task(tmp_path, "a"),
+        make_task(tmp_path, "b", deps=["a"]),
+        make_task(tmp_path, "killed", behaviour="crash_once"),
+        make_task(tmp_path, "after-killed", deps=["killed"]),
+        make_task(tmp_path, "poison", behaviour="crash"),
+        make_task(tmp_path, "after-poison", deps=["poison"]),
+        make_task(tmp_path, "flaky", behaviour="error"),
+    ]:
+        queue.enqueue(task)
+
+    # 3 nodes die (killed once, poison twice); the fourth drains the queue
+    runner = threading.Thread(target=run_local_nodes, args=(queue_dir, str(config_path), 4))
+    runner.start()
+    runner.join(timeout=60)
+    assert not runner.is_alive(), "nodes did not drain the queue"
+
+    for task_id in ("a", "b", "killed", "after-killed"):
+        assert queue.is_done(task_id)
+    assert attempts_of(tmp_path, "killed") == 2  # its lease was reclaimed and the task ran again
+
+    poison = queue.failure("poison")
+    assert poison["terminal"] and poison["attempts"] == 2 and poison["error"].startswith("LeaseExpired")
+    assert attempts_of(tmp_path, "poison") == 2
+    flaky = queue.failure("flaky")
+    assert flaky["terminal"] and flaky["attempts"] == 2 and flaky["error"].startswith("OSError")
+    assert queue.failure("after-poison")["terminal"]
+    assert attempts_of(tmp_path, "after-poison") == 0
+
+    assert os.listdir(queue_dir / "tasks") == []
+    finished = sorted(name[: -len(".json")] for name in os.listdir(queue_dir / "finished"))
+    assert finished == sorted(["a", "b", "killed", "after-killed", "poison", "after-poison", "flaky"])
+    assert os.listdir(queue_dir / "leases") == []
+    assert os.listdir(tmp_path / ".staging") == []
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork", reason="the stubbed run_task reaches nodes via fork")
+def test_node_that_lost_its_lease_discards_its_outputs(tmp_path, monkeypatch):
+    monkeypatch.setattr(distributed, "run_task", stub_run_task)
+    config_path = tmp_path / "settings.toml"
+    # Heartbeats too rare to keep the 1 s lease fresh while the first attempt hangs
+    config_path.write_text(CONFIG.replace("heartbeat_sec = 0.2", "heartbeat_sec = 10.0"))
+    queue_dir = tmp_path / "queue"
+    queue = TaskQueue(queue_dir, "test")
+    queue.enqueue(make_task(tmp_path, "slow", behaviour="hang_once"))
+
+    runner = threading.Thread(target=run_local_nodes, args=(queue_dir, str(config_path), 2))
+    runner.start()
+    runner.join(timeout=60)
+    assert not runner.is_alive(), "nodes did not drain the queue"
+
+    # The second node reclaimed the lease and redid the task; the hung first attempt committed nothing
+    assert attempts_of(tmp_path, "slow") == 2
+    assert queue.is_done("slow") and queue.failure("slow") is None
+    assert (tmp_path / "slow.out").read_text().startswith("attempt 2 by ")
+    assert os.listdir(tmp_path / ".staging") == []
+
+
+def test_stale_lease_counts_as_failed_attempt(tmp_path):
+    queue = TaskQueue(tmp_path, "node-b", lease_ttl_sec=1.0, max_attempts=2, backoff_base_sec=10.0)
+    queue.enqueue(make_task(tmp_path, "t"))
+    lease = tmp_path / "leases" / "t.lease"
+    lease.write_text(json.dumps({"node": "node-a"}))
+    os.utime(lease, (time.time() - 5, time.time() - 5))
+
+    assert not queue.acquire("t")  # reclaimed, but left to its backoff
+    failure = queue.failure("t")
+    assert failure["attempts"] == 1 and not failure["terminal"]
+    assert claim_next(queue) == (None, False)
+
+    lease.write_text(json.dumps({"node": "node-a"}))
+    os.utime(lease, (time.time() - 5, time.time() - 5))
+    assert not queue.acquire("t")
+    assert queue.failure("t")["terminal"]
+    assert claim_next(queue) == (None, True)
@@ -0,0 +1,76 @@
+import time
+
+import pytest
+
+from src.ledger import Ledger, backoff_delay, call_with_retry
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    ledger = Ledger(tmp_path / "ledger.sqlite", max_attempts=3, backoff_base_sec=5.0)
+    yield ledger
+    ledger.close()
+
+
+def test_backoff_delay_doubles_up_to_the_cap():
+    assert [backoff_delay(attempt, 5.0) for attempt in (1, 2, 3, 4)] == [5.0, 10.0, 20.0, 40.0]
+    assert backoff_delay(20, 5.0) == 300.0
+
+
+def test_needs_run_for_new_done_and_permanently_failed_tasks(ledger):
+    assert ledger.needs_run("rec", "transcribe", "rec_00")
+
+    ledger.start("rec", "transcribe", "rec_00")
+    ledger.succeed("rec", "transcribe", "rec_00")
+    assert not ledger.needs_run("rec", "transcribe", "rec_00")
+
+    ledger.start("rec", "diarize", "rec_00")
+    ledger.fail("rec", "diarize", ValueError("bad input"), "rec_00")
+    row = ledger.task("rec", "diarize", "rec_00")
+    assert row["next_attempt_at"] is None  # not transient: no retry is scheduled
+    assert ledger.needs_run("rec", "diarize", "rec_00")  # a resume may still try it, up to the limit
+
+
+def test_transient_failure_backs_off_then_gives_up(ledger):
+    ledger.start("rec", "transcribe", "rec_00")
+    ledger.fail("rec", "transcribe", OSError("nfs"), "rec_00")
+    assert not ledger.needs_run("rec", "transcribe", "rec_00")  # backing off for 5 s
+
+    ledger._conn.execute("UPDATE tasks SET next_attempt_at = ?", (time.time() - 1,))
+    assert ledger.needs_run("rec", "transcribe", "rec_00")
+
+    ledger.start("rec", "transcribe", "rec_00")
+    ledger.fail("rec", "transcribe", OSError("nfs"), "rec_00", attempts=2)
+    row = ledger.task("rec", "transcribe", "rec_00")
+    assert row["attempts"] == 3 and row["next_attempt_at"] is None
+    assert not ledger.needs_run("rec", "transcribe", "rec_00")
+
+
+def test_interrupted_run_counts_as_an_attempt(ledger):
+    for attempt in (1, 2, 3):
+        ledger.start("rec", "diarize", "rec_00")  # the process is killed here, nothing else is recorded
+        ledger._conn.execute("UPDATE tasks SET started_at = ?", (time.time() - 3600,))
+        assert ledger.needs_run("rec", "diarize", "rec_00") == (attempt < 3)
+        row = ledger.task("rec", "diarize", "rec_00")
+        assert row["state"] == "failed" and row["attempts"] == attempt
+        assert row["error"].startswith("Interrupted")
+
+
+def test_call_with_retry_retries_transient_errors_only(monkeypatch):
+    monkeypatch.setattr(time, "sleep", lambda _: None)
+    calls = []
+
+    def flaky():
+        calls.append(1)
+        if len(calls) < 3:
+            raise TimeoutError("slow share")
+        return "ok"
+
+    assert call_with_retry(3, 1.0, flaky) == ("ok", 3)
+
+    def broken():
+        raise ValueError("bad input")
+
+    with pytest.raises(ValueError) as excinfo:
+        call_with_retry(3, 1.0, broken)
+    assert excinfo.value.attempts == 1
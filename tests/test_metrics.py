@@ -0,0 +1,81 @@
+import json
+
+from src.metrics import MetricsCollector, aggregate, load_samples, prometheus_text, summarize, write_report
+
+
+def sample(started_at: float, finished_at: float, cpu_sec: float, peak_rss_mb=None, pid=1) -> dict:
+    return {
+        "started_at": started_at,
+        "finished_at": finished_at,
+        "cpu_sec": cpu_sec,
+        "peak_rss_mb": peak_rss_mb,
+        "pid": pid,
+    }
+
+
+def collected() -> MetricsCollector:
+    metrics = MetricsCollector()
+    metrics.add("transcribe", "rec", sample(100.0, 110.0, 9.0, 800.0, pid=1), "rec_00", 20.0, submitted_at=100.0)
+    metrics.add("transcribe", "rec", sample(101.0, 106.0, 4.0, 900.0, pid=2), "rec_01", 10.0, submitted_at=100.0)
+    metrics.add("align", "rec", sample(111.0, 111.5, 0.5), "rec_00")
+    return metrics
+
+
+def test_add_derives_rtf_and_queue_wait():
+    first, second, align = collected().samples
+    assert first["wall_sec"] == 10.0 and first["rtf"] == 0.5 and first["queue_wait_sec"] == 0.0
+    assert second["queue_wait_sec"] == 1.0
+    assert align["rtf"] is None and align["queue_wait_sec"] == 0.0
+
+
+def test_aggregate_totals():
+    totals = aggregate(collected().samples[:2])
+    assert totals == {
+        "tasks": 2,
+        "wall_sec": 15.0,
+        "cpu_sec": 13.0,
+        "audio_sec": 30.0,
+        "rtf": 0.5,
+        "throughput": 3.0,  # 30 s of audio in the 10 s between the first start and the last finish
+        "peak_rss_mb": 900.0,
+        "queue_wait_sec": 1.0,
+        "queue_wait_max_sec": 1.0,
+        "workers": 2,
+    }
+
+
+def test_summarize_fills_durations_of_stages_without_audio():
+    summary = summarize(collected().samples)
+    assert summary["stages"]["align"]["audio_sec"] == 20.0
+    assert summary["stages"]["align"]["rtf"] == 0.025
+    assert summary["recordings"]["rec"]["transcribe"]["tasks"] == 2
+
+
+def test_prometheus_text():
+    summary = summarize(collected().samples)
+    summary["recordings"]['odd "name"'] = summary["recordings"].pop("rec")
+    lines = prometheus_text(summary).splitlines()
+
+    assert "# TYPE transcribeline_stage_wall_seconds gauge" in lines
+    assert 'transcribeline_stage_wall_seconds{recording="odd \\"name\\"",stage="transcribe"} 15.0' in lines
+    assert 'transcribeline_stage_tasks{recording="odd \\"name\\"",stage="align"} 1' in lines
+    # Metrics without a value (align has no peak RSS) are left out rather than written as None
+    assert not any(line.endswith("None") for line in lines)
+
+
+def test_flush_appends_and_write_report(tmp_path):
+    path = tmp_path / "metrics.jsonl"
+    metrics = collected()
+    metrics.path = path
+    metrics.flush()
+    assert metrics.samples == []
+    with metrics.measure("postprocess", "rec"):
+        pass
+    metrics.flush()
+    assert len(load_samples([path, tmp_path / "missing.jsonl"])) == 4
+
+    summary = write_report([path], tmp_path / "metrics.json", tmp_path / "metrics.prom")
+    with open(tmp_path / "metrics.json", encoding="utf-8") as f:
+        assert json.load(f)["stages"] == summary["stages"]
+    assert (tmp_path / "metrics.prom").read_text() == prometheus_text(summary)
+    assert [p.name for p in tmp_path.iterdir() if p.name.endswith(".tmp")] == []
@@ -0,0 +1,25 @@
+from src.postprocessor import merge_store
+from src.store import RecordingStore
+
+
+def test_merge_store_places_chunks_at_their_offsets(tmp_path):
+    with RecordingStore(tmp_path / "rec.sqlite") as store:
+        store.put_chunk("rec_00", 0, 0.0, 30.0)
+        store.put_chunk("rec_01", 1, 30.0, 30.0)
+        store.put_alignment(
+            "rec_00",
+            [
+                {"start": 1.0, "end": 2.0, "speaker": "SPEAKER_00", "text": " Hello."},
+                {"start": 3.0, "end": 4.0, "speaker": "SPEAKER_00", "text": " How are you?"},
+            ],
+        )
+        store.put_alignment("rec_01", [{"start": 5.0, "end": 6.0, "speaker": "SPEAKER_00", "text": " Fine."}])
+
+    output = tmp_path / "rec.txt"
+    speaker_map = {"rec_00": {"SPEAKER_00": "SPEAKER_00"}, "rec_01": {"SPEAKER_00": "SPEAKER_01"}}
+    merge_store(tmp_path / "rec.sqlite", output, speaker_map)
+
+    blocks = output.read_text(encoding="utf-8").split("\n\n")
+    assert blocks[0].splitlines()[1] == "Hello. How are you?"
+    assert blocks[0].splitlines()[0] == "[SPEAKER_00] (0:00:01)"
+    assert blocks[1].splitlines()[0] == "[SPEAKER_01] (0:00:35)"
@@ -0,0 +1,29 @@
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from src.profiling import merge_profiles, profiled
+
+
+def square(x: int) -> int:
+    return sum(i * i for i in range(x))
+
+
+def run_pool(settings) -> list[int]:
+    # Like a CLI command: the parent is profiled as a whole and hands its work to pool tasks
+    task = profiled(square, "transcribe", settings)
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        return list(executor.map(task, [1000, 2000, 3000, 4000]))
+
+
+@pytest.mark.parametrize("mode", ["cpu", "mem"])
+def test_parent_profile_is_merged_apart_from_pool_tasks(tmp_path, mode):
+    settings = (mode, tmp_path)
+    profiled(run_pool, "main-transcribe", settings)(settings)
+
+    merged = merge_profiles(settings)
+
+    assert sorted(path.stem for path in merged) == ["main-transcribe", "transcribe"]
+    assert (tmp_path / "transcribe.txt").read_text().startswith("transcribe: 4 profiled calls")
+    assert (tmp_path / "main-transcribe.txt").read_text().startswith("main-transcribe: 1 profiled calls")
+    assert not list((tmp_path / "raw").iterdir())
@@ -0,0 +1,54 @@
+import math
+
+from src.speaker_linking import cluster_speakers, embeddings_to_dict, link_speakers
+
+ALICE = [1.0, 0.0, 0.0]
+BOB = [0.0, 1.0, 0.0]
+CAROL = [0.0, 0.0, 1.0]
+
+
+def near(vector: list[float], noise: float = 0.05) -> list[float]:
+    return [x + noise for x in vector]
+
+
+def test_cluster_speakers_links_swapped_labels():
+    vectors = [ALICE, BOB, near(BOB), near(ALICE)]
+    groups = ["rec_00", "rec_00", "rec_01", "rec_01"]
+    labels = cluster_speakers(vectors, groups, threshold=0.3)
+    assert labels[0] == labels[3] and labels[1] == labels[2] and labels[0] != labels[1]
+
+
+def test_cluster_speakers_never_joins_speakers_of_the_same_chunk():
+    vectors = [ALICE, near(ALICE, 0.01), ALICE]
+    labels = cluster_speakers(vectors, ["rec_00", "rec_00", "rec_01"], threshold=0.5)
+    assert labels[0] != labels[1]
+    assert len(set(labels)) == 2
+
+
+def test_cluster_speakers_merges_past_the_threshold_down_to_max_speakers():
+    vectors = [ALICE, BOB, CAROL]
+    groups = ["rec_00", "rec_01", "rec_02"]
+    assert len(set(cluster_speakers(vectors, groups, threshold=0.3))) == 3
+    assert len(set(cluster_speakers(vectors, groups, threshold=0.3, max_speakers=2))) == 2
+    # The cap never overrides a cannot-link constraint
+    assert len(set(cluster_speakers(vectors, ["rec_00"] * 3, threshold=0.3, max_speakers=1))) == 3
+
+
+def test_link_speakers_numbers_global_labels_in_order_and_keeps_unlinkable_speakers_apart():
+    embeddings = {
+        "rec_01": {"SPEAKER_00": near(BOB), "SPEAKER_01": near(ALICE), "SPEAKER_02": None},
+        "rec_00": {"SPEAKER_00": ALICE, "SPEAKER_01": BOB},
+    }
+    speaker_map = link_speakers(embeddings, threshold=0.3, max_speakers=2)
+    assert speaker_map["rec_00"] == {"SPEAKER_00": "SPEAKER_00", "SPEAKER_01": "SPEAKER_01"}
+    assert speaker_map["rec_01"] == {"SPEAKER_00": "SPEAKER_01", "SPEAKER_01": "SPEAKER_00", "SPEAKER_02": "SPEAKER_02"}
+
+
+def test_embeddings_to_dict_without_centroids():
+    assert embeddings_to_dict(["SPEAKER_00"], None) == {}
+    assert embeddings_to_dict(["SPEAKER_00", "SPEAKER_01"], [[0.5, 0.5], [math.nan, 0.1]]) == {
+        "SPEAKER_00": [0.5, 0.5],
+        "SPEAKER_01": None,
+    }
+    # A chunk without embeddings is left out of the map, so postprocessing keeps its local labels
+    assert "rec_02" not in link_speakers({"rec_00": {"SPEAKER_00": ALICE}, "rec_02": {}}, threshold=0.3)
@@ -0,0 +1,77 @@
+import json
+
+import pytest
+
+from src.store import RecordingStore, compact_transcription, parse_rttm
+
+WHISPER_RESULT = {
+    "text": " Hello there. General Kenobi.",
+    "language": "en",
+    "duration": 4.0,
+    "model_name": "large",
+    "segments": [
+        {"start": 0.0, "end": 1.5, "text": " Hello there.", "tokens": [1, 2], "avg_logprob": -0.2},
+        {"start": 2.0, "end": 3.8, "text": " General Kenobi.", "tokens": [3], "avg_logprob": -0.1},
+    ],
+}
+TURNS = [(0.0, 1.6, "SPEAKER_00"), (1.9, 2.0, "SPEAKER_01")]
+ALIGNED = [
+    {"start": 0.0, "end": 1.5, "speaker": "SPEAKER_00", "text": " Hello there."},
+    {"start": 2.0, "end": 3.8, "speaker": "SPEAKER_01", "text": " General Kenobi."},
+]
+
+
+@pytest.fixture
+def store(tmp_path):
+    with RecordingStore(tmp_path / "rec.sqlite") as store:
+        store.put_chunk("rec_01", 1, 4.0, 4.0)
+        store.put_chunk("rec_00", 0, 0.0, 4.0)
+        store.put_transcription("rec_00", WHISPER_RESULT)
+        store.put_diarization("rec_00", TURNS)
+        store.put_embeddings("rec_00", {"SPEAKER_00": [0.1, 0.2], "SPEAKER_01": None})
+        store.put_alignment("rec_00", ALIGNED)
+        yield store
+
+
+def test_round_trip(store):
+    assert [row["chunk"] for row in store.chunks()] == ["rec_00", "rec_01"]
+    assert store.transcription("rec_00") == compact_transcription(WHISPER_RESULT)
+    assert "tokens" not in store.transcription("rec_00")["segments"][0]
+    assert store.transcription("rec_01") is None
+    assert store.diarization("rec_00") == TURNS
+    assert store.embeddings() == {"rec_00": {"SPEAKER_00": [0.1, 0.2], "SPEAKER_01": None}}
+    assert store.alignment("rec_00")["segments"] == ALIGNED
+    assert store.has("aligned", "rec_00") and not store.has("aligned", "rec_01")
+    with pytest.raises(ValueError):
+        store.has("chunks", "rec_00")
+
+
+def test_rewrites_replace_a_chunk(store):
+    store.put_diarization("rec_00", TURNS[:1])
+    store.put_transcription("rec_00", {**WHISPER_RESULT, "segments": WHISPER_RESULT["segments"][:1]})
+    assert store.diarization("rec_00") == TURNS[:1]
+    assert len(store.transcription("rec_00")["segments"]) == 1
+
+
+def test_reopened_store_keeps_its_data(store):
+    store.close()
+    with RecordingStore(store.path) as reopened:
+        assert reopened.diarization("rec_00") == TURNS
+        assert [chunk["chunk"] for chunk, _ in reopened.iter_alignments()] == ["rec_00", "rec_01"]
+
+
+def test_export_writes_the_file_layout(store, tmp_path):
+    out = tmp_path / "export"
+    store.export(out)
+
+    with open(out / "transcripts" / "rec_00.json", encoding="utf-8") as f:
+        assert json.load(f) == compact_transcription(WHISPER_RESULT)
+    with open(out / "diarizations" / "rec_00.rttm", encoding="utf-8") as f:
+        assert parse_rttm(f) == TURNS
+    with open(out / "diarizations" / "rec_00.embeddings.json", encoding="utf-8") as f:
+        assert json.load(f) == {"SPEAKER_00": [0.1, 0.2], "SPEAKER_01": None}
+    with open(out / "aligns" / "rec_00.aligned.json", encoding="utf-8") as f:
+        aligned = json.load(f)
+    assert aligned["segments"] == ALIGNED
+    assert aligned["metadata"]["language"] == "en"
+    assert not (out / "transcripts" / "rec_01.json").exists()
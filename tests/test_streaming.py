@@ -0,0 +1,77 @@
+import wave
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+
+import src.streaming as streaming
+from src.streaming import ChunkPipeline
+
+
+def write_silence(path: Path, seconds: float = 1.0, sample_rate: int = 16000):
+    with wave.open(str(path), "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(b"\x00\x00" * int(seconds * sample_rate))
+
+
+def thread_pools(workers: int = 1) -> SimpleNamespace:
+    # Same interface as WorkerPools, without loading any model
+    return SimpleNamespace(
+        transcribe=ThreadPoolExecutor(max_workers=workers),
+        diarize=ThreadPoolExecutor(max_workers=workers),
+        transcribe_workers=workers,
+        diarize_workers=workers,
+    )
+
+
+def config() -> SimpleNamespace:
+    return SimpleNamespace(
+        WHISPER=SimpleNamespace(model="tiny", language="en"),
+        DIARIZATION=SimpleNamespace(model="pyannote"),
+        PARALLEL=SimpleNamespace(parallel_workers=1),
+    )
+
+
+def test_failed_stage_skips_alignment_of_stale_output(tmp_path, monkeypatch):
+    aligned = []
+
+    def transcribe_audio(audio_path, output_path, *args):
+        if audio_path.stem == "talk_01":
+            raise RuntimeError("out of memory")
+        output_path.write_text("{}")
+        return {}
+
+    def diarize_audio(audio_path, output_path, *args):
+        output_path.write_text("")
+        return {}
+
+    monkeypatch.setattr(streaming, "transcribe_audio", transcribe_audio)
+    monkeypatch.setattr(streaming, "diarize_audio", diarize_audio)
+    monkeypatch.setattr(streaming, "align_pair", lambda transcript, rttm, output: aligned.append(transcript.stem))
+
+    chunks = []
+    for stem in ["talk_00", "talk_01"]:
+        write_silence(tmp_path / f"{stem}.wav")
+        chunks.append(tmp_path / f"{stem}.wav")
+    # A transcript left by an earlier run of the chunk that now fails to transcribe
+    (tmp_path / "transcripts").mkdir()
+    (tmp_path / "transcripts" / "talk_01.json").write_text('{"text": "stale"}')
+
+    pools = thread_pools()
+    pipeline = ChunkPipeline(
+        config(),
+        tmp_path / "transcripts",
+        tmp_path / "diarizations",
+        tmp_path / "aligns",
+        "token",
+        pools=pools,
+    )
+    for offset_sec, chunk_path in enumerate(chunks):
+        pipeline.submit(chunk_path, float(offset_sec))
+    pipeline.close()
+    pools.transcribe.shutdown()
+    pools.diarize.shutdown()
+
+    assert aligned == ["talk_00"]
+    assert [sample["chunk"] for sample in pipeline.metrics.samples if sample["stage"] == "transcribe"] == ["talk_00"]